@@ -0,0 +1,111 @@
+# IntellectExtractOcr._json_parser 的基准测试：
+# 构造几万个单元格的响应，对比旧的 jsonpath 实现和单次遍历实现的耗时，并校验两者输出完全一致
+#
+# 用法: python Client/Bench_Json_Parser.py [行数] [列数]
+
+import contextlib
+import io
+import sys
+import time
+import jsonpath
+import pandas as pd
+from Get_Extract import IntellectExtractOcr
+
+def build_response(rows, cols, fields=5, stamps=3):
+    """构造一个与 entity_extraction 返回结构相同的响应"""
+    headers = [f"列{i}" for i in range(cols)]
+    cells = [{header: {'value': f"{r}-{c}"} for c, header in enumerate(headers)} for r in range(rows)]
+    # 每隔几行缺一个单元格，覆盖补 None 的分支
+    for r in range(0, rows, 7):
+        cells[r].pop(headers[-1], None)
+    detail = {
+        'fields': {f"字段{i}": [{'value': f"值{i}"}] * (i % 3 + 1) for i in range(fields)},
+        'tables_relationship': [{'cells': cells[:rows // 2]}, {'cells': cells[rows // 2:]}],
+        'stamps': [{'color': 'red', 'value': f"印章{i}", 'page_number': 1} for i in range(stamps)]
+    }
+    second = {'fields': {f"字段{i}": [{'value': f"第二页{i}"}] for i in range(fields)}}
+    return {'code': 200, 'result': {'finish_reason': 'stop', 'detail_structure': [detail, second]}}, headers
+
+def legacy_parser(json_data, fields_key=None, table_key=None):
+    """旧实现：两次 jsonpath 查询 + 逐格追加 + while 补齐"""
+    fields = jsonpath.jsonpath(json_data, '$.result.detail_structure[*].fields')
+    table_cells = jsonpath.jsonpath(json_data, '$.result.detail_structure[*].tables_relationship[*].cells[*]')
+    jsonpath.jsonpath(json_data, '$.result.detail_structure[*].stamps[*]')
+    fields_df = None
+    table_cells_df = None
+    if fields and fields[0]:
+        all_keys = set()
+        for field in fields:
+            all_keys.update(field.keys())
+        if fields_key:
+            keys_to_use = [k for k in fields_key if k in all_keys]
+            keys_to_use.extend([k for k in all_keys if k not in fields_key])
+        else:
+            keys_to_use = sorted(list(all_keys))
+        data = {key: [] for key in keys_to_use}
+        max_length = max(len(value_list) for field in fields for value_list in field.values())
+        for field in fields:
+            for key in keys_to_use:
+                value_list = field.get(key, [])
+                if value_list:
+                    data[key].append(value_list[0]['value'])
+                else:
+                    data[key].append(None)
+                while len(data[key]) < max_length:
+                    data[key].append(None)
+        fields_df = pd.DataFrame(data)
+    if table_cells and table_cells[0]:
+        all_keys = set()
+        for cell in table_cells:
+            all_keys.update(cell.keys())
+        if table_key:
+            keys_to_use = [k for k in table_key if k in all_keys]
+            keys_to_use.extend([k for k in all_keys if k not in table_key])
+        else:
+            keys_to_use = sorted(list(all_keys))
+        cell_data = {key: [] for key in keys_to_use}
+        for cell in table_cells:
+            for key in keys_to_use:
+                if key in cell:
+                    cell_data[key].append(cell[key]['value'])
+                else:
+                    cell_data[key].append(None)
+        table_cells_df = pd.DataFrame(cell_data)
+        if table_key:
+            existing_cols = [col for col in table_key if col in table_cells_df.columns]
+            other_cols = [col for col in table_cells_df.columns if col not in table_key]
+            table_cells_df = table_cells_df[existing_cols + other_cols]
+    return fields_df, table_cells_df
+
+def best_of(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    cols = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    response, headers = build_response(rows, cols)
+    table_key = headers[:cols // 2]
+    ocr = IntellectExtractOcr('bench', 'bench')
+
+    def new_parser():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return ocr._json_parser(response, table_key=table_key)
+
+    legacy_time, (legacy_fields, legacy_cells) = best_of(lambda: legacy_parser(response, table_key=table_key))
+    new_time, (new_fields, new_cells) = best_of(new_parser)
+
+    pd.testing.assert_frame_equal(legacy_fields, new_fields)
+    pd.testing.assert_frame_equal(legacy_cells, new_cells)
+
+    print(f"{rows} 行 x {cols} 列 = {rows * cols} 个单元格，输出一致")
+    print(f"旧实现: {legacy_time * 1000:.1f}ms")
+    print(f"新实现: {new_time * 1000:.1f}ms ({legacy_time / new_time:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# 启动耗时预算：多次启动新的解释器运行 Client_main.py 的 --help 和单个文件的 --dry-run，取中位数，
+# 减去空解释器(python -c pass)的耗时后与预算比较，超出时返回非零退出码，可以放在提交前的检查里。
+# 另外报告导入全部OCR模块(一次真正识别需要的依赖)的耗时作为对照
+#
+# 用法: python Client/Bench_Startup.py [--runs 7] [--help-budget 0.15] [--dry-run-budget 0.25] [--importtime 10]
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from PIL import Image
+
+CLIENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN = os.path.join(CLIENT_DIR, 'Client_main.py')
+
+def measure(args, runs, cwd):
+    """
+    运行 runs 次 python args，返回每次的耗时(秒)列表
+
+    Raises:
+        RuntimeError: 命令返回非零退出码
+    """
+    env = dict(os.environ, PYTHONPATH=CLIENT_DIR)
+    seconds = []
+    for _ in range(runs):
+        began = time.perf_counter()
+        result = subprocess.run([sys.executable] + args, cwd=cwd, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        seconds.append(time.perf_counter() - began)
+        if result.returncode != 0:
+            raise RuntimeError(f"{' '.join(args)} 退出码 {result.returncode}: {result.stderr.decode(errors='replace')}")
+    return seconds
+
+def import_times(args, cwd, top):
+    """
+    用 -X importtime 运行一次，返回累计耗时最多的 top 个顶层导入
+
+    Returns:
+        list: [(模块名, 累计毫秒)]
+    """
+    env = dict(os.environ, PYTHONPATH=CLIENT_DIR)
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=cwd, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    modules = []
+    for line in result.stderr.decode(errors='replace').splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):  # 只统计顶层导入，子模块已计入其中
+            modules.append((name.strip(), int(cumulative) / 1000))
+    modules.sort(key=lambda item: item[1], reverse=True)
+    return modules[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description='Client_main.py 启动耗时预算')
+    parser.add_argument('--runs', type=int, default=7, help="每种调用的运行次数，取中位数")
+    parser.add_argument('--help-budget', type=float, default=0.15, help="--help 比空解释器多出的耗时上限(秒)")
+    parser.add_argument('--dry-run-budget', type=float, default=0.25,
+                        help="单个文件 --dry-run 比空解释器多出的耗时上限(秒)")
+    parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                        help="另外列出 --dry-run 中累计耗时最多的 N 个顶层导入")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='textin_startup_')
+    try:
+        image_path = os.path.join(work_dir, 'sample.png')
+        Image.new('RGB', (800, 600), (255, 255, 255)).save(image_path)
+        cases = [
+            ('python', ['-c', 'pass'], None),
+            ('--help', [MAIN, '--help'], args.help_budget),
+            ('--dry-run', [MAIN, '--dry-run', '--quiet', '--input', image_path], args.dry_run_budget),
+            ('全部OCR模块', ['-c', 'import Get_Table, Get_Extract, File_Check, Image_Tiling, Output_Sink'], None)
+        ]
+        baseline = None
+        over_budget = []
+        for name, case_args, budget in cases:
+            median = statistics.median(measure(case_args, args.runs, work_dir))
+            if baseline is None:
+                baseline = median
+                print(f"{name}: {median * 1000:.0f}ms (空解释器)")
+                continue
+            extra = median - baseline
+            line = f"{name}: {median * 1000:.0f}ms (多出 {extra * 1000:.0f}ms"
+            if budget is not None:
+                line += f"，预算 {budget * 1000:.0f}ms"
+                if extra > budget:
+                    over_budget.append(name)
+                    line += "，超出预算"
+            print(line + ")")
+        if args.importtime:
+            print("--dry-run 中耗时最多的导入:")
+            for module, ms in import_times(cases[2][1], work_dir, args.importtime):
+                print(f"  {module}: {ms:.1f}ms")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if over_budget:
+        print(f"超出启动耗时预算: {', '.join(over_budget)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# 端到端吞吐基准测试：在本地模拟服务(Mock_Server)上对合成的图片集运行
+# IntellectExtractOcr.recognize 和 CommonTableOcr.recognize，报告每秒文件数、单文件延迟的 p50/p95/p99 和内存峰值。
+# 延迟分布、错误率和随机数种子都可以指定，同样的参数可以重复得到可比较的结果
+#
+# 用法: python Client/Bench_Throughput.py [--api extract|table|both] [--files 200] [--workers 4]
+#       [--latency lognormal:0.2,0.5] [--error 40306=0.02] [--rows 200] [--excel-rows 200] [--seed 1]
+
+import argparse
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from PIL import Image
+from Get_Extract import IntellectExtractOcr
+from Get_Table import CommonTableOcr
+from Http_Transport import HttpTransport
+from Rate_Limit import RateLimiter
+from Upload_Stream import MemoryMonitor
+from Mock_Server import (MockTextInServer, build_extract_response, build_table_response, load_replay,
+                         parse_error_rates, parse_latency)
+
+def build_corpus(corpus_dir, count, width=1200, height=1600):
+    """生成 count 张内容各不相同的PNG图片，返回路径列表"""
+    os.makedirs(corpus_dir, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(corpus_dir, f"bench_{i:05d}.png")
+        Image.new('RGB', (width, height + i % 97), ((i * 37) % 256, (i * 11) % 256, 128)).save(path)
+        paths.append(path)
+    return paths
+
+def percentile(values, p):
+    """最近秩法的百分位数，values 已排序"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(p / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+class LatencyRecorder(object):
+    """包装 upload_one，记录每个文件从开始上传到取回响应(含重试和限流等待)的耗时"""
+
+    def __init__(self, ocr):
+        self._lock = threading.Lock()
+        self.latencies = []
+        upload_one = ocr.upload_one
+
+        def timed(*args, **kwargs):
+            began = time.perf_counter()
+            try:
+                return upload_one(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - began
+                with self._lock:
+                    self.latencies.append(elapsed)
+
+        ocr.upload_one = timed
+
+def run_benchmark(api, server, file_paths, output_dir, workers, qps):
+    """
+    对一个接口跑一轮识别
+
+    Returns:
+        dict: files, seconds, files_per_sec, p50, p95, p99(秒), peak_rss, rss_growth(字节)
+    """
+    transport = HttpTransport(pool_size=max(10, workers))
+    limiter = RateLimiter(default_rate=qps)
+    if api == 'extract':
+        ocr = IntellectExtractOcr('bench', 'bench', transport=transport, rate_limiter=limiter, save_json=False)
+        ocr._url = server.extract_url
+    else:
+        ocr = CommonTableOcr('bench', 'bench', transport=transport, rate_limiter=limiter, save_json=False)
+        ocr._url = server.table_url
+    recorder = LatencyRecorder(ocr)
+
+    # 客户端逐个文件打印的信息不计入测试
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        with MemoryMonitor() as monitor:
+            began = time.perf_counter()
+            ocr.recognize(file_paths, [], output_dir=output_dir, max_workers=workers)
+            seconds = time.perf_counter() - began
+    transport.close()
+
+    latencies = sorted(recorder.latencies)
+    report = monitor.report()
+    return {
+        'files': len(file_paths),
+        'seconds': seconds,
+        'files_per_sec': len(file_paths) / seconds if seconds else 0.0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'peak_rss': report['peak_rss'] or 0,
+        'rss_growth': (report['peak_rss'] or 0) - (report['start_rss'] or 0)
+    }
+
+def print_result(api, result):
+    print(f"{api}: {result['files']} 个文件, {result['seconds']:.2f}秒, {result['files_per_sec']:.1f} 文件/秒")
+    print(f"  延迟 p50 {result['p50'] * 1000:.0f}ms, p95 {result['p95'] * 1000:.0f}ms, "
+          f"p99 {result['p99'] * 1000:.0f}ms")
+    print(f"  内存峰值 {result['peak_rss']/1024/1024:.1f}MB (增长 {result['rss_growth']/1024/1024:.1f}MB)")
+
+def main():
+    parser = argparse.ArgumentParser(description='TextIn 客户端端到端吞吐基准测试')
+    parser.add_argument('--api', choices=['extract', 'table', 'both'], default='both')
+    parser.add_argument('--files', type=int, default=200, help="合成图片数")
+    parser.add_argument('--workers', type=int, default=4, help="同时在途的请求数")
+    parser.add_argument('--qps', type=float, default=1000, help="客户端限流的QPS")
+    parser.add_argument('--latency', default='lognormal:0.2,0.5', help="模拟服务的延迟分布，见 Mock_Server")
+    parser.add_argument('--error', action='append', help="错误码=概率，可以重复，如 --error 40306=0.02")
+    parser.add_argument('--rows', type=int, default=200, help="智能提取响应中的表格行数")
+    parser.add_argument('--excel-rows', type=int, default=200, help="表格识别响应中Excel的行数")
+    parser.add_argument('--replay-extract', help="回放的智能提取响应目录")
+    parser.add_argument('--replay-table', help="回放的表格识别响应目录")
+    parser.add_argument('--seed', type=int, default=1, help="随机数种子，固定后延迟和错误序列可以复现")
+    parser.add_argument('--keep', action='store_true', help="保留临时目录中的图片和输出")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='textin_bench_')
+    server = MockTextInServer(
+        latency=parse_latency(args.latency), error_rates=parse_error_rates(args.error),
+        extract_responses=load_replay(args.replay_extract) if args.replay_extract else [build_extract_response(args.rows)],
+        table_responses=load_replay(args.replay_table) if args.replay_table else [build_table_response(args.excel_rows)],
+        seed=args.seed)
+    try:
+        file_paths = build_corpus(os.path.join(work_dir, 'corpus'), args.files)
+        print(f"合成图片 {len(file_paths)} 张，延迟 {args.latency}，并发 {args.workers}，工作目录 {work_dir}")
+        with server:
+            for api in (['extract', 'table'] if args.api == 'both' else [args.api]):
+                result = run_benchmark(api, server, file_paths, os.path.join(work_dir, api), args.workers, args.qps)
+                print_result(api, result)
+            server.print_stats()
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,114 @@
-from Get_Table import CommonTableOcr
-from Get_Extract import IntellectExtractOcr
-from File_Check import FileChecker
+# 启动时只导入标准库和轻量的限流、指标模块；pandas、requests、PIL、openpyxl 等较重的依赖在各个函数中用到时才导入，
+# --help、--dry-run 和单个文件的调用不必等它们全部加载(启动耗时见 Bench_Startup.py)
+from Rate_Limit import RateLimiter
+from Key_Pool import Credential, KeyPool
+from Metrics import get_default_metrics, set_quiet, info
 import os
 import configparser
 import sys
+import threading
+import argparse
+
+MAX_WORKERS = 4  # 同时在途的API请求数，设为 1 即逐个顺序请求
+CPU_WORKERS = os.cpu_count()  # 图片预处理、读写Excel等CPU密集步骤的进程数，与 MAX_WORKERS 分开配置
+
+# 各接口购买的QPS，客户端按此限流，遇到 40306 会自动下调并退避重试
+# 键与 IntellectExtractOcr.URL、CommonTableOcr.URL 相同，这里不导入这两个类，以免启动时加载 pandas
+API_QPS = {
+    "https://api.textin.com/ai/service/v1/entity_extraction": 5,
+    "https://api.textin.com/ai/service/v2/recognize/table/multipage": 5
+}
+RATE_LIMITER = RateLimiter(API_QPS)
+
+# config.conf 中配置了多组凭证([API]、[API.2]、[API.3]...)时，请求分配到各组凭证，每组按自己的QPS限流。
+# 'least_loaded' 选在途请求最少的凭证，'weighted' 按各组的 weight 加权轮询
+KEY_POOL_STRATEGY = 'least_loaded'
+
+CACHE_DIR = './.textin_cache'  # 响应缓存目录，重复运行时未变化的文件直接读缓存
+CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# 原始响应压缩归档到输出目录的 archive 子目录(后台写入，可按来源文件读回)
+# SAVE_JSON_DUMPS 为 True 时另外为每个响应保存一份缩进的JSON，调试用
+ARCHIVE_COMPRESSION = 'gzip'  # 'gzip' 或 'zstd'(需要 pip install zstandard)
+SAVE_JSON_DUMPS = False
+
+# 文件预检：并发检查，结果按 (路径, 大小, 修改时间) 缓存；不超过 PREFLIGHT_CONTENT_MAX_SIZE 的小文件检查时整个读入，上传时复用
+PREFLIGHT_WORKERS = 16
+PREFLIGHT_CACHE_PATH = './.textin_preflight.json'
+PREFLIGHT_CONTENT_MAX_SIZE = 256 * 1024
+
+# 处理流水线：发现 → 检查 → 读取/预处理 → 上传 → 解析 → 输出，各阶段之间是容量为 PIPELINE_QUEUE_SIZE 的有界队列。
+# 下游慢时队列填满，上游自动等待，在途的文件(连同读入内存的内容)数量有上限；上传阶段的线程数为 MAX_WORKERS
+PIPELINE_QUEUE_SIZE = 16
+PREPROCESS_WORKERS = 4
+PARSE_WORKERS = 2
+
+# 运行指标：各阶段耗时直方图、错误码/重试/截断计数，运行结束后写成输出目录中的 JSON 报告
+# PROMETHEUS_FILE 不为 None 时另外写一份 Prometheus 文本格式；PROMETHEUS_PORT 不为 None 时运行期间提供 /metrics 接口
+# QUIET 为 True 时不打印逐个文件的信息(命令行 --quiet)，错误和汇总统计照常打印
+METRICS_REPORT_NAME = 'run_report.json'
+PROMETHEUS_FILE = None
+PROMETHEUS_PORT = None
+QUIET = False
+
+# 常驻模式(--watch 目录 ...)：用 inotify 监视收件目录(不可用时轮询)，文件写完后立即识别，处理完移到收件目录下的 done/failed。
+# 只收到创建/修改事件的文件，大小和修改时间保持 WATCH_SETTLE_SECONDS 秒不变才认为写完
+WATCH_SETTLE_SECONDS = 2.0
+WATCH_POLL_INTERVAL = 1.0
+
+# 任务服务模式(--serve)：各个调用方共用一个工作线程池和上面的 RATE_LIMITER 配额
+SERVICE_HOST = '127.0.0.1'
+SERVICE_DIR = './Job_Service'  # 上传的文件和每个任务的结果
+SERVICE_MAX_QUEUED = 1000
+SERVICE_RETENTION_SECONDS = 24 * 3600
+SERVICE_TOKEN = None  # 设置后调用方需要带 X-Service-Token 头
+
+# 不指定 --input/--output 时的输入目录和输出目录
+TABLE_INPUTS = ['./Test_table']
+TABLE_OUTPUT_DIR = './Output_table'
+EXTRACT_INPUTS = ['./Test_Extract']
+EXTRACT_OUTPUT_DIR = './Output_Extract'
+
+# 智能提取的字段和表头(命令行 --fields-key、--table-key)
+EXTRACT_FIELDS_KEY = []
+#EXTRACT_TABLE_KEY = ["排名","国家定位","校名","学校档次","一级硕士点数量","A+数","A数","A-数","A+及A数","A类总数","总量积分"]
+EXTRACT_TABLE_KEY = ["省份","类别","文科分数线","理科分数线","其他分数线"]
+
+# 智能提取前把长图(高宽比达到 TILE_MIN_ASPECT，或高度接近接口上限 TILE_TRIGGER_HEIGHT)切成高 TILE_BAND_HEIGHT、
+# 有重叠的横条并行识别。每个横条是一次计费的请求，默认关闭；普通的票据照片和扫描件即使打开也不会被切开
+TILE_IMAGES = False
+TILE_BAND_HEIGHT = 1200
+TILE_OVERLAP = 150
+TILE_TRIGGER_HEIGHT = 9000
+TILE_MIN_ASPECT = 4.0
+
+# 智能提取前按感知哈希合并近似重复的图片(重复上传、拍照和扫描件、重新压缩的转发)，每组只上传一张
+DEDUP_IMAGES = False
+DEDUP_MAX_DISTANCE = 4  # 64位哈希中允许不同的位数，越大越容易把同一模板的不同票据误合并
+
+# 多页PDF按每 PDF_PAGES_PER_CHUNK 页拆开并行识别(需要 pip install pypdf)，默认 0 不拆分、整份上传；
+# 打开后只拆页数达到 PDF_SPLIT_MIN_PAGES 的长文档，页数少的PDF拆开只会增加请求数
+PDF_PAGES_PER_CHUNK = 0
+PDF_SPLIT_MIN_PAGES = 10
+
+# 上传前把图片重新编码为 JPEG 并缩小到长边不超过 PREPROCESS_MAX_EDGE，默认关闭(会损失画质)。
+# 打开后超出接口尺寸、大小限制的图片先缩小再上传，不再直接判为不符合要求；
+# PREPROCESS_GRAYSCALE 为 True 时另外转为灰度，印章颜色等彩色信息会丢失
+PREPROCESS_IMAGES = False
+PREPROCESS_GRAYSCALE = False
+PREPROCESS_MAX_EDGE = 4000
+PREPROCESS_QUALITY = 85
+
+# 合并结果的输出格式: 'excel'、'csv'、'jsonl' 或 'parquet'(需要 pip install pyarrow)
+# 智能提取的 Fields/TableCells 写入该格式；表格识别除了每个文件的Excel，非 excel 格式时另外合并输出所有表格
+OUTPUT_FORMAT = 'excel'
+PARQUET_PARTITION_BY = 'run'  # Parquet 按运行('run')或按来源文件('source')分区
+
+# 表格识别请求结构化的表格JSON(excel=0)，直接解析成表格合并输出到 tables.*，不再为每个文件导出和重新读取Excel，
+# 响应也不带 base64 的Excel(命令行 --structured)。TABLE_MERGE_PAGES 为 True 时把跨页的续表拼成一个表格
+# (命令行 --merge-pages)，只拼接开头是重复表头或者没有表头的续表，默认关闭
+TABLE_STRUCTURED = False
+TABLE_MERGE_PAGES = False
 
 def load_config():
     try:
@@ -18,15 +123,27 @@ def load_config():
         if not config.has_section('API'):
             raise configparser.Error("配置文件中缺少 [API] 部分")
             
-        app_id = config['API']['x_ti_app_id']
-        secret_code = config['API']['x_ti_secret_code']
-        
-        if not app_id or not secret_code:
-            raise ValueError("API 凭证不能为空")
-            
+        # [API] 之外的 [API.xxx] 是额外的凭证，可选 qps(各接口购买的QPS) 和 weight(加权轮询的权重)
+        keys = []
+        for section in config.sections():
+            if section != 'API' and not section.startswith('API.'):
+                continue
+            app_id = config[section].get('x_ti_app_id')
+            secret_code = config[section].get('x_ti_secret_code')
+            if not app_id or not secret_code:
+                raise ValueError(f"[{section}] 的 API 凭证不能为空")
+            keys.append({
+                'name': section,
+                'x_ti_app_id': app_id,
+                'x_ti_secret_code': secret_code,
+                'qps': config[section].getfloat('qps', fallback=None),
+                'weight': config[section].getint('weight', fallback=1)
+            })
+
         return {
-            'x_ti_app_id': app_id,
-            'x_ti_secret_code': secret_code
+            'x_ti_app_id': config['API']['x_ti_app_id'],
+            'x_ti_secret_code': config['API']['x_ti_secret_code'],
+            'keys': keys
         }
     except Exception as e:
         print(f"配置文件读取错误 - 行号 {sys.exc_info()[2].tb_lineno}")
@@ -34,86 +151,758 @@ def load_config():
         print(f"错误信息: {str(e)}")
         sys.exit(1)
 
-def get_all_file_paths(directory):#得到所有文件的路径
-    file_paths = []
+def get_key_pool(config, metrics=None):
+    """配置了多组凭证时创建密钥池，只有一组时返回 None，仍使用 RATE_LIMITER"""
+    if len(config['keys']) <= 1:
+        return None
+    credentials = []
+    for key in config['keys']:
+        rates = API_QPS if key['qps'] is None else {url: key['qps'] for url in API_QPS}
+        credentials.append(Credential(key['x_ti_app_id'], key['x_ti_secret_code'], rates=rates,
+                                      weight=key['weight'], name=key['name']))
+    return KeyPool(credentials, strategy=KEY_POOL_STRATEGY, metrics=metrics)
+
+def get_tiler():
+    """按配置创建长图的切片器，TILE_IMAGES 为 False 时返回 None"""
+    if not TILE_IMAGES:
+        return None
+    from Image_Tiling import ImageTiler
+    return ImageTiler(max_height=TILE_BAND_HEIGHT, overlap=TILE_OVERLAP, trigger_height=TILE_TRIGGER_HEIGHT,
+                      min_aspect=TILE_MIN_ASPECT)
+
+def get_splitter():
+    """按配置创建PDF拆分器，未安装 pypdf 时提示后整份上传"""
+    if not PDF_PAGES_PER_CHUNK:
+        return None
+    from Doc_Split import DocSplitter
+    try:
+        return DocSplitter(pages_per_chunk=PDF_PAGES_PER_CHUNK, min_pages=PDF_SPLIT_MIN_PAGES)
+    except ImportError as e:
+        print(f"PDF不拆分: {str(e)}")
+        return None
+
+def get_preprocessor(api_type, cpu_pool=None):
+    """按配置创建图片预处理器，用完需要 close；指定 cpu_pool 时在共享的进程池中处理，否则自建进程池"""
+    if not PREPROCESS_IMAGES:
+        return None
+    from Image_Preprocess import ImagePreprocessor, PreprocessOptions
+    options = PreprocessOptions(max_edge=PREPROCESS_MAX_EDGE, grayscale=PREPROCESS_GRAYSCALE, quality=PREPROCESS_QUALITY,
+                                api_type=api_type)
+    return ImagePreprocessor(options, cpu_pool=cpu_pool)
+
+def get_sink(output_dir, basename, cpu_pool=None):
+    """按配置创建合并结果的输出，未安装 pyarrow 时提示后返回 None(使用默认的Excel)"""
+    from Output_Sink import make_sink
+    options = {'partition_by': PARQUET_PARTITION_BY} if OUTPUT_FORMAT == 'parquet' else {}
+    if OUTPUT_FORMAT in ('excel', 'parquet'):
+        options['cpu_pool'] = cpu_pool  # CSV/JSONL 逐批直接追加，没有 close 时的集中写出
+    try:
+        return make_sink(OUTPUT_FORMAT, output_dir, basename, **options)
+    except ImportError as e:
+        print(f"改为输出Excel: {str(e)}")
+        return None
+
+def iter_file_paths(directory):
+    """逐个产出目录下所有文件的路径，流水线边发现边处理；directory 是文件时只产出它本身"""
+    if not os.path.isdir(directory):
+        yield directory
+        return
     for root, _, files in os.walk(directory):
         for file in files:
-            file_paths.append(os.path.join(root, file))
-    return file_paths
+            yield os.path.join(root, file)
+
+def split_inputs(inputs):
+    """把命令行的输入分成 (文件或目录列表, URL列表)"""
+    paths, urls = [], []
+    for item in inputs:
+        (urls if item.startswith(('http://', 'https://')) else paths).append(item)
+    return paths, urls
+
+def iter_tasks(paths, urls):
+    """文件在前、URL在后，产出 (路径或URL, 是否为URL, URL的序号)，文件的序号为 None"""
+    for path in paths:
+        for file_path in iter_file_paths(path):
+            yield file_path, False, None
+    for url_num, url in enumerate(urls):
+        yield url, True, url_num
 
-def check_files_for_api(file_paths: list, api_type: str) -> list:
+def check_file(checker, path, api_type, ignore_max_dimension=False, ignore_max_size=False, metrics=None,
+               read_content=True):
     """
-    检查文件是否符合API要求，返回符合要求的文件路径列表
-    
+    检查一个文件是否符合API要求，不符合时打印原因
+
     Args:
-        file_paths: 文件路径列表
-        api_type: API类型 ('table_ocr' 或 'extract_ocr')
-        
+        read_content: 是否把不超过 PREFLIGHT_CONTENT_MAX_SIZE 的小文件读入内存，交给上传复用
+
     Returns:
-        list: 符合要求的文件路径列表
-    """
-    checker = FileChecker()
-    valid_files = []
-    
-    for file_path in file_paths:
-        abs_path = os.path.abspath(file_path)
-        is_valid, errors = checker.check(file_path, api_type)
-        
-        if is_valid:
-            valid_files.append(file_path)
-        else:
-            print(f"\n文件不符合要求: {abs_path}")
-            for error in errors:
-                print(f"- {error}")
-    
-    if len(valid_files) == 0:
+        tuple: (是否通过检查, 检查时读入的文件内容或None)
+    """
+    _, is_valid, errors, content = checker.check_cached(
+        path, api_type, ignore_max_dimension, ignore_max_size,
+        reserve=(lambda size: size <= PREFLIGHT_CONTENT_MAX_SIZE) if read_content else None)
+    if metrics is not None:
+        metrics.inc('file_checks_total', api=api_type, result='valid' if is_valid else 'invalid')
+    if not is_valid:
+        print(f"\n文件不符合要求: {os.path.abspath(path)}")
+        for error in errors:
+            print(f"- {error}")
+    return is_valid, content
+
+def relaxed_checks(path, preprocessor, tiled=False):
+    """
+    检查一个文件时放宽哪些限制
+
+    Args:
+        tiled: 是否是要切片的长图(tiler.needs_tiling 的结果，每个文件只算一次)
+
+    Returns:
+        tuple: (不检查最大尺寸, 不检查图片大小)。只有预处理器会重新编码的图片(上传前缩小、压缩)和要切片的长图才放宽；
+               PDF、非图片和不预处理时按接口的原规则检查
+    """
+    preprocessed = preprocessor is not None and preprocessor.handles(path)
+    return preprocessed or tiled, preprocessed
+
+def is_tiled(path, tiler):
+    """文件是否是要切片的长图，检查、预处理和上传共用这一次的结果，不再各自打开图片"""
+    return tiler is not None and tiler.needs_tiling(path)
+
+def prepare_upload(checker, path, api_type, content, preprocessor, tiled=False):
+    """
+    在进程池中缩小并重新编码通过检查的图片；要切片的长图和非图片保持原样
+
+    检查时为预处理器会处理的图片放宽了限制，预处理失败或没有产出内容(如处理后没有变小)时上传的是原文件，
+    这时按原规则再检查一次，超出限制的不上传
+
+    Returns:
+        tuple: (是否上传, 要上传的内容，None 表示上传原文件)
+    """
+    if tiled:
+        return True, content
+    if preprocessor is None or not preprocessor.handles(path):
+        return True, content
+    processed = preprocessor.process(path, content)
+    if processed is not None:
+        return True, processed
+    is_valid, _ = check_file(checker, path, api_type, read_content=False)
+    return is_valid, content
+
+def make_check_stage(api_type, checker, journal, counts, preprocessor=None, tiler=None, metrics=None):
+    """
+    检查阶段：检查文件是否符合API要求，不符合的丢弃；小文件检查时读入的内容交给上传复用
+
+    Args:
+        api_type: API类型 ('table_ocr' 或 'extract_ocr')
+        checker: FileChecker
+        journal: 可选的任务日志，通过检查的文件记为 checked
+        counts: {'total': 0, 'valid': 0} 计数字典，检查时累加
+        preprocessor / tiler: 上传前会缩小或切片的图片放宽尺寸和大小检查，见 relaxed_checks；
+                              是否切片记在 item['tiled'] 中，后面的阶段直接使用
+        metrics: 可选的 Metrics.Metrics，按检查结果计数
+    """
+    from Pipeline import Stage
+    lock = threading.Lock()
+
+    def check(task):
+        path, is_url, url_num = task
+        if is_url:
+            return {'path': path, 'is_url': True, 'url_num': url_num, 'content': None, 'tiled': False}
+        tiled = is_tiled(path, tiler)
+        is_valid, content = check_file(checker, path, api_type, *relaxed_checks(path, preprocessor, tiled),
+                                       metrics=metrics)
+        with lock:
+            counts['total'] += 1
+            counts['valid'] += int(is_valid)
+        if not is_valid:
+            return None
+        if journal is not None and journal.state(journal.make_key(path)) is None:
+            journal.record(journal.make_key(path), 'checked')
+        return {'path': path, 'is_url': False, 'url_num': None, 'content': content, 'tiled': tiled}
+
+    return Stage('检查', check, workers=PREFLIGHT_WORKERS)
+
+def make_read_stage(api_type, checker, preprocessor, done=None):
+    """
+    读取/预处理阶段：在进程池中缩小并重新编码图片；要切片的长图保持原样。
+    预处理没有产出内容、原文件又超出接口限制的图片在这里丢弃，见 prepare_upload
+
+    Args:
+        done: 可选的 done(路径) -> bool，日志中已完成、上传阶段会直接跳过的文件不再预处理
+    """
+    from Pipeline import Stage
+
+    def read(item):
+        if preprocessor is None or item['is_url']:
+            return item
+        if done is not None and done(item['path']):
+            return item
+        upload, item['content'] = prepare_upload(checker, item['path'], api_type, item['content'], preprocessor,
+                                                 item['tiled'])
+        return item if upload else None
+
+    return Stage('预处理', read, workers=PREPROCESS_WORKERS)
+
+def finish_metrics(metrics, output_dir):
+    """打印指标汇总，写出JSON运行报告和按配置的 Prometheus 文本"""
+    metrics.print_summary()
+    metrics.save_report(os.path.join(output_dir, METRICS_REPORT_NAME))
+    if PROMETHEUS_FILE:
+        metrics.write_prometheus(PROMETHEUS_FILE)
+
+def close_resources(sink=None, checker=None, preprocessors=(), cpu_pool=None, archive=None, journal=None):
+    """
+    释放批量处理和常驻模式用到的资源并打印统计，在 finally 中调用，出错或中断时也会执行。
+    每一步单独捕获异常，一步失败不影响后面的释放；sink 先于进程池关闭，它的写出可能在进程池中执行
+
+    Args:
+        sink: 尚未关闭的合并输出，正常结束时已经关闭的传 None
+        checker: 保存预检缓存
+        preprocessors: 图片预处理器，None 会被跳过
+        cpu_pool / archive / journal: 进程池、响应归档(写完队列中的响应)和任务日志
+    """
+    steps = []
+    if sink is not None:
+        steps.append(('合并输出', sink.close))
+    if checker is not None:
+        steps.append(('预检缓存', checker.save_cache))
+    for preprocessor in preprocessors:
+        if preprocessor is not None:
+            steps.append(('图片预处理', preprocessor.print_stats))
+            steps.append(('图片预处理', preprocessor.close))
+    if cpu_pool is not None:
+        steps.append(('进程池', cpu_pool.print_stats))
+        steps.append(('进程池', cpu_pool.close))
+    if archive is not None:
+        steps.append(('响应归档', archive.close))
+        steps.append(('响应归档', archive.print_stats))
+    if journal is not None:
+        steps.append(('任务日志', journal.close))
+    for name, step in steps:
+        try:
+            step()
+        except Exception as e:
+            print(f"\n关闭{name}错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+
+def print_check_summary(counts):
+    if counts['valid'] == 0:
         print("\n警告: 没有符合要求的文件可以处理")
     else:
-        print(f"\n共发现 {len(valid_files)}/{len(file_paths)} 个有效文件")
-    
-    return valid_files
+        print(f"\n共发现 {counts['valid']}/{counts['total']} 个有效文件")
+
+def process_with_common_table_ocr(resume=False, inputs=None, output_dir=None, output_order='perpendicula',
+                                  structured=None, merge_pages=None):
+    """
+    批量表格识别：每个文件导出一个Excel，非 excel 格式时另外合并输出所有表格
 
-def process_with_common_table_ocr():
+    Args:
+        inputs: 文件、目录或URL的列表，默认 TABLE_INPUTS
+        output_dir: 输出目录，默认 TABLE_OUTPUT_DIR
+        structured: 为 True 时不导出每个文件的Excel，请求结构化的表格JSON并把所有表格合并输出，默认 TABLE_STRUCTURED
+        merge_pages: structured 时是否把跨页的续表拼成一个表格，默认 TABLE_MERGE_PAGES
+    """
+    from Get_Table import CommonTableOcr
+    from Job_Journal import JobJournal
+    from Output_Sink import ExcelSink
+    from Pipeline import Pipeline, Stage
+    from Upload_Stream import MemoryMonitor
+    from Cpu_Pool import CpuPool
+    from File_Check import FileChecker
+    from Http_Transport import get_default_transport
+    from Response_Cache import ResponseCache
+    from Response_Archive import ResponseArchive
+    cpu_pool = archive = journal = checker = preprocessor = sink = None
     try:
-        test_table_dir = './Test_table'
-        # output_dir = './Output'
-        # if not os.path.exists(output_dir):
-        #     os.makedirs(output_dir)
-        file_paths = get_all_file_paths(test_table_dir)
-        valid_files = check_files_for_api(file_paths, 'table_ocr')
-        urls = []
-
-        if valid_files:  # 只在有有效文件时继续处理
-            config = load_config()
-            ocr = CommonTableOcr(config['x_ti_app_id'], config['x_ti_secret_code'])
-            ocr.recognize(valid_files, urls)
+        paths, urls = split_inputs(inputs or TABLE_INPUTS)
+        output_dir = output_dir or TABLE_OUTPUT_DIR
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        journal = JobJournal(output_dir, resume=resume)
+        structured = TABLE_STRUCTURED if structured is None else structured
+        merge_pages = TABLE_MERGE_PAGES if merge_pages is None else merge_pages
+
+        config = load_config()
+        cpu_pool = CpuPool(CPU_WORKERS)  # 先于网络和归档线程启动工作进程
+        transport = get_default_transport()
+        cache = ResponseCache(CACHE_DIR, CACHE_MAX_BYTES)
+        archive = ResponseArchive(os.path.join(output_dir, 'archive'), compression=ARCHIVE_COMPRESSION)
+        metrics = get_default_metrics()
+        key_pool = get_key_pool(config, metrics)
+        ocr = CommonTableOcr(config['x_ti_app_id'], config['x_ti_secret_code'], transport=transport,
+                             rate_limiter=RATE_LIMITER, cache=cache, archive=archive,
+                             save_json=SAVE_JSON_DUMPS, metrics=metrics, cpu_pool=cpu_pool,
+                             key_pool=key_pool)
+        checker = FileChecker(PREFLIGHT_CACHE_PATH)
+        preprocessor = get_preprocessor('table_ocr', cpu_pool)
+        splitter = get_splitter()
+        if structured:
+            sink = get_sink(output_dir, 'tables', cpu_pool) or ExcelSink(os.path.join(output_dir, 'tables.xlsx'),
+                                                                      cpu_pool=cpu_pool)
+        else:
+            sink = get_sink(output_dir, 'tables', cpu_pool) if OUTPUT_FORMAT != 'excel' else None
+        counts = {'total': 0, 'valid': 0}
+        written_keys = []
+
+        def upload(item):
+            content = item.pop('content')  # 上传后不再需要，尽早释放
+            if structured:
+                item['tables'] = ocr.recognize_tables(item['path'], item['is_url'], output_dir,
+                                                      output_order=output_order, journal=journal, splitter=splitter,
+                                                      content=content, merge_pages=merge_pages)
+                return item if item['tables'] is not None else None
+            item['uploaded'] = ocr.upload_one(item['path'], item['is_url'], output_dir, output_order=output_order,
+                                              journal=journal, splitter=splitter, content=content)
+            return item if item['uploaded'] is not None else None
+
+        def save(item):
+            # 按输入顺序改名并追加到合并输出
+            if structured:
+                ocr.append_tables_to_sink(sink, item['path'], item['tables'])
+                written_keys.append(journal.make_key(item['path'], item['is_url']))
+                return item['path']
+            saved_path = ocr.save_one(item['uploaded'], item['path'], item['is_url'], output_dir,
+                                      url_num=item['url_num'], journal=journal)
+            if sink is not None and saved_path:
+                ocr.append_to_sink(sink, item['path'], saved_path)
+            return saved_path
+
+        pipeline = Pipeline([
+            make_check_stage('table_ocr', checker, journal, counts, preprocessor=preprocessor, metrics=metrics),
+            make_read_stage('table_ocr', checker, preprocessor, done=lambda path: journal.reached(journal.make_key(path),
+                                                                            'parsed' if structured else 'written')),
+            Stage('上传', upload, workers=MAX_WORKERS),
+            Stage('保存', save)
+        ], queue_size=PIPELINE_QUEUE_SIZE, metrics=metrics)
+        with MemoryMonitor() as monitor:
+            pipeline.run(iter_tasks(paths, urls))
+            if sink is not None:
+                with metrics.timer('sink_close_seconds', api='table'):
+                    written, sink = sink.close(), None
+                if written:
+                    print(f"合并结果已保存至 {', '.join(written)}")
+        # 结构化模式的合并结果每次都由本次(续跑时包括日志中)的全部表格重新生成
+        for key in written_keys:
+            if written and journal.state(key) == 'parsed':
+                journal.record(key, 'written', output=written)
+        print_check_summary(counts)
+        pipeline.print_stats()
+        monitor.print_report()
+        transport.print_stats()
+        if key_pool is not None:
+            key_pool.print_stats()
+        cache.print_stats()
+        finish_metrics(metrics, output_dir)
     except Exception as e:
         print(f"通用表格识别错误 - 行号 {sys.exc_info()[2].tb_lineno}")
         print(f"错误类型: {type(e).__name__}")
         print(f"错误信息: {str(e)}")
+    finally:
+        close_resources(sink, checker, [preprocessor], cpu_pool, archive, journal)
 
-def process_with_intellect_extract_ocr():
+def process_with_intellect_extract_ocr(resume=False, inputs=None, output_dir=None, fields_key=None, table_key=None):
+    """
+    批量智能提取：所有文件的 Fields/TableCells 按输入顺序合并输出
+
+    Args:
+        inputs: 文件、目录或URL的列表，默认 EXTRACT_INPUTS
+        output_dir: 输出目录，默认 EXTRACT_OUTPUT_DIR
+        fields_key / table_key: 要提取的字段和表头，默认 EXTRACT_FIELDS_KEY、EXTRACT_TABLE_KEY
+    """
+    from Get_Extract import IntellectExtractOcr
+    from Image_Dedup import DedupIndex
+    from Job_Journal import JobJournal
+    from Output_Sink import ExcelSink
+    from Pipeline import Pipeline, Stage
+    from Upload_Stream import MemoryMonitor
+    from Cpu_Pool import CpuPool
+    from File_Check import FileChecker
+    from Http_Transport import get_default_transport
+    from Response_Cache import ResponseCache
+    from Response_Archive import ResponseArchive
+    cpu_pool = archive = journal = checker = preprocessor = sink = None
     try:
-        test_table_dir = './Test_Extract'
-        output_dir = './Output_Extract'
+        paths, urls = split_inputs(inputs or EXTRACT_INPUTS)
+        output_dir = output_dir or EXTRACT_OUTPUT_DIR
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
-        file_paths = get_all_file_paths(test_table_dir)
-        valid_files = check_files_for_api(file_paths, 'extract_ocr')
-        urls = []
-        fields_key = []
-        #table_key = ["排名","国家定位","校名","学校档次","一级硕士点数量","A+数","A数","A-数","A+及A数","A类总数","总量积分"]
-        table_key =["省份","类别","文科分数线","理科分数线","其他分数线"]
-        if valid_files:  # 只在有有效文件时继续处理
-            config = load_config()
-            ocr = IntellectExtractOcr(config['x_ti_app_id'], config['x_ti_secret_code'])
-            ocr.recognize(valid_files, urls, table_key=table_key, output_dir=output_dir, output_filename='combined.xlsx')
+        journal = JobJournal(output_dir, resume=resume)
+        fields_key = EXTRACT_FIELDS_KEY if fields_key is None else fields_key
+        table_key = EXTRACT_TABLE_KEY if table_key is None else table_key
+
+        config = load_config()
+        cpu_pool = CpuPool(CPU_WORKERS)  # 先于网络和归档线程启动工作进程
+        transport = get_default_transport()
+        cache = ResponseCache(CACHE_DIR, CACHE_MAX_BYTES)
+        archive = ResponseArchive(os.path.join(output_dir, 'archive'), compression=ARCHIVE_COMPRESSION)
+        metrics = get_default_metrics()
+        key_pool = get_key_pool(config, metrics)
+        ocr = IntellectExtractOcr(config['x_ti_app_id'], config['x_ti_secret_code'], transport=transport,
+                                  rate_limiter=RATE_LIMITER, cache=cache, archive=archive,
+                                  save_json=SAVE_JSON_DUMPS, metrics=metrics, key_pool=key_pool)
+        checker = FileChecker(PREFLIGHT_CACHE_PATH)
+        preprocessor = get_preprocessor('extract_ocr', cpu_pool)
+        splitter = get_splitter()
+        tiler = get_tiler()
+        sink = get_sink(output_dir, 'combined', cpu_pool) or ExcelSink(os.path.join(output_dir, 'combined.xlsx'),
+                                                                    cpu_pool=cpu_pool)
+        counts = {'total': 0, 'valid': 0}
+        written_keys = []
+        dedup = DedupIndex(DEDUP_MAX_DISTANCE, cpu_pool=cpu_pool, metrics=metrics) if DEDUP_IMAGES else None
+
+        def duplicate_of(path):
+            return dedup.representative(path) if dedup is not None else None
+
+        def upload(item):
+            content = item.pop('content')  # 上传后不再需要，尽早释放
+            if not item['is_url'] and duplicate_of(item['path']) is not None:
+                item['uploaded'] = None  # 不上传，输出时复用代表文件的结果
+                return item
+            item['uploaded'] = ocr.upload_one(item['path'], item['is_url'], fields_key, table_key, journal=journal,
+                                              tiler=tiler, splitter=splitter, content=content, tiled=item['tiled'],
+                                              output_dir=output_dir)
+            return item if item['uploaded'] is not None else None
+
+        def parse(item):
+            if item['uploaded'] is None:
+                return item
+            item['result'] = ocr.parse_one(item.pop('uploaded'), item['path'], item['is_url'], fields_key,
+                                           table_key, output_dir, journal=journal)
+            return item
+
+        def write(item):
+            # 按输入顺序追加，不在内存中累积整个批次；代表文件总在它的重复文件之前输出，结果已存入任务日志
+            if 'result' not in item:
+                item['result'] = ocr.share_result(item['path'], duplicate_of(item['path']), journal)
+            fields_df, table_cells_df = item['result']
+            sink.append('Fields', fields_df, source=item['path'])
+            sink.append('TableCells', table_cells_df, source=item['path'])
+            written_keys.append(journal.make_key(item['path'], item['is_url']))
+            return item['path']
+
+        pipeline = Pipeline([
+            make_check_stage('extract_ocr', checker, journal, counts, preprocessor=preprocessor, tiler=tiler,
+                             metrics=metrics),
+            make_read_stage('extract_ocr', checker, preprocessor,
+                            done=lambda path: (journal.reached(journal.make_key(path), 'parsed') or
+                                               duplicate_of(path) is not None)),
+            Stage('上传', upload, workers=MAX_WORKERS),
+            Stage('解析', parse, workers=PARSE_WORKERS),
+            Stage('输出', write)
+        ], queue_size=PIPELINE_QUEUE_SIZE, metrics=metrics)
+        with MemoryMonitor() as monitor:
+            tasks = iter_tasks(paths, urls)
+            pipeline.run(dedup.iter_tasks(tasks) if dedup is not None else tasks)
+            # 合并结果每次都由本次(续跑时包括日志中)的全部结果重新生成，只在有数据时写出
+            with metrics.timer('sink_close_seconds', api='extract'):
+                written, sink = sink.close(), None
+        for key in written_keys:
+            if written and journal.state(key) == 'parsed':
+                journal.record(key, 'written', output=written)
+        print_check_summary(counts)
+        print("处理完成,文件已经保存在: ", output_dir)
+        if dedup is not None:
+            dedup.print_stats()
+        pipeline.print_stats()
+        monitor.print_report()
+        transport.print_stats()
+        if key_pool is not None:
+            key_pool.print_stats()
+        cache.print_stats()
+        finish_metrics(metrics, output_dir)
     except Exception as e:
         print(f"智能提取识别错误 - 行号 {sys.exc_info()[2].tb_lineno}")
         print(f"错误类型: {type(e).__name__}")
         print(f"错误信息: {str(e)}")
+    finally:
+        close_resources(sink, checker, [preprocessor], cpu_pool, archive, journal)
+
+def make_table_runner(ocr, checker, preprocessor, splitter, metrics):
+    """
+    逐个处理的表格识别(常驻模式和任务服务共用)：检查、预处理、上传并保存为Excel
+
+    Returns:
+        函数 run(路径或URL, 是否为URL, 输出目录, 选项) -> 结果文件路径列表，失败时为空列表；
+        选项可以有 output_order
+    """
+    def run(path, is_url, output_dir, options):
+        os.makedirs(output_dir, exist_ok=True)
+        content = None
+        if not is_url:
+            is_valid, content = check_file(checker, path, 'table_ocr', *relaxed_checks(path, preprocessor),
+                                           metrics=metrics)
+            if is_valid:
+                is_valid, content = prepare_upload(checker, path, 'table_ocr', content, preprocessor)
+            if not is_valid:
+                return []
+        uploaded = ocr.upload_one(path, is_url, output_dir, output_order=options.get('output_order', 'perpendicula'),
+                                  splitter=splitter, content=content)
+        saved_path = ocr.save_one(uploaded, path, is_url, output_dir, url_num=0 if is_url else None)
+        return [saved_path] if saved_path else []
+
+    return run
+
+def make_extract_runner(ocr, checker, preprocessor, splitter, metrics, cpu_pool=None, tiler=None):
+    """
+    逐个处理的智能提取(常驻模式和任务服务共用)：Fields/TableCells 按 OUTPUT_FORMAT 单独输出，文件名为输入的文件名
+
+    Returns:
+        函数 run(路径或URL, 是否为URL, 输出目录, 选项) -> 结果文件路径列表，失败时为空列表；
+        选项可以有 fields_key、table_key，没有时使用 EXTRACT_FIELDS_KEY、EXTRACT_TABLE_KEY
+    """
+    from Output_Sink import ExcelSink
+
+    def run(path, is_url, output_dir, options):
+        os.makedirs(output_dir, exist_ok=True)
+        fields_key = options.get('fields_key', EXTRACT_FIELDS_KEY)
+        table_key = options.get('table_key', EXTRACT_TABLE_KEY)
+        content = None
+        tiled = not is_url and is_tiled(path, tiler)
+        if not is_url:
+            is_valid, content = check_file(checker, path, 'extract_ocr', *relaxed_checks(path, preprocessor, tiled),
+                                           metrics=metrics)
+            if is_valid:
+                is_valid, content = prepare_upload(checker, path, 'extract_ocr', content, preprocessor, tiled)
+            if not is_valid:
+                return []
+        uploaded = ocr.upload_one(path, is_url, fields_key, table_key, tiler=tiler, splitter=splitter, content=content,
+                                  tiled=tiled, output_dir=output_dir)
+        fields_df, table_cells_df = ocr.parse_one(uploaded, path, is_url, fields_key, table_key, output_dir)
+        if fields_df is None and table_cells_df is None:
+            return []
+        basename = 'url' if is_url else os.path.splitext(os.path.basename(path))[0]
+        sink = (get_sink(output_dir, basename, cpu_pool) or
+                ExcelSink(os.path.join(output_dir, f'{basename}.xlsx'), cpu_pool=cpu_pool))
+        try:
+            sink.append('Fields', fields_df, source=path)
+            sink.append('TableCells', table_cells_df, source=path)
+        finally:
+            written = sink.close()
+        info(f"结果已保存到: {', '.join(written)}")
+        return written
+
+    return run
+
+def run_watch(inboxes, handle, metrics):
+    """运行常驻模式直到收到 Ctrl+C 或 SIGTERM"""
+    from Watch_Daemon import WatchDaemon
+    daemon = WatchDaemon(inboxes, handle, settle_seconds=WATCH_SETTLE_SECONDS, poll_interval=WATCH_POLL_INTERVAL,
+                         max_workers=MAX_WORKERS, metrics=metrics)
+    daemon.run()
+
+def watch_with_common_table_ocr(inboxes, output_dir=TABLE_OUTPUT_DIR):
+    """常驻模式的表格识别：每个新文件导出一个Excel"""
+    from Get_Table import CommonTableOcr
+    from Cpu_Pool import CpuPool
+    from File_Check import FileChecker
+    from Http_Transport import get_default_transport
+    from Response_Cache import ResponseCache
+    from Response_Archive import ResponseArchive
+    cpu_pool = archive = checker = preprocessor = None
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        config = load_config()
+        cpu_pool = CpuPool(CPU_WORKERS)  # 先于网络和归档线程启动工作进程
+        transport = get_default_transport()
+        cache = ResponseCache(CACHE_DIR, CACHE_MAX_BYTES)
+        archive = ResponseArchive(os.path.join(output_dir, 'archive'), compression=ARCHIVE_COMPRESSION)
+        metrics = get_default_metrics()
+        key_pool = get_key_pool(config, metrics)
+        ocr = CommonTableOcr(config['x_ti_app_id'], config['x_ti_secret_code'], transport=transport,
+                             rate_limiter=RATE_LIMITER, cache=cache, archive=archive,
+                             save_json=SAVE_JSON_DUMPS, metrics=metrics, cpu_pool=cpu_pool,
+                             key_pool=key_pool)
+        checker = FileChecker(PREFLIGHT_CACHE_PATH)
+        preprocessor = get_preprocessor('table_ocr', cpu_pool)
+        splitter = get_splitter()
+
+        run_table = make_table_runner(ocr, checker, preprocessor, splitter, metrics)
+        run_watch(inboxes, lambda path: bool(run_table(path, False, output_dir, {})), metrics)
+        transport.print_stats()
+        if key_pool is not None:
+            key_pool.print_stats()
+        cache.print_stats()
+        finish_metrics(metrics, output_dir)
+    except Exception as e:
+        print(f"通用表格识别错误 - 行号 {sys.exc_info()[2].tb_lineno}")
+        print(f"错误类型: {type(e).__name__}")
+        print(f"错误信息: {str(e)}")
+    finally:
+        close_resources(checker=checker, preprocessors=[preprocessor], cpu_pool=cpu_pool, archive=archive)
+
+def watch_with_intellect_extract_ocr(inboxes, output_dir=EXTRACT_OUTPUT_DIR):
+    """常驻模式的智能提取：每个新文件的 Fields/TableCells 按 OUTPUT_FORMAT 单独输出，文件名为输入的文件名"""
+    from Get_Extract import IntellectExtractOcr
+    from Cpu_Pool import CpuPool
+    from File_Check import FileChecker
+    from Http_Transport import get_default_transport
+    from Response_Cache import ResponseCache
+    from Response_Archive import ResponseArchive
+    cpu_pool = archive = checker = preprocessor = None
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        config = load_config()
+        cpu_pool = CpuPool(CPU_WORKERS)  # 先于网络和归档线程启动工作进程
+        transport = get_default_transport()
+        cache = ResponseCache(CACHE_DIR, CACHE_MAX_BYTES)
+        archive = ResponseArchive(os.path.join(output_dir, 'archive'), compression=ARCHIVE_COMPRESSION)
+        metrics = get_default_metrics()
+        key_pool = get_key_pool(config, metrics)
+        ocr = IntellectExtractOcr(config['x_ti_app_id'], config['x_ti_secret_code'], transport=transport,
+                                  rate_limiter=RATE_LIMITER, cache=cache, archive=archive,
+                                  save_json=SAVE_JSON_DUMPS, metrics=metrics, key_pool=key_pool)
+        checker = FileChecker(PREFLIGHT_CACHE_PATH)
+        preprocessor = get_preprocessor('extract_ocr', cpu_pool)
+        splitter = get_splitter()
+
+        run_extract = make_extract_runner(ocr, checker, preprocessor, splitter, metrics, cpu_pool, get_tiler())
+        run_watch(inboxes, lambda path: bool(run_extract(path, False, output_dir, {})), metrics)
+        transport.print_stats()
+        if key_pool is not None:
+            key_pool.print_stats()
+        cache.print_stats()
+        finish_metrics(metrics, output_dir)
+    except Exception as e:
+        print(f"智能提取识别错误 - 行号 {sys.exc_info()[2].tb_lineno}")
+        print(f"错误类型: {type(e).__name__}")
+        print(f"错误信息: {str(e)}")
+    finally:
+        close_resources(checker=checker, preprocessors=[preprocessor], cpu_pool=cpu_pool, archive=archive)
+
+def serve_jobs(port, host=SERVICE_HOST, work_dir=SERVICE_DIR):
+    """任务服务模式：两个OCR客户端、连接池、限流器和缓存在所有任务间共用，直到收到 Ctrl+C"""
+    from Get_Table import CommonTableOcr
+    from Get_Extract import IntellectExtractOcr
+    from Job_Service import JobService
+    from Cpu_Pool import CpuPool
+    from File_Check import FileChecker
+    from Http_Transport import get_default_transport
+    from Response_Cache import ResponseCache
+    from Response_Archive import ResponseArchive
+    cpu_pool = archive = checker = table_preprocessor = extract_preprocessor = None
+    try:
+        os.makedirs(work_dir, exist_ok=True)
+        config = load_config()
+        cpu_pool = CpuPool(CPU_WORKERS)  # 先于网络和归档线程启动工作进程
+        transport = get_default_transport()
+        cache = ResponseCache(CACHE_DIR, CACHE_MAX_BYTES)
+        archive = ResponseArchive(os.path.join(work_dir, 'archive'), compression=ARCHIVE_COMPRESSION)
+        metrics = get_default_metrics()
+        key_pool = get_key_pool(config, metrics)
+        table_ocr = CommonTableOcr(config['x_ti_app_id'], config['x_ti_secret_code'], transport=transport,
+                                   rate_limiter=RATE_LIMITER, cache=cache, archive=archive,
+                                   save_json=SAVE_JSON_DUMPS, metrics=metrics, cpu_pool=cpu_pool,
+                                   key_pool=key_pool)
+        extract_ocr = IntellectExtractOcr(config['x_ti_app_id'], config['x_ti_secret_code'], transport=transport,
+                                          rate_limiter=RATE_LIMITER, cache=cache, archive=archive,
+                                          save_json=SAVE_JSON_DUMPS, metrics=metrics, key_pool=key_pool)
+        checker = FileChecker(PREFLIGHT_CACHE_PATH)
+        table_preprocessor = get_preprocessor('table_ocr', cpu_pool)
+        extract_preprocessor = get_preprocessor('extract_ocr', cpu_pool)
+        splitter = get_splitter()
+
+        service = JobService({
+            'table': make_table_runner(table_ocr, checker, table_preprocessor, splitter, metrics),
+            'extract': make_extract_runner(extract_ocr, checker, extract_preprocessor, splitter, metrics, cpu_pool,
+                                           get_tiler())
+        }, work_dir, max_workers=MAX_WORKERS, max_queued=SERVICE_MAX_QUEUED,
+            retention_seconds=SERVICE_RETENTION_SECONDS, token=SERVICE_TOKEN, metrics=metrics)
+        service.serve(host, port)
+        transport.print_stats()
+        if key_pool is not None:
+            key_pool.print_stats()
+        cache.print_stats()
+        finish_metrics(metrics, work_dir)
+    except Exception as e:
+        print(f"任务服务错误 - 行号 {sys.exc_info()[2].tb_lineno}")
+        print(f"错误类型: {type(e).__name__}")
+        print(f"错误信息: {str(e)}")
+    finally:
+        close_resources(checker=checker, preprocessors=[table_preprocessor, extract_preprocessor], cpu_pool=cpu_pool,
+                        archive=archive)
+
+def dry_run(api, inputs=None):
+    """只检查输入并列出将要上传的文件和URL：不读取凭证、不发送请求，也不加载 pandas"""
+    from File_Check import FileChecker, is_preprocessable
+    if api == 'table':
+        api_type, tiler = 'table_ocr', None
+        paths, urls = split_inputs(inputs or TABLE_INPUTS)
+    else:
+        api_type, tiler = 'extract_ocr', get_tiler()
+        paths, urls = split_inputs(inputs or EXTRACT_INPUTS)
+    checker = FileChecker(PREFLIGHT_CACHE_PATH)
+    counts = {'total': 0, 'valid': 0}
+    for path, is_url, _ in iter_tasks(paths, urls):
+        if is_url:
+            info(f"将提交URL: {path}")
+            continue
+        # 与 relaxed_checks 相同，但不创建预处理的进程池；预处理后是否真的符合要求要到实际运行时才知道
+        preprocessed = PREPROCESS_IMAGES and is_preprocessable(path)
+        tiled = is_tiled(path, tiler)
+        is_valid, _ = check_file(checker, path, api_type, preprocessed or tiled, preprocessed, read_content=False)
+        counts['total'] += 1
+        counts['valid'] += int(is_valid)
+        if is_valid:
+            info(f"将上传: {path}")
+    checker.save_cache()
+    print_check_summary(counts)
+    if urls:
+        print(f"另有 {len(urls)} 个URL")
+
+def split_keys(value):
+    """命令行中逗号分隔的字段名，空字符串表示不提取"""
+    return [key.strip() for key in value.split(',') if key.strip()]
 
 if __name__ == "__main__":
-    # Uncomment the function you want to use
-    #process_with_common_table_ocr()
-    process_with_intellect_extract_ocr()
+    parser = argparse.ArgumentParser(description='TextIn 表格识别 / 智能提取')
+    parser.add_argument('--api', choices=['extract', 'table'], default='extract', help='智能提取或表格识别')
+    parser.add_argument('-i', '--input', nargs='+', metavar='PATH',
+                        help='要识别的文件、目录或URL，默认智能提取为 ./Test_Extract，表格识别为 ./Test_table')
+    parser.add_argument('-o', '--output', metavar='DIR',
+                        help='输出目录，默认智能提取为 ./Output_Extract，表格识别为 ./Output_table')
+    parser.add_argument('--fields-key', type=split_keys, metavar='KEYS',
+                        help='智能提取的字段，逗号分隔，默认 EXTRACT_FIELDS_KEY')
+    parser.add_argument('--table-key', type=split_keys, metavar='KEYS',
+                        help='智能提取的表头，逗号分隔，默认 EXTRACT_TABLE_KEY')
+    parser.add_argument('--output-order', default='perpendicula', help='表格识别导出Excel的顺序，见接口说明')
+    parser.add_argument('--structured', action='store_true', default=TABLE_STRUCTURED,
+                        help='表格识别不导出每个文件的Excel，直接解析表格JSON并合并输出到 tables.*')
+    parser.add_argument('--merge-pages', action='store_true', default=TABLE_MERGE_PAGES,
+                        help='与 --structured 一起使用，把跨页的续表拼成一个表格')
+    parser.add_argument('--format', choices=['excel', 'csv', 'jsonl', 'parquet'], default=OUTPUT_FORMAT,
+                        help='合并结果的输出格式')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='同时在途的API请求数')
+    parser.add_argument('--cpu-workers', type=int, default=CPU_WORKERS, help='CPU密集步骤的进程数')
+    parser.add_argument('--dry-run', action='store_true', help='只检查输入文件并列出将要上传的内容，不发送请求')
+    parser.add_argument('--resume', action='store_true', help='读取输出目录中的任务日志，跳过上次已完成的文件')
+    parser.add_argument('--watch', nargs='+', metavar='DIR',
+                        help='常驻模式：监视这些收件目录，新文件写完后立即处理，处理完移到其中的 done/failed')
+    parser.add_argument('--serve', type=int, metavar='PORT',
+                        help='任务服务模式：在这个端口接收提交的文件或URL，所有调用方共用工作线程和QPS配额')
+    parser.add_argument('--quiet', action='store_true', default=QUIET, help='不打印逐个文件的信息')
+    parser.add_argument('--metrics-port', type=int, default=PROMETHEUS_PORT,
+                        help='运行期间在这个端口提供 Prometheus 的 /metrics 接口')
+    args = parser.parse_args()
+    set_quiet(args.quiet)
+    MAX_WORKERS = args.workers
+    CPU_WORKERS = args.cpu_workers
+    OUTPUT_FORMAT = args.format
+    if args.dry_run:
+        dry_run(args.api, args.input)
+        sys.exit(0)
+    if args.metrics_port is not None:
+        get_default_metrics().serve_prometheus(args.metrics_port)
+    if args.serve is not None:
+        serve_jobs(args.serve)
+    elif args.watch:
+        if args.api == 'table':
+            watch_with_common_table_ocr(args.watch, args.output or TABLE_OUTPUT_DIR)
+        else:
+            watch_with_intellect_extract_ocr(args.watch, args.output or EXTRACT_OUTPUT_DIR)
+    elif args.api == 'table':
+        process_with_common_table_ocr(resume=args.resume, inputs=args.input, output_dir=args.output,
+                                      output_order=args.output_order, structured=args.structured,
+                                      merge_pages=args.merge_pages)
+    else:
+        process_with_intellect_extract_ocr(resume=args.resume, inputs=args.input, output_dir=args.output,
+                                           fields_key=args.fields_key, table_key=args.table_key)
@@ -0,0 +1,107 @@
+# CPU密集步骤的进程池：合并结果的Excel/CSV/Parquet写出、图片预处理和读取识别出的Excel放到多个进程中执行，
+# 不再全部挤在一个受GIL限制的线程上。进程数与网络并发(MAX_WORKERS)分开配置。
+# 进程间只传文件路径、字节和 Arrow IPC / pickle 5 缓冲区，不直接传递 DataFrame 对象
+
+import os
+import pickle
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import pyarrow as pa
+except ImportError:  # 可选依赖，未安装时 DataFrame 用 pickle 5 传递: pip install pyarrow
+    pa = None
+
+def _noop():
+    return os.getpid()
+
+def dumps_frame(df):
+    """
+    把 DataFrame 编码为可以在进程间传递的字节：优先用 Arrow IPC，列中混有不同类型等 Arrow 不支持时用 pickle 5
+
+    Returns:
+        tuple: ('arrow' 或 'pickle', bytes)，df 为 None 时返回 None
+    """
+    if df is None:
+        return None
+    if pa is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return 'arrow', sink.getvalue().to_pybytes()
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            pass
+    return 'pickle', pickle.dumps(df, protocol=5)
+
+def loads_frame(payload):
+    """dumps_frame 的逆操作"""
+    if payload is None:
+        return None
+    kind, data = payload
+    if kind == 'arrow':
+        return pa.ipc.open_stream(data).read_all().to_pandas()
+    return pickle.loads(data)
+
+class CpuPool(object):
+    def __init__(self, max_workers=None):
+        """
+        创建时立即启动全部工作进程，应在启动网络线程之前创建(fork 出的子进程不会继承运行中的锁)
+
+        Args:
+            max_workers: 进程数，默认为CPU核数
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._executor.submit(_noop).result()
+        self._lock = threading.Lock()
+        self._stats = {}  # 函数名 -> [次数, 耗时]
+
+    def submit(self, func, *args):
+        """
+        提交一个任务，返回 Future。func 必须是模块级函数，参数和返回值都要能 pickle
+
+        Raises:
+            BrokenProcessPool: 工作进程异常退出(如被系统杀掉)后进程池不可再用
+        """
+        return self._executor.submit(func, *args)
+
+    def run(self, func, *args):
+        """在进程池中执行 func 并等待结果；进程池已损坏时打印错误后在当前线程中执行"""
+        began = time.perf_counter()
+        try:
+            result = self.submit(func, *args).result()
+        except BrokenProcessPool as e:
+            print(f"\n进程池错误，改为在当前进程中执行:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+            result = func(*args)
+        elapsed = time.perf_counter() - began
+        with self._lock:
+            stats = self._stats.setdefault(func.__name__, [0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+        return result
+
+    def stats(self):
+        """
+        Returns:
+            dict: 函数名 -> {'tasks': 次数, 'seconds': 等待结果的总耗时}，只统计通过 run 执行的任务
+        """
+        with self._lock:
+            return {name: {'tasks': count, 'seconds': seconds} for name, (count, seconds) in self._stats.items()}
+
+    def print_stats(self):
+        stats = self.stats()
+        if not stats:
+            return
+        tasks = ', '.join(f"{name} {s['tasks']} 次 {s['seconds']:.2f}秒" for name, s in sorted(stats.items()))
+        print(f"进程池({self.max_workers} 个进程): {tasks}")
+
+    def close(self):
+        self._executor.shutdown()
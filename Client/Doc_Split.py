@@ -0,0 +1,105 @@
+# 多页文档拆分：把 PDF 按页(或每 N 页)拆成小文件分别识别，再按页码顺序合并
+
+import importlib.util
+import io
+import os
+
+# 可选依赖，只有启用拆分时才需要: pip install pypdf。第一次遇到PDF时才导入，没有PDF的运行不必加载
+PdfReader = PdfWriter = None
+
+def _load_pypdf():
+    global PdfReader, PdfWriter
+    if PdfReader is None:
+        from pypdf import PdfReader, PdfWriter
+
+class DocSplitter(object):
+    def __init__(self, pages_per_chunk=1, min_pages=2, max_workers=4):
+        """
+        Args:
+            pages_per_chunk: 每个分块包含的页数
+            min_pages: 页数达到这个值的文档才拆分
+            max_workers: 同一个文档的分块同时识别的数量
+        """
+        if importlib.util.find_spec('pypdf') is None:
+            raise ImportError("拆分PDF需要安装 pypdf: pip install pypdf")
+        self.pages_per_chunk = max(1, pages_per_chunk)
+        self.min_pages = min_pages
+        self.max_workers = max_workers
+
+    def needs_split(self, file_path):
+        """
+        是否需要拆分。Word 文档没有固定的分页，只能整份上传，所以只拆 PDF
+        """
+        if os.path.splitext(file_path)[1].lower() != '.pdf':
+            return False
+        try:
+            _load_pypdf()
+            return len(PdfReader(file_path).pages) >= self.min_pages
+        except Exception:
+            return False
+
+    def split(self, file_path):
+        """
+        按页拆分PDF。每个分块单独生成一个PDF，相同页面生成的字节相同，
+        所以按内容缓存时只改了一页的文档只会重新上传那一页
+
+        Returns:
+            list: [(分块第一页的页码(从1开始), 分块PDF字节), ...]，按页码排序
+        """
+        _load_pypdf()
+        reader = PdfReader(file_path)
+        chunks = []
+        for start in range(0, len(reader.pages), self.pages_per_chunk):
+            writer = PdfWriter()
+            for page in reader.pages[start:start + self.pages_per_chunk]:
+                writer.add_page(page)
+            buffer = io.BytesIO()
+            writer.write(buffer)
+            chunks.append((start + 1, buffer.getvalue()))
+        return chunks
+
+def offset_page_numbers(data, offset):
+    """把响应中所有的 page_number 加上分块的起始偏移，变成原文档中的页码"""
+    if offset == 0:
+        return data
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key == 'page_number' and isinstance(value, int):
+                data[key] = value + offset
+            else:
+                offset_page_numbers(value, offset)
+    elif isinstance(data, list):
+        for item in data:
+            offset_page_numbers(item, offset)
+    return data
+
+def merge_excel_chunks(chunks, output=None):
+    """
+    把各分块返回的Excel按页码顺序合并成一个工作簿，每个分块的工作表依次追加
+
+    Args:
+        chunks: [(分块第一页的页码, Excel字节或Excel文件路径), ...]
+        output: 可选的输出文件路径，提供时直接保存到文件
+
+    Returns:
+        bytes 或 str: 合并后的Excel字节；提供 output 时返回 output
+    """
+    from openpyxl import Workbook, load_workbook
+
+    merged = Workbook()
+    merged.remove(merged.active)
+    for first_page, data in sorted(chunks, key=lambda chunk: chunk[0]):
+        workbook = load_workbook(data if isinstance(data, str) else io.BytesIO(data))
+        for sheet in workbook.worksheets:
+            title = f"p{first_page}_{sheet.title}"[:31]
+            target = merged.create_sheet(title)
+            for row in sheet.iter_rows(values_only=True):
+                target.append(row)
+            for cell_range in sheet.merged_cells.ranges:
+                target.merge_cells(str(cell_range))
+    if output is not None:
+        merged.save(output)
+        return output
+    buffer = io.BytesIO()
+    merged.save(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,184 @@
+# 流式读取表格识别响应：边下载边解析JSON，result.excel 的 base64 按块解码直接写入磁盘，
+# 内存中只保留去掉 excel 之后的JSON，单个请求的内存占用不随Excel大小增长
+
+import base64
+import json
+import os
+import re
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+
+# 结构字符和字符串结尾；只关心ASCII字符，UTF-8 多字节字符不会与它们混淆
+_STRUCTURAL = re.compile(rb'["{}\[\]:,]')
+_STRING_END = re.compile(rb'(?:[^"\\]|\\.)*"', re.S)
+
+class Base64FileWriter(object):
+    """把分块到达的 base64 文本解码写入文件，不完整的4字符组留到下一块"""
+
+    def __init__(self, fp):
+        self._fp = fp
+        self._tail = b''
+        self.bytes_written = 0
+
+    def write(self, data):
+        if b'\\' in data:
+            # JSON 里 base64 的 / 可能被转义成 \/
+            data = json.loads(b'"' + data + b'"').encode('ascii')
+        if b'\n' in data or b'\r' in data:
+            data = data.replace(b'\n', b'').replace(b'\r', b'')
+        data = self._tail + data
+        usable = len(data) - len(data) % 4
+        self._tail = data[usable:]
+        if usable:
+            decoded = base64.b64decode(data[:usable])
+            self._fp.write(decoded)
+            self.bytes_written += len(decoded)
+
+    def close(self):
+        if self._tail:
+            raise ValueError(f"base64 数据长度不完整，剩余 {len(self._tail)} 个字符")
+
+class ExcelResponseParser(object):
+    """
+    增量解析JSON响应，路径为 excel_path 的字符串值解码写入 excel_fp，其余内容拼成JSON
+
+    用法: 依次 feed 每块数据，最后 finish 得到去掉 excel 字段的响应
+    """
+
+    def __init__(self, excel_fp, excel_path=('result', 'excel')):
+        self._writer = Base64FileWriter(excel_fp)
+        self._excel_path = list(excel_path)
+        self._skeleton = []
+        self._pending = b''
+        self._stack = []  # 每层一个 [是否为对象, 当前键, 是否等待键]
+        self._in_excel = False
+        self.excel_found = False
+
+    @property
+    def excel_bytes(self):
+        return self._writer.bytes_written
+
+    def _at_excel(self):
+        """当前位置是否正是 excel 字段的值"""
+        if len(self._stack) != len(self._excel_path):
+            return False
+        return all(frame[0] and not frame[2] and frame[1] == key
+                   for frame, key in zip(self._stack, self._excel_path))
+
+    def feed(self, data):
+        buf = self._pending + data if self._pending else data
+        pos = 0
+        size = len(buf)
+        while pos < size:
+            if self._in_excel:
+                end = buf.find(b'"', pos)
+                if end == -1:
+                    # 末尾可能是被切断的转义序列，留到下一块
+                    stop = size
+                    escape = buf.rfind(b'\\', max(pos, size - 6))
+                    if escape != -1:
+                        stop = escape
+                    self._writer.write(buf[pos:stop])
+                    pos = stop
+                    break
+                self._writer.write(buf[pos:end])
+                self._writer.close()
+                self._in_excel = False
+                self._skeleton.append(b'null')
+                pos = end + 1
+                continue
+
+            match = _STRUCTURAL.search(buf, pos)
+            if match is None:
+                self._skeleton.append(buf[pos:])
+                pos = size
+                break
+            i = match.start()
+            char = buf[i:i + 1]
+            frame = self._stack[-1] if self._stack else None
+
+            if char == b'"':
+                is_key = frame is not None and frame[0] and frame[2]
+                if not is_key and self._at_excel():
+                    self._skeleton.append(buf[pos:i])
+                    self._in_excel = True
+                    self.excel_found = True
+                    pos = i + 1
+                    continue
+                end = _STRING_END.match(buf, i + 1)
+                if end is None:
+                    break  # 字符串被切断，等下一块
+                if is_key:
+                    frame[1] = json.loads(buf[i:end.end()])
+                self._skeleton.append(buf[pos:end.end()])
+                pos = end.end()
+                continue
+
+            self._skeleton.append(buf[pos:i + 1])
+            pos = i + 1
+            if char in b'{[':
+                self._stack.append([char == b'{', None, char == b'{'])
+            elif char in b'}]':
+                if not self._stack:
+                    raise ValueError("JSON 括号不匹配")
+                self._stack.pop()
+            elif frame is not None and frame[0]:
+                frame[2] = char == b','
+        self._pending = buf[pos:]
+
+    def finish(self):
+        """
+        Returns:
+            dict: 去掉 excel 字段后的响应JSON
+        """
+        if self._in_excel or self._stack or self._pending.strip():
+            raise ValueError("响应JSON不完整")
+        response_json = json.loads(b''.join(self._skeleton))
+        if self.excel_found:
+            parent = response_json
+            for key in self._excel_path[:-1]:
+                parent = parent[key]
+            parent.pop(self._excel_path[-1], None)
+        return response_json
+
+def read_excel_response(response, excel_file, chunk_size=CHUNK_SIZE):
+    """
+    流式读取 requests 响应(需以 stream=True 发送)，Excel 写入 excel_file
+
+    Returns:
+        tuple: (去掉 result.excel 后的响应JSON, 写入的Excel字节数，响应中没有 Excel 时为 None)
+    """
+    try:
+        with open(excel_file, 'wb') as fp:
+            parser = ExcelResponseParser(fp)
+            for chunk in response.iter_content(chunk_size):
+                parser.feed(chunk)
+            response_json = parser.finish()
+        return response_json, parser.excel_bytes if parser.excel_found else None
+    finally:
+        response.close()
+
+def write_base64_file(excel_base64_str, excel_file, chunk_size=CHUNK_SIZE):
+    """把已经在内存中的 base64 字符串分块解码写入文件(兼容旧的完整响应缓存)"""
+    chunk_size -= chunk_size % 4
+    with open(excel_file, 'wb') as fp:
+        writer = Base64FileWriter(fp)
+        for start in range(0, len(excel_base64_str), chunk_size):
+            writer.write(excel_base64_str[start:start + chunk_size].encode('ascii'))
+        writer.close()
+
+def spool_path(output_dir, suffix='.part.xlsx'):
+    """在输出目录中生成一个临时文件名，识别完成后再改名为最终的文件"""
+    fd, path = tempfile.mkstemp(prefix='.', suffix=suffix, dir=output_dir)
+    os.close(fd)
+    return path
+
+def discard(path):
+    """删除临时文件，不存在时忽略"""
+    if path is None:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
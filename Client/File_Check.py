@@ -1,7 +1,10 @@
 # 检查上传的格式和尺寸是否符合要求，并返回相应的错误信息。
 
 import os
-from PIL import Image
+import io
+import json
+import struct
+import threading
 import logging
 
 # 配置不同API的文件限制规则
@@ -21,6 +24,71 @@ API_RULES = {
     # 可以在这里添加新的API规则
 }
 
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.webp']
+
+def is_preprocessable(file_path):
+    """预处理只处理这些扩展名的图片，PDF 和 Word 等原样上传；放在这里是为了 --dry-run 不必导入 PIL"""
+    return os.path.splitext(file_path)[1].lower() in IMAGE_EXTENSIONS
+
+def _read_jpeg_size(fp):
+    """逐个跳过JPEG段，只读段头，直到遇到SOF段"""
+    fp.seek(2)
+    while True:
+        marker = fp.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        while marker[1] == 0xFF:  # 填充字节
+            marker = marker[1:] + fp.read(1)
+        code = marker[1]
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:  # 没有长度字段的标记
+            continue
+        length_bytes = fp.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack('>H', length_bytes)[0]
+        if code in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+            data = fp.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack('>HH', data[1:5])
+            return width, height
+        fp.seek(length - 2, os.SEEK_CUR)
+
+def read_image_size(fp):
+    """
+    只读取文件头解析图片宽高，支持 PNG/JPEG/BMP/WEBP
+
+    Args:
+        fp: 以二进制方式打开的文件对象(或 BytesIO)
+
+    Returns:
+        tuple 或 None: (宽, 高)，无法识别时返回 None
+    """
+    try:
+        head = fp.read(30)
+        if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+            return struct.unpack('>II', head[16:24])
+        if head.startswith(b'\xff\xd8'):
+            return _read_jpeg_size(fp)
+        if head.startswith(b'BM') and len(head) >= 26:
+            width, height = struct.unpack('<ii', head[18:26])
+            return width, abs(height)
+        if head.startswith(b'RIFF') and head[8:12] == b'WEBP':
+            chunk = head[12:16]
+            if chunk == b'VP8 ' and head[23:26] == b'\x9d\x01\x2a':
+                width, height = struct.unpack('<HH', head[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b'VP8L' and head[20:21] == b'\x2f':
+                bits = struct.unpack('<I', head[21:25])[0]
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if chunk == b'VP8X':
+                width = int.from_bytes(head[24:27], 'little') + 1
+                height = int.from_bytes(head[27:30], 'little') + 1
+                return width, height
+    except (struct.error, OSError, ValueError):
+        pass
+    return None
+
 # 错误类型枚举
 class FileCheckError:
     FILE_NOT_FOUND = "文件不存在"
@@ -30,18 +98,45 @@ class FileCheckError:
     UNKNOWN_API = "未知的API类型"
     READ_ERROR = "文件读取错误"
 
+def image_size(file_path, content=None):
+    """先只读文件头解析宽高，无法识别的格式再交给 PIL(用到时才导入)"""
+    with (io.BytesIO(content) if content is not None else open(file_path, 'rb')) as fp:
+        size = read_image_size(fp)
+    if size is None:
+        from PIL import Image
+        with Image.open(io.BytesIO(content) if content is not None else file_path) as img:
+            size = img.size
+    return size
+
 class FileChecker:
-    def __init__(self):
+    def __init__(self, cache_path: str = None):
+        """
+        Args:
+            cache_path: 可选的检查结果缓存文件，按 (路径, 大小, 修改时间) 记录，未变化的文件不再检查
+        """
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
+        self._cache_path = cache_path
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    self._cache = json.load(f)
+            except Exception as e:
+                self.logger.error(f"检查缓存读取错误: {str(e)}")
 
-    def check(self, file_path: str, api_type: str) -> tuple[bool, list[str]]:
+    def check(self, file_path: str, api_type: str, ignore_max_dimension: bool = False,
+              ignore_max_size: bool = False, content: bytes = None) -> tuple[bool, list[str]]:
         """
         检查文件是否符合指定API的要求
         
         Args:
             file_path: 文件路径
             api_type: API类型 ('table_ocr' 或 'extract_ocr')
+            ignore_max_dimension: 不检查最大尺寸，图片会在上传前切片或缩小时使用
+            ignore_max_size: 不检查图片的文件大小，图片会在上传前重新压缩时使用
+            content: 已读入内存的文件内容，提供时不再从磁盘读取
             
         Returns:
             tuple: (是否通过检查, [错误信息列表])
@@ -65,8 +160,9 @@ class FileChecker:
             
             rules = API_RULES[api_type]
             
-            # 检查文件大小
-            if file_size > rules['max_size']:
+            # 检查文件大小，上传前会重新压缩的图片不检查
+            is_image = ext in IMAGE_EXTENSIONS
+            if file_size > rules['max_size'] and not (ignore_max_size and is_image):
                 errors.append(f"{FileCheckError.FILE_TOO_LARGE}: "
                             f"当前大小 {file_size/1024/1024:.2f}MB, "
                             f"最大限制 {rules['max_size']/1024/1024}MB")
@@ -78,17 +174,17 @@ class FileChecker:
                             f"支持的格式 {', '.join(rules['allowed_extensions'])}")
 
             # 如果是图片，检查尺寸
-            if ext in ['.jpg', '.jpeg', '.png', '.bmp', '.webp']:
+            if is_image:
                 try:
-                    with Image.open(file_path) as img:
-                        width, height = img.size
-                        if (width < rules['min_dimension'] or 
-                            height < rules['min_dimension'] or
-                            width > rules['max_dimension'] or 
-                            height > rules['max_dimension']):
-                            errors.append(f"{FileCheckError.INVALID_DIMENSION}: "
-                                        f"当前尺寸 {width}x{height}, "
-                                        f"要求范围 {rules['min_dimension']}-{rules['max_dimension']}")
+                    width, height = self._image_size(file_path, content)
+                    too_large = (width > rules['max_dimension'] or
+                                 height > rules['max_dimension'])
+                    if (width < rules['min_dimension'] or 
+                        height < rules['min_dimension'] or
+                        (too_large and not ignore_max_dimension)):
+                        errors.append(f"{FileCheckError.INVALID_DIMENSION}: "
+                                    f"当前尺寸 {width}x{height}, "
+                                    f"要求范围 {rules['min_dimension']}-{rules['max_dimension']}")
                 except Exception as e:
                     self.logger.error(f"图片尺寸检查错误: {str(e)}")
                     errors.append(f"{FileCheckError.READ_ERROR}: {str(e)}")
@@ -99,6 +195,58 @@ class FileChecker:
 
         return len(errors) == 0, errors
 
+    @staticmethod
+    def _image_size(file_path: str, content: bytes = None) -> tuple[int, int]:
+        return image_size(file_path, content)
+
+    def check_cached(self, file_path: str, api_type: str, ignore_max_dimension: bool = False,
+                     ignore_max_size: bool = False, reserve=None) -> tuple:
+        """
+        检查单个文件，文件未变化时直接使用缓存的检查结果。可以在多个线程中同时调用
+
+        Args:
+            reserve: 可选的 reserve(文件大小) -> bool，返回 True 时把文件整个读入内存，检查和上传共用同一份内容
+
+        Returns:
+            tuple: (文件路径, 是否通过检查, [错误信息列表], 文件内容或None)
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return file_path, False, [FileCheckError.FILE_NOT_FOUND], None
+        key = (f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}|{api_type}|"
+               f"{int(ignore_max_dimension)}{int(ignore_max_size)}")
+        with self._cache_lock:
+            cached = self._cache.get(key)
+        content = None
+        if reserve is not None and reserve(stat.st_size):
+            try:
+                with open(file_path, 'rb') as fp:
+                    content = fp.read()
+            except OSError:
+                content = None
+        if cached is not None:
+            return file_path, cached[0], cached[1], content
+
+        is_valid, errors = self.check(file_path, api_type, ignore_max_dimension, ignore_max_size, content)
+        with self._cache_lock:
+            self._cache[key] = [is_valid, errors]
+        return file_path, is_valid, errors, content
+
+    def save_cache(self) -> None:
+        """把检查结果缓存写回 cache_path"""
+        if not self._cache_path:
+            return
+        try:
+            with self._cache_lock:
+                data = json.dumps(self._cache, ensure_ascii=False)
+            tmp_path = f"{self._cache_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self._cache_path)
+        except Exception as e:
+            self.logger.error(f"检查缓存保存错误: {str(e)}")
+
     def add_api_rule(self, api_type: str, rule: dict) -> bool:
         """
         添加新的API规则
@@ -1,18 +1,57 @@
 import requests
-import jsonpath
 import base64
 import pandas as pd
-from openpyxl import load_workbook
 import os
 import json
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from Http_Transport import get_default_transport
+from Rate_Limit import get_default_rate_limiter, post_with_retry
+from Upload_Stream import FileUpload, rewind
+from Doc_Split import offset_page_numbers
+from Output_Sink import ExcelSink
+from Metrics import get_default_metrics, info
+
+def _iter_children(node):
+    """与 jsonpath 的 [*] 相同：列表取元素，字典取值，其他类型没有子节点"""
+    if isinstance(node, list):
+        return node
+    if isinstance(node, dict):
+        return list(node.values())
+    return []
 
 class IntellectExtractOcr(object):
-    def __init__(self, app_id, secret_code):
-        self._url =  "https://api.textin.com/ai/service/v1/entity_extraction"
+    URL = "https://api.textin.com/ai/service/v1/entity_extraction"
+
+    def __init__(self, app_id, secret_code, transport=None, rate_limiter=None, cache=None, archive=None,
+                 save_json=True, metrics=None, key_pool=None):
+        self._url = self.URL
         self._app_id = app_id
         self._secret_code = secret_code
+        # 共享的连接池，未指定时与另一个OCR类共用同一个默认实例
+        self._transport = transport if transport is not None else get_default_transport()
+        # 按接口限流，遇到 40306/30203/500 自动退避重试
+        self._rate_limiter = rate_limiter if rate_limiter is not None else get_default_rate_limiter()
+        # 可选的响应缓存(Response_Cache.ResponseCache)，为 None 时不缓存
+        self._cache = cache
+        # 可选的原始响应归档(Response_Archive.ResponseArchive)，在后台线程压缩写入
+        self._archive = archive
+        # 是否在 json_files 中为每个响应单独保存一份缩进的JSON，调试用
+        self._save_json = save_json
+        # 各步骤的耗时和错误码计数(Metrics.Metrics)，未指定时与另一个OCR类共用默认实例
+        self._metrics = metrics if metrics is not None else get_default_metrics()
+        # 可选的密钥池(Key_Pool.KeyPool)，设置后每次请求从池中选一组凭证，app_id/secret_code 不再使用
+        self._key_pool = key_pool
         self.output_num = 0
+        self._counter_lock = threading.Lock()  # 并发时保护 output_num 计数器
+
+    def _next_output_num(self):
+        """原子地分配一个输出编号，保证并发时 JSON/Excel 文件名不冲突"""
+        with self._counter_lock:
+            num = self.output_num
+            self.output_num += 1
+            return num
 
     def _get_file_content(self, filePath):
         try:
@@ -25,42 +64,250 @@ class IntellectExtractOcr(object):
             print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
             raise
 
+    def _open_file_stream(self, filePath):
+        """以流的方式打开待上传文件，上传时按块读取"""
+        try:
+            return FileUpload(filePath)
+        except IOError as e:
+            print(f"\n文件读取错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+            raise
+
     def recognize(self, file_paths, urls, fields_key=[], table_key=[], 
-                  output_dir=r'./Output_Extract', output_filename='combined.xlsx'):
+                  output_dir=r'./Output_Extract', output_filename='combined.xlsx', max_workers=1, journal=None,
+                  tiler=None, splitter=None, preprocessor=None, contents=None, sink=None, dedup=None):
+        """
+        批量识别文件和URL，结果按输入顺序合并输出(默认合并到同一个Excel)
+
+        Args:
+            file_paths: 文件路径列表
+            urls: URL列表
+            fields_key: 字段提取的关键字列表
+            table_key: 表格提取的关键字列表
+            output_dir: 输出目录
+            output_filename: 合并后的Excel文件名
+            max_workers: 同时在途的请求数，1 表示逐个顺序请求
+            journal: 可选的任务日志(Job_Journal.JobJournal)，已解析过的文件直接读取保存的结果
+            tiler: 可选的图片切片器(Image_Tiling.ImageTiler)，超长图片切成横条并行识别后再拼接
+            splitter: 可选的文档拆分器(Doc_Split.DocSplitter)，多页PDF按页拆开并行识别后按页码合并
+            preprocessor: 可选的图片预处理器(Image_Preprocess.ImagePreprocessor)，上传前缩小并重新编码图片
+            contents: 可选的 {文件路径: 文件内容} 字典(如 FileChecker.check_cached 检查时读入的内容)，
+                      有内容的文件直接上传内存中的数据，用过即从字典中移除
+            sink: 可选的输出(Output_Sink 中的 ExcelSink/CsvSink/JsonlSink/ParquetSink)，
+                  Fields 和 TableCells 两个表写入其中；默认写入 output_dir/output_filename 的Excel
+            dedup: 可选的近似重复去重(Image_Dedup.DedupIndex)，每组相似的图片只上传第一张，
+                   其结果同样输出给组内其他文件
+        """
         # Ensure the directory exists
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
         
-        all_fields_dfs = []
-        all_table_cells_dfs = []
+        # 每个文件的结果按输入顺序追加到输出，不在内存中累积整个批次
+        if sink is None:
+            sink = ExcelSink(os.path.join(output_dir, output_filename))
         print("开始处理文件")
-        # 处理文件路径
-        for path in file_paths:
-            fields_df, table_cells_df = self._recognize_onefile(fields_key, table_key, path)
-            if fields_df is not None and not fields_df.empty:
-                all_fields_dfs.append(fields_df)
-            if table_cells_df is not None and not table_cells_df.empty:
-                all_table_cells_dfs.append(table_cells_df)
+        # 文件在前、URL在后，保持原来的处理顺序
+        tasks = [(path, False) for path in file_paths] + [(url, True) for url in urls]
+        if dedup is not None:
+            # 按输入顺序分组，代表文件总在它的重复文件之前
+            for _ in dedup.iter_tasks(tasks):
+                pass
+        shared = {}  # 有重复文件的代表文件 -> 结果
 
-        # 处理URL
-        for url in urls:
-            fields_df, table_cells_df = self._recognize_onefile(fields_key, table_key, url, is_url=True)
-            if fields_df is not None and not fields_df.empty:
-                all_fields_dfs.append(fields_df)
-            if table_cells_df is not None and not table_cells_df.empty:
-                all_table_cells_dfs.append(table_cells_df)
-
-        output_path = os.path.join(output_dir, output_filename)
-        # 只在有数据时写入Excel
-        if all_fields_dfs:
-            self._merge_dataframes_to_excel(all_fields_dfs, output_path, sheet_name='Fields')
-        if all_table_cells_dfs:
-            self._merge_dataframes_to_excel(all_table_cells_dfs, output_path, sheet_name='TableCells')
+        def run(task):
+            img_path, is_url = task
+            if dedup is not None and not is_url and dedup.representative(img_path) is not None:
+                return None  # 结果在 collect 中从代表文件复制
+            content = contents.pop(img_path, None) if contents is not None and not is_url else None
+            uploaded = self.upload_one(img_path, is_url, fields_key, table_key, journal=journal, tiler=tiler,
+                                       splitter=splitter, preprocessor=preprocessor, content=content,
+                                       output_dir=output_dir)
+            return self.parse_one(uploaded, img_path, is_url, fields_key, table_key, output_dir, journal=journal)
+
+        def collect(results):
+            for (img_path, is_url), result in zip(tasks, results):
+                if dedup is not None and not is_url:
+                    representative = dedup.representative(img_path)
+                    if representative is not None:
+                        result = self.share_result(img_path, representative, journal,
+                                                   result=shared.get(representative))
+                    elif img_path in dedup.groups:
+                        shared[img_path] = result
+                fields_df, table_cells_df = result
+                with self._metrics.timer('sink_append_seconds', api='extract'):
+                    sink.append('Fields', fields_df, source=img_path)
+                    sink.append('TableCells', table_cells_df, source=img_path)
+
+        if max_workers > 1 and len(tasks) > 1:
+            # executor.map 按输入顺序返回结果，每个结果到达后立即追加
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                collect(executor.map(run, tasks))
+        else:
+            collect(run(task) for task in tasks)
+
+        # 合并结果每次都由本次(续跑时包括日志中)的全部结果重新生成，只在有数据时写出
+        with self._metrics.timer('sink_close_seconds', api='extract'):
+            written = sink.close()
+        if journal is not None and written:
+            for img_path, is_url in tasks:
+                key = journal.make_key(img_path, is_url)
+                if journal.state(key) == 'parsed':
+                    journal.record(key, 'written', output=written)
         print("处理完成,文件已经保存在: ", output_dir)
 
-    def _save_json_response(self, json_data, output_dir='./Output_Extract'):
+    def upload_one(self, img_path, is_url=False, fields_key=[], table_key=[], journal=None, tiler=None,
+                   splitter=None, preprocessor=None, content=None, tiled=None, output_dir='./Output_Extract'):
+        """
+        上传一个文件或URL并取回响应，不做解析；与 parse_one 配合，可以放在流水线的不同阶段
+
+        Args:
+            content: 已在内存中的文件内容，提供时直接上传它
+            tiled: 调用方已经判断过的是否切片(tiler.needs_tiling 的结果)，None 时在这里判断
+            output_dir: 切片、拆分识别时各横条、分块响应JSON的保存目录
+            其余参数见 recognize
+
+        Returns:
+            dict 或 None: 有 'response' 和 'output_num' 时是等待 parse_one 解析的响应；
+                          有 'result' 时是已经得到的 (fields_df, table_cells_df)(日志中已完成的文件，
+                          或拆分/切片后在内部解析好的文件)；'previous' 是上传前的日志记录。失败时返回 None
+        """
+        previous = None
+        if journal is not None:
+            key = journal.make_key(img_path, is_url)
+            if journal.reached(key, 'parsed'):
+                result = journal.load_result(key)
+                if result is not None:
+                    info(f"跳过已完成的文件: {img_path}")
+                    self._metrics.inc('files_total', api='extract', status='skipped')
+                    return {'result': result, 'done': True}
+            previous = journal.get(key)
+
+        if splitter is not None and not is_url and splitter.needs_split(img_path):
+            result = self._recognize_split(fields_key, table_key, img_path, splitter, journal=journal,
+                                           output_dir=output_dir)
+        elif tiler is not None and not is_url and (tiler.needs_tiling(img_path) if tiled is None else tiled):
+            result = self._recognize_tiled(fields_key, table_key, img_path, tiler, journal=journal,
+                                           output_dir=output_dir)
+        else:
+            if preprocessor is not None and not is_url:
+                processed = preprocessor.process(img_path, content)
+                if processed is not None:
+                    content = processed
+            fetched = self._fetch_response(fields_key, table_key, img_path, is_url, journal=journal, content=content)
+            if fetched is None:
+                self._metrics.inc('files_total', api='extract', status='failed')
+                return None
+            response_json, output_num = fetched
+            return {'response': response_json, 'output_num': output_num, 'previous': previous}
+        if all(df is None for df in result):
+            self._metrics.inc('files_total', api='extract', status='failed')
+            return None
+        return {'result': result, 'previous': previous}
+
+    def parse_one(self, uploaded, img_path, is_url=False, fields_key=[], table_key=[], output_dir='./Output_Extract',
+                  journal=None):
+        """
+        解析 upload_one 取回的响应
+
+        Returns:
+            tuple: (fields_df, table_cells_df)，uploaded 为 None 时返回 (None, None)
+        """
+        if uploaded is None:
+            return None, None
+        if 'response' in uploaded:
+            result = self._parse_response(uploaded['response'], fields_key, table_key, output_dir,
+                                          uploaded['output_num'])
+        else:
+            result = uploaded['result']
+        if not uploaded.get('done'):
+            self._metrics.inc('files_total', api='extract', status='ok')
+        if journal is not None and not uploaded.get('done'):
+            key = journal.make_key(img_path, is_url)
+            # 只有本次确实拿到了响应才记为已解析，失败的文件下次续跑时重新请求
+            if journal.get(key) is not uploaded['previous'] and journal.state(key) == 'uploaded':
+                journal.record(key, 'parsed', result=journal.save_result(key, result))
+        return result
+
+    def share_result(self, img_path, representative, journal=None, result=None):
+        """
+        近似重复的文件不上传，直接使用代表文件的结果
+
+        Args:
+            representative: 代表文件的路径
+            journal: 可选的任务日志，result 为 None 时从中读取代表文件的结果；
+                     重复文件记为 parsed，与代表文件共用同一份保存的结果
+            result: 已在内存中的代表文件结果
+
+        Returns:
+            tuple: (fields_df, table_cells_df)，代表文件识别失败时返回 (None, None)
+        """
+        rep_key = journal.make_key(representative) if journal is not None else None
+        if result is None and journal is not None:
+            result = journal.load_result(rep_key)
+        if result is None or all(df is None for df in result):
+            print(f"\n代表文件识别失败，重复文件没有结果: {img_path} (与 {representative} 重复)")
+            self._metrics.inc('files_total', api='extract', status='failed')
+            return None, None
+        info(f"与 {representative} 重复，复用其结果: {img_path}")
+        self._metrics.inc('files_total', api='extract', status='duplicate')
+        if journal is not None and journal.get(rep_key) and journal.get(rep_key).get('result'):
+            journal.record(journal.make_key(img_path), 'parsed', result=journal.get(rep_key)['result'],
+                           duplicate_of=rep_key)
+        return result
+
+    def _recognize_tiled(self, fields_key, table_key, img_path, tiler, journal=None, output_dir='./Output_Extract'):
+        """把超长图片切成横条并行识别，再按顺序拼接字段和表格结果"""
+        bands = tiler.split(img_path)
+        info(f"图片过长，切成 {len(bands)} 个横条识别: {img_path}")
+
+        def run(indexed_band):
+            i, band = indexed_band
+            return self._recognize_onefile(fields_key, table_key, f"{img_path}#band{i}", output_dir=output_dir,
+                                           content=band)
+
+        with ThreadPoolExecutor(max_workers=tiler.max_workers) as executor:
+            results = list(executor.map(run, enumerate(bands)))
+
+        if all(fields_df is None and table_cells_df is None for fields_df, table_cells_df in results):
+            return None, None
+        if journal is not None:
+            journal.record(journal.make_key(img_path), 'uploaded', bands=len(bands))
+        fields_df = tiler.stitch_fields([fields_df for fields_df, _ in results])
+        table_cells_df = tiler.stitch_tables([table_cells_df for _, table_cells_df in results])
+        return fields_df, table_cells_df
+
+    def _recognize_split(self, fields_key, table_key, img_path, splitter, journal=None, output_dir='./Output_Extract'):
+        """把多页PDF按页拆开并行识别，结果按页码顺序合并"""
+        chunks = splitter.split(img_path)
+        info(f"文档拆分为 {len(chunks)} 个分块识别: {img_path}")
+
+        def run(chunk):
+            first_page, content = chunk
+            return self._recognize_onefile(fields_key, table_key, f"{img_path}#page{first_page}", output_dir=output_dir,
+                                           content=content, page_offset=first_page - 1)
+
+        with ThreadPoolExecutor(max_workers=splitter.max_workers) as executor:
+            results = list(executor.map(run, chunks))
+
+        fields_dfs = [fields_df for fields_df, _ in results if fields_df is not None and not fields_df.empty]
+        table_cells_dfs = [df for _, df in results if df is not None and not df.empty]
+        if not fields_dfs and not table_cells_dfs:
+            return None, None
+        if journal is not None:
+            journal.record(journal.make_key(img_path), 'uploaded', chunks=len(chunks))
+        fields_df = pd.concat(fields_dfs, ignore_index=True) if fields_dfs else None
+        table_cells_df = pd.concat(table_cells_dfs, ignore_index=True) if table_cells_dfs else None
+        return fields_df, table_cells_df
+
+    def _save_json_response(self, json_data, output_dir='./Output_Extract', output_num=None, stamps=None):
         """
         保存API响应的JSON数据到本地文件，并打印印章信息
+
+        Args:
+            output_num: 本次请求分配到的编号，为 None 时使用当前计数器
+            stamps: 已经由 _collect_structure 收集好的印章列表，为 None 时重新遍历
         """
         try:
             # 保存JSON文件
@@ -68,33 +315,15 @@ class IntellectExtractOcr(object):
             if not os.path.exists(json_dir):
                 os.makedirs(json_dir)
             
-            json_path = os.path.join(json_dir, f'{self.output_num}_response.json')
+            if output_num is None:
+                output_num = self.output_num
+            json_path = os.path.join(json_dir, f'{output_num}_response.json')
             with open(json_path, 'w', encoding='utf-8') as f:
                 json.dump(json_data, f, ensure_ascii=False, indent=4)
-            print(f"JSON响应已保存到: {json_path}")
+            info(f"JSON响应已保存到: {json_path}")
             
             # 处理印章信息
-            try:
-                stamps = jsonpath.jsonpath(json_data, '$.result.detail_structure[*].stamps[*]')
-                print("\n印章信息:")
-                if stamps:
-                    for stamp in stamps:
-                        color = stamp.get('color', 'N/A')
-                        stamp_shape = stamp.get('stamp_shape', 'N/A')
-                        stamp_type = stamp.get('type', 'N/A')
-                        value = stamp.get('value', 'N/A')
-                        page_number = stamp.get('page_number', 'N/A')
-                        print(f"颜色: {color}, 形状: {stamp_shape}, 类型: {stamp_type}, "
-                              f"内容: {value}, 页码: {page_number}")
-                else:
-                    print("无印章")
-                print()  # 打印空行作为分隔
-                
-            except Exception as e:
-                print(f"\n印章信息处理错误:")
-                print(f"错误类型: {type(e).__name__}")
-                print(f"错误信息: {str(e)}")
-                print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+            self._parse_stamps(json_data, stamps)
                 
         except IOError as e:
             print(f"\nJSON保存错误:")
@@ -160,8 +389,10 @@ class IntellectExtractOcr(object):
                     'length': 'token超出限制而结束'
                 }
                 status_message = reason_messages.get(finish_reason, '未知的推理状态')
-                print(f"\n推理状态: {status_message}")
+                info(f"\n推理状态: {status_message}")
+                self._metrics.inc('finish_reason_total', api='extract', reason=finish_reason)
                 if finish_reason == 'length':
+                    self._metrics.inc('truncated_responses_total', api='extract')
                     print("警告: 由于token限制，可能未能完全处理所有内容")
             
             return True
@@ -172,7 +403,34 @@ class IntellectExtractOcr(object):
             print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
             return False
 
-    def _recognize_onefile(self, fields_key, table_key, img_path, is_url=False, output_dir='./Output_Extract'):
+    def _recognize_onefile(self, fields_key, table_key, img_path, is_url=False, output_dir='./Output_Extract',
+                           journal=None, content=None, page_offset=0):
+        """
+        识别单个文件或URL，参数见 _fetch_response
+
+        Returns:
+            tuple: (fields_df, table_cells_df)，失败时返回 (None, None)
+        """
+        fetched = self._fetch_response(fields_key, table_key, img_path, is_url, journal=journal, content=content,
+                                       page_offset=page_offset)
+        if fetched is None:
+            return None, None
+        response_json, output_num = fetched
+        return self._parse_response(response_json, fields_key, table_key, output_dir, output_num)
+
+    def _fetch_response(self, fields_key, table_key, img_path, is_url=False, journal=None, content=None,
+                        page_offset=0):
+        """
+        上传单个文件或URL，取回并校验响应(先查缓存)，原始响应交给归档
+
+        Args:
+            img_path: 文件路径或URL，提供 content 时只用来标识来源
+            content: 已在内存中的文件内容(如切片后的横条)，提供时直接上传它
+            page_offset: 文档分块在原文档中的页码偏移，加到响应的 page_number 上
+
+        Returns:
+            tuple 或 None: (响应JSON, 输出编号)，失败时返回 None
+        """
         headers = {
             "x-ti-app-id": self._app_id,
             "x-ti-secret-code": self._secret_code,
@@ -183,46 +441,100 @@ class IntellectExtractOcr(object):
 
         if table_key:
             params["table_header"] = ",".join(table_key)
-        print(f"params={params}")
+        info(f"params={params}")
+        output_num = self._next_output_num()
         
         try:
-            if is_url:
-                headers['Content-Type'] = 'text/plain'
-                img = img_path
-            else:
-                headers['Content-Type'] = 'application/octet-stream'
-                img = self._get_file_content(img_path)
+            # 先查缓存，命中时不再上传
+            cache_key = None
+            response_json = None
+            if self._cache is not None:
+                cache_key = self._cache.make_key(self._url, params, img_path, is_url, content=content)
+                response_json = self._cache.get(cache_key)
+            from_cache = response_json is not None
+
+            if not from_cache:
+                if is_url:
+                    headers['Content-Type'] = 'text/plain'
+                    img = img_path
+                elif content is not None:
+                    headers['Content-Type'] = 'application/octet-stream'
+                    img = content
+                else:
+                    headers['Content-Type'] = 'application/octet-stream'
+                    img = self._open_file_stream(img_path)
 
-            result = requests.post(self._url, data=img, headers=headers, params=params)
-            response_json = result.json()
+                limiter = self._rate_limiter.for_endpoint(self._url)
+                try:
+                    response_json = post_with_retry(
+                        lambda credential=None: self._transport.post(
+                            self._url, data=rewind(img), params=params,
+                            headers=dict(headers, **credential.headers()) if credential else headers),
+                        limiter, label=img_path, metrics=self._metrics, api='extract',
+                        key_pool=self._key_pool, url=self._url)
+                finally:
+                    if isinstance(img, FileUpload):
+                        img.close()
             
             # 使用新方法处理响应状态
             if not self._handle_response_status(response_json, img_path, is_url):
-                return None, None
-            
-            # 保存JSON响应
-            self._save_json_response(response_json, output_dir)
-            
-            return self._json_parser(response_json, fields_key, table_key, output_dir)
+                return None
+
+            if cache_key is not None and not from_cache:
+                self._cache.put(cache_key, response_json)
+            if journal is not None:
+                journal.record(journal.make_key(img_path, is_url), 'uploaded', response_num=output_num)
+            offset_page_numbers(response_json, page_offset)
+
+            if self._archive is not None and not from_cache:
+                self._archive.put(img_path, response_json, is_url=is_url, content=content, response_num=output_num)
+            return response_json, output_num
         
         except requests.exceptions.RequestException as e:
             print(f"\n网络请求错误:")
             print(f"错误类型: {type(e).__name__}")
             print(f"错误信息: {str(e)}")
             print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}\n")
-            return None, None
+            return None
         except Exception as e:
             print(f"\n程序执行错误:")
             print(f"错误类型: {type(e).__name__}")
             print(f"错误信息: {str(e)}")
             print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}\n")
+            return None
+
+    def _parse_response(self, response_json, fields_key, table_key, output_dir='./Output_Extract', output_num=None):
+        """
+        解析已取回的响应，按需保存JSON
+
+        Returns:
+            tuple: (fields_df, table_cells_df)，失败时返回 (None, None)
+        """
+        try:
+            with self._metrics.timer('parse_seconds', api='extract'):
+                # 只遍历一次响应，保存JSON和解析时共用
+                structure = self._collect_structure(response_json)
+                # 保存JSON响应
+                if self._save_json:
+                    self._save_json_response(response_json, output_dir, output_num, stamps=structure[2])
+                return self._json_parser(response_json, fields_key, table_key, output_dir, structure=structure)
+        except Exception as e:
+            print(f"\n响应解析错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
             return None, None
 
-    def _export_single_files(self, fields_df, table_cells_df, output_dir='./Output_Extract'):
+    def _export_single_files(self, fields_df, table_cells_df, output_dir='./Output_Extract', output_num=None):
         """
         导出单个文件的DataFrame到独立的Excel文件
+
+        Args:
+            output_num: 本次请求分配到的编号，为 None 时新分配一个
         """
         try:
+            if output_num is None:
+                output_num = self._next_output_num()
             single_files_dir = os.path.join(output_dir, 'single_files')
             if not os.path.exists(single_files_dir):
                 os.makedirs(single_files_dir)
@@ -230,9 +542,9 @@ class IntellectExtractOcr(object):
             # 导出fields_df
             if fields_df is not None and not fields_df.empty:
                 try:
-                    fields_output_path = os.path.join(single_files_dir, f'{self.output_num}_fields.xlsx')
+                    fields_output_path = os.path.join(single_files_dir, f'{output_num}_fields.xlsx')
                     fields_df.to_excel(fields_output_path, index=False)
-                    print(f"Fields数据已导出到: {fields_output_path}")
+                    info(f"Fields数据已导出到: {fields_output_path}")
                 except Exception as e:
                     print(f"\nFields导出错误:")
                     print(f"错误类型: {type(e).__name__}")
@@ -242,24 +554,63 @@ class IntellectExtractOcr(object):
             # 导出table_cells_df
             if table_cells_df is not None and not table_cells_df.empty:
                 try:
-                    table_output_path = os.path.join(single_files_dir, f'{self.output_num}_table_cells.xlsx')
+                    table_output_path = os.path.join(single_files_dir, f'{output_num}_table_cells.xlsx')
                     table_cells_df.to_excel(table_output_path, index=False)
-                    print(f"Table Cells数据已导出到: {table_output_path}")
+                    info(f"Table Cells数据已导出到: {table_output_path}")
                 except Exception as e:
                     print(f"\nTable Cells导出错误:")
                     print(f"错误类型: {type(e).__name__}")
                     print(f"错误信息: {str(e)}")
                     print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
-            
-            # 增加计数器
-            self.output_num += 1
         except Exception as e:
             print(f"\n文件导出错误:")
             print(f"错误类型: {type(e).__name__}")
             print(f"错误信息: {str(e)}")
             print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
 
-    def _json_parser(self, json_data, fields_key=None, table_key=None, output_dir='./Output_Extract'):
+    @staticmethod
+    def _collect_structure(json_data):
+        """
+        一次遍历 result.detail_structure，同时收集字段、表格单元格和印章。
+        结果分别与 jsonpath 的以下表达式一致：
+        $.result.detail_structure[*].fields
+        $.result.detail_structure[*].tables_relationship[*].cells[*]
+        $.result.detail_structure[*].stamps[*]
+
+        Returns:
+            tuple: (fields列表, table_cells列表, stamps列表)
+        """
+        fields = []
+        table_cells = []
+        stamps = []
+        result = json_data.get('result') if isinstance(json_data, dict) else None
+        detail_structure = result.get('detail_structure') if isinstance(result, dict) else None
+        for item in _iter_children(detail_structure):
+            if not isinstance(item, dict):
+                continue
+            if 'fields' in item:
+                fields.append(item['fields'])
+            if 'tables_relationship' in item:
+                for table in _iter_children(item['tables_relationship']):
+                    if isinstance(table, dict) and 'cells' in table:
+                        table_cells.extend(_iter_children(table['cells']))
+            if 'stamps' in item:
+                stamps.extend(_iter_children(item['stamps']))
+        return fields, table_cells, stamps
+
+    @staticmethod
+    def _ordered_keys(records, preferred_keys):
+        """收集所有记录的键：preferred_keys 中存在的键按其顺序在前，其余键在后；没有 preferred_keys 时按字母排序"""
+        all_keys = set()
+        for record in records:
+            all_keys.update(record.keys())
+        if preferred_keys:
+            keys_to_use = [k for k in preferred_keys if k in all_keys]
+            keys_to_use.extend([k for k in all_keys if k not in preferred_keys])
+            return keys_to_use
+        return sorted(list(all_keys))
+
+    def _json_parser(self, json_data, fields_key=None, table_key=None, output_dir='./Output_Extract', structure=None):
         """
         解析JSON响应数据，按照指定的key顺序处理数据
         
@@ -268,16 +619,16 @@ class IntellectExtractOcr(object):
             fields_key: 字段提取的关键字列表
             table_key: 表格提取的关键字列表
             output_dir: 输出目录
+            structure: 已经由 _collect_structure 收集好的结果，为 None 时重新遍历
         
         Returns:
             tuple: (fields_df, table_cells_df)
         """
         try:
+            fields, table_cells, stamps = structure if structure is not None else self._collect_structure(json_data)
+
             # 解析印章信息
-            self._parse_stamps(json_data)
-            
-            fields = jsonpath.jsonpath(json_data, '$.result.detail_structure[*].fields')
-            table_cells = jsonpath.jsonpath(json_data, '$.result.detail_structure[*].tables_relationship[*].cells[*]')
+            self._parse_stamps(json_data, stamps)
 
             fields_df = None
             table_cells_df = None
@@ -285,34 +636,15 @@ class IntellectExtractOcr(object):
             # 处理fields数据
             if fields and fields[0]:
                 try:
-                    # 收集所有可能的键
-                    all_keys = set()
-                    for field in fields:
-                        all_keys.update(field.keys())
-                    
-                    # 如果提供了fields_key，使用它来过滤和排序键
-                    if fields_key:
-                        keys_to_use = [k for k in fields_key if k in all_keys]
-                        # 添加未在fields_key中但存在的键
-                        keys_to_use.extend([k for k in all_keys if k not in fields_key])
-                    else:
-                        keys_to_use = sorted(list(all_keys))
-                    
-                    # 创建数据字典
-                    data = {key: [] for key in keys_to_use}
+                    keys_to_use = self._ordered_keys(fields, fields_key)
                     max_length = max(len(value_list) for field in fields for value_list in field.values())
-
-                    # 按照指定顺序填充数据
-                    for field in fields:
-                        for key in keys_to_use:
-                            value_list = field.get(key, [])
-                            if value_list:
-                                data[key].append(value_list[0]['value'])
-                            else:
-                                data[key].append(None)
-                            # 填充到最大长度
-                            while len(data[key]) < max_length:
-                                data[key].append(None)
+                    # 每个字段取第一个值；第一条记录之后补 None 到最大长度，其余记录依次排在后面
+                    padding = [None] * (max(max_length, 1) - 1)
+                    data = {}
+                    for key in keys_to_use:
+                        values = [value_list[0]['value'] if value_list else None
+                                  for value_list in (field.get(key, []) for field in fields)]
+                        data[key] = values[:1] + padding + values[1:]
 
                     fields_df = pd.DataFrame(data)
                     
@@ -325,30 +657,13 @@ class IntellectExtractOcr(object):
             # 处理table_cells数据
             if table_cells and table_cells[0]:
                 try:
-                    # 收集所有可能的键
-                    all_keys = set()
-                    for cell in table_cells:
-                        all_keys.update(cell.keys())
-                    
-                    # 如果提供了table_key，使用它来过滤和排序键
-                    if table_key:
-                        keys_to_use = [k for k in table_key if k in all_keys]
-                        # 添加未在table_key中但存在的键
-                        keys_to_use.extend([k for k in all_keys if k not in table_key])
-                    else:
-                        keys_to_use = sorted(list(all_keys))
-                    
-                    # 创建数据字典
+                    keys_to_use = self._ordered_keys(table_cells, table_key)
+                    # 单元格只遍历一次，每列的 append 预先绑定好，省去逐格查找列表
                     cell_data = {key: [] for key in keys_to_use}
-                    
-                    # 按照指定顺序填充数据
+                    appenders = [(key, cell_data[key].append) for key in keys_to_use]
                     for cell in table_cells:
-                        for key in keys_to_use:
-                            if key in cell:
-                                cell_data[key].append(cell[key]['value'])
-                            else:
-                                cell_data[key].append(None)
-
+                        for key, append in appenders:
+                            append(cell[key]['value'] if key in cell else None)
                     table_cells_df = pd.DataFrame(cell_data)
                     
                     # 如果提供了table_key，确保列顺序匹配
@@ -375,11 +690,17 @@ class IntellectExtractOcr(object):
             print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
             return None, None
 
-    def _parse_stamps(self, json_data):
-        """解析印章信息"""
+    def _parse_stamps(self, json_data, stamps=None):
+        """
+        解析并打印印章信息
+
+        Args:
+            stamps: 已经由 _collect_structure 收集好的印章列表，为 None 时重新遍历
+        """
         try:
-            stamps = jsonpath.jsonpath(json_data, '$.result.detail_structure[*].stamps[*]')
-            print("\n印章信息:")
+            if stamps is None:
+                stamps = self._collect_structure(json_data)[2]
+            info("\n印章信息:")
             if stamps:
                 for stamp in stamps:
                     color = stamp.get('color', 'N/A')
@@ -387,53 +708,13 @@ class IntellectExtractOcr(object):
                     stamp_type = stamp.get('type', 'N/A')
                     value = stamp.get('value', 'N/A')
                     page_number = stamp.get('page_number', 'N/A')
-                    print(f"颜色: {color}, 形状: {stamp_shape}, 类型: {stamp_type}, "
+                    info(f"颜色: {color}, 形状: {stamp_shape}, 类型: {stamp_type}, "
                           f"内容: {value}, 页码: {page_number}")
             else:
-                print("无印章")
-            print()  # 打印空行作为分隔
+                info("无印章")
+            info()  # 打印空行作为分隔
         except Exception as e:
             print(f"\n印章信息处理错误:")
             print(f"错误类型: {type(e).__name__}")
             print(f"错误信息: {str(e)}")
             print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
-
-    def _merge_dataframes_to_excel(self, dataframes, output_path, sheet_name='Sheet1'):
-        try:
-            # 检查是否有数据帧需要写入
-            if not dataframes:
-                print(f"没有数据可以写入到 {sheet_name} 表格中")
-                return
-
-            # 如果文件不存在，直接写入
-            if not os.path.exists(output_path):
-                try:
-                    with pd.ExcelWriter(output_path, engine='openpyxl', mode='w') as writer:
-                        pd.concat(dataframes, ignore_index=True).to_excel(
-                            writer,
-                            sheet_name=sheet_name,
-                            index=False
-                        )
-                except Exception as e:
-                    print(f"\nExcel写入错误:")
-                    print(f"错误类型: {type(e).__name__}")
-                    print(f"错误信息: {str(e)}")
-                    print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
-            else:
-                try:
-                    with pd.ExcelWriter(output_path, engine='openpyxl', mode='a') as writer:
-                        pd.concat(dataframes, ignore_index=True).to_excel(
-                            writer,
-                            sheet_name=sheet_name,
-                            index=False
-                        )
-                except Exception as e:
-                    print(f"\nExcel追加错误:")
-                    print(f"错误类型: {type(e).__name__}")
-                    print(f"错误信息: {str(e)}")
-                    print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
-        except Exception as e:
-            print(f"\nExcel处理错误:")
-            print(f"错误类型: {type(e).__name__}")
-            print(f"错误信息: {str(e)}")
-            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
\ No newline at end of file
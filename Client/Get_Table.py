@@ -3,20 +3,153 @@ import json
 import base64
 import pandas as pd
 import os
+import shutil
 import traceback
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from Http_Transport import get_default_transport
+from Rate_Limit import get_default_rate_limiter, post_with_retry
+from Upload_Stream import FileUpload, rewind
+from Doc_Split import offset_page_numbers, merge_excel_chunks
+from Excel_Stream import read_excel_response, write_base64_file, spool_path, discard
+from Metrics import get_default_metrics, info
+from Cpu_Pool import dumps_frame, loads_frame
+from Output_Sink import ExcelSink
+
+def read_excel_sheets(excel_file):
+    """在进程池中执行：读取Excel的所有工作表(openpyxl 解析较慢)，返回 {工作表名: dumps_frame 编码的字节}"""
+    sheets = pd.read_excel(excel_file, sheet_name=None, header=None)
+    return {sheet_name: dumps_frame(df) for sheet_name, df in sheets.items()}
+
+def table_to_frame(table):
+    """
+    把响应中的一个表格(table_cells 的行列位置和文字)转成 DataFrame。
+    合并单元格的文字放在左上角，其余位置为空，与从导出的Excel读出的结果一致
+
+    Returns:
+        DataFrame 或 None: 没有单元格(如纯文本区域)时返回 None
+    """
+    cells = table.get('table_cells') or []
+    if not cells:
+        return None
+    rows = max(table.get('table_rows') or 0, max(cell.get('end_row', cell.get('start_row', 0)) for cell in cells) + 1)
+    cols = max(table.get('table_cols') or 0, max(cell.get('end_col', cell.get('start_col', 0)) for cell in cells) + 1)
+    grid = [[None] * cols for _ in range(rows)]
+    for cell in cells:
+        grid[cell.get('start_row', 0)][cell.get('start_col', 0)] = cell.get('text')
+    return pd.DataFrame(grid, columns=[str(col) for col in range(cols)])
+
+def parse_tables(json_data, first_page=1):
+    """
+    从结构化的识别结果(result.pages[].tables[])中取出每一页的表格
+
+    Args:
+        first_page: 页面没有 page_number 时，第一页的页码
+
+    Returns:
+        list: [(页码, [DataFrame, ...]), ...]，按页面顺序
+    """
+    result = (json_data or {}).get('result') or {}
+    pages = []
+    for index, page in enumerate(result.get('pages') or []):
+        frames = [df for df in (table_to_frame(table) for table in page.get('tables') or []) if df is not None]
+        pages.append((page.get('page_number', first_page + index), frames))
+    return pages
+
+def _cell_kind(value):
+    """单元格的类别：空、数字或文字，用来判断一行像表头还是像数据"""
+    if value is None or (isinstance(value, float) and pd.isna(value)) or not str(value).strip():
+        return 'empty'
+    text = str(value).strip().replace(',', '').replace('，', '').rstrip('%').lstrip('¥$￥+-')
+    try:
+        float(text)
+        return 'number'
+    except ValueError:
+        return 'text'
+
+def _continues(head, df):
+    """
+    df 是否是 head 跨页的续表(列数已相同)。只认两种情况，其余都当作新的表格：
+        1. 续表开头重复了 head 的表头行(逐格相同)
+        2. 续表没有表头：第一行各列的类别(空/数字/文字)与 head 的最后一行相同，并且与 head 的表头行不同
+    """
+    if not len(df) or len(head) < 2:
+        return False
+    first = list(df.iloc[0])
+    if first == list(head.iloc[0]):
+        return True
+    kinds = [_cell_kind(value) for value in first]
+    return (kinds == [_cell_kind(value) for value in head.iloc[-1]] and
+            kinds != [_cell_kind(value) for value in head.iloc[0]])
+
+def merge_continued_tables(pages):
+    """
+    拼接跨页的表格：一页的第一个表格与上一页的最后一个表格列数相同，并且开头是重复的表头或者没有表头时，
+    认为是同一个表格的续表，续表开头重复的表头行去掉。列数相同但有不同表头的表格不拼接
+
+    Args:
+        pages: parse_tables 的返回值，可以是多个分块按页码顺序拼起来的
+
+    Returns:
+        list: [(起始页码, 表格序号, DataFrame), ...]，表格序号在整个文档中从 0 开始
+    """
+    tables = []
+    previous_page = None
+    for page_number, frames in pages:
+        for index, df in enumerate(frames):
+            continued = (index == 0 and tables and previous_page is not None and
+                         page_number == previous_page + 1 and tables[-1][2].shape[1] == df.shape[1] and
+                         _continues(tables[-1][2], df))
+            if not continued:
+                tables.append((page_number, len(tables), df))
+                continue
+            start_page, table_index, head = tables[-1]
+            if len(df) and len(head) and list(df.iloc[0]) == list(head.iloc[0]):
+                df = df.iloc[1:]
+            tables[-1] = (start_page, table_index, pd.concat([head, df], ignore_index=True))
+        previous_page = page_number if frames else None  # 中间隔着没有表格的页时不再拼接
+    return tables
 
 class CommonTableOcr(object):
-    def __init__(self, x_ti_app_id, x_ti_secret_code):
+    URL = 'https://api.textin.com/ai/service/v2/recognize/table/multipage'
+
+    def __init__(self, x_ti_app_id, x_ti_secret_code, transport=None, rate_limiter=None, cache=None, archive=None,
+                 save_json=True, metrics=None, cpu_pool=None, key_pool=None):
         # 通用表格识别
-        self._url = 'https://api.textin.com/ai/service/v2/recognize/table/multipage'
+        self._url = self.URL
         self._app_id = x_ti_app_id
         self._secret_code = x_ti_secret_code
+        # 共享的连接池，未指定时与另一个OCR类共用同一个默认实例
+        self._transport = transport if transport is not None else get_default_transport()
+        # 按接口限流，遇到 40306/30203/500 自动退避重试
+        self._rate_limiter = rate_limiter if rate_limiter is not None else get_default_rate_limiter()
+        # 可选的响应缓存(Response_Cache.ResponseCache)，为 None 时不缓存
+        self._cache = cache
+        # 可选的原始响应归档(Response_Archive.ResponseArchive)，在后台线程压缩写入(不含 base64 的Excel)
+        self._archive = archive
+        # 是否在 Table_json 中为每个响应单独保存一份缩进的JSON(不含 base64 的Excel)，调试用
+        self._save_json = save_json
+        # 各步骤的耗时和错误码计数(Metrics.Metrics)，未指定时与另一个OCR类共用默认实例
+        self._metrics = metrics if metrics is not None else get_default_metrics()
+        # 可选的进程池(Cpu_Pool.CpuPool)，合并输出时在其中读取识别出的Excel
+        self._cpu_pool = cpu_pool
+        # 可选的密钥池(Key_Pool.KeyPool)，设置后每次请求从池中选一组凭证，app_id/secret_code 不再使用
+        self._key_pool = key_pool
 
         self.output_num = 0  # 如果上传的是url，就编号为0 1 2 3 输出
 
         self.test_count=0# 临时测试用的，为了输出json数据编码
 
+        self._counter_lock = threading.Lock()  # 并发时保护 output_num / test_count 计数器
+
+    def _next_count(self, name):
+        """原子地取出并递增名为 name 的计数器，保证并发时输出文件名不冲突"""
+        with self._counter_lock:
+            num = getattr(self, name)
+            setattr(self, name, num + 1)
+            return num
+
     def handle_error_code(self, code):
         """处理API返回的错误码"""
         error_codes = {
@@ -32,6 +165,7 @@ class CommonTableOcr(object):
             40303: "文件类型不支持",
             40304: "图片尺寸不符，图像宽高须介于 20 和 10000（像素）之间",
             40305: "识别文件未上传",
+            40306: "qps超过限制",
             40400: "无效的请求链接，请检查链接是否正确",
             30203: "基础服务故障，请稍后重试",
             500: "服务器内部错误"
@@ -54,54 +188,422 @@ class CommonTableOcr(object):
             print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
             return None
 
-    def recognize(self, file_paths, urls, output_dir='./Output_table', output_order="perpendicula"):# 这个order见API文档
+    def _open_file_stream(self, filePath):
+        """以流的方式打开待上传文件，上传时按块读取"""
+        try:
+            return FileUpload(filePath)
+        except Exception as e:
+            print(f"\n文件读取错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+            return None
+
+    def recognize(self, file_paths, urls, output_dir='./Output_table', output_order="perpendicula", max_workers=1,
+                  journal=None, splitter=None, preprocessor=None, contents=None, sink=None,
+                  structured=False, merge_pages=False):# 这个order见API文档
+        """
+        批量识别文件和URL，每个输入导出一个Excel；structured 为 True 时改为把所有输入的表格合并输出
+
+        Args:
+            file_paths: 文件路径列表
+            urls: URL列表
+            output_dir: 输出目录
+            output_order: 导出Excel的方式，见API文档
+            max_workers: 同时在途的请求数，1 表示逐个顺序请求
+            journal: 可选的任务日志(Job_Journal.JobJournal)，已写出Excel的输入直接跳过
+            splitter: 可选的文档拆分器(Doc_Split.DocSplitter)，多页PDF按页拆开并行识别后合并成一个Excel
+            preprocessor: 可选的图片预处理器(Image_Preprocess.ImagePreprocessor)，上传前缩小并重新编码图片
+            contents: 可选的 {文件路径: 文件内容} 字典(如 FileChecker.check_cached 检查时读入的内容)，
+                      有内容的文件直接上传内存中的数据，用过即从字典中移除
+            sink: 可选的合并输出(Output_Sink 中的 CsvSink/JsonlSink/ParquetSink 等)，
+                  各输入的Excel按输入顺序读出后写入其中的 Tables 表，识别结束时关闭
+            structured: 为 True 时请求结构化的表格JSON，不导出每个输入的Excel，表格按输入顺序写入 sink，
+                        未指定 sink 时写入 output_dir 下的 tables.xlsx
+            merge_pages: structured 时是否把跨页的续表拼成一个表格，默认每页的表格分开输出
+        """
         try:
             if not os.path.exists(output_dir):
                 os.makedirs(output_dir)
-            
-            for file_path in file_paths:
-                result = self._recognize_one(file_path, output_dir, output_order=output_order)
-                if result:
-                    self._save_to_excel(file_path, result, output_dir, is_url=False)
-            for url in urls:
-                result = self._recognize_one(url, output_dir, is_url=True, output_order=output_order)
-                if result:
-                    self._save_to_excel(url, result, output_dir, is_url=True)
+            if structured and sink is None:
+                sink = ExcelSink(os.path.join(output_dir, 'tables.xlsx'), cpu_pool=self._cpu_pool)
+
+            # URL 的输出编号按输入顺序预先分配，并发时也不会冲突
+            tasks = [(file_path, False, None) for file_path in file_paths]
+            tasks += [(url, True, self._next_count('output_num')) for url in urls]
+
+            def run(task):
+                """识别一个输入，返回写出的Excel路径；structured 时返回识别出的表格"""
+                path, is_url, url_num = task
+                content = contents.pop(path, None) if contents is not None and not is_url else None
+                if structured:
+                    return self.recognize_tables(path, is_url, output_dir, output_order=output_order, journal=journal,
+                                                 splitter=splitter, preprocessor=preprocessor, content=content,
+                                                 merge_pages=merge_pages)
+                uploaded = self.upload_one(path, is_url, output_dir, output_order=output_order, journal=journal,
+                                           splitter=splitter, preprocessor=preprocessor, content=content)
+                return self.save_one(uploaded, path, is_url, output_dir, url_num=url_num, journal=journal)
+
+            def collect(results):
+                for (path, _, _), result in zip(tasks, results):
+                    if structured and result is not None:
+                        self.append_tables_to_sink(sink, path, result)
+                    elif sink is not None and result:
+                        self.append_to_sink(sink, path, result)
+
+            if max_workers > 1 and len(tasks) > 1:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    collect(executor.map(run, tasks))
+            else:
+                collect(run(task) for task in tasks)
+            if sink is not None:
+                with self._metrics.timer('sink_close_seconds', api='table'):
+                    written = sink.close()
+                if written:
+                    print(f"合并结果已保存至 {', '.join(written)}")
         except Exception as e:
             print(f"处理识别请求时发生错误: {str(e)}")
             print(f"位置: {traceback.extract_stack()[-1][1]}")
 
-    def _recognize_one(self, img_path, output_dir, is_url=False, output_order="perpendicula"):
+    def upload_one(self, path, is_url=False, output_dir='./Output_table', output_order="perpendicula", journal=None,
+                   splitter=None, preprocessor=None, content=None):
+        """
+        识别一个输入，Excel 写入输出目录中的临时文件，不改名；与 save_one 配合，可以放在流水线的不同阶段
+
+        Args:
+            content: 已在内存中的文件内容，提供时直接上传它
+            其余参数见 recognize
+
+        Returns:
+            dict 或 None: 'excel' 为等待 save_one 改名的临时Excel；日志中已写出的输入为 'output' 和 'done'。
+                          失败时返回 None
+        """
+        if journal is not None:
+            key = journal.make_key(path, is_url)
+            if journal.reached(key, 'written'):
+                info(f"跳过已完成的文件: {path}")
+                self._metrics.inc('files_total', api='table', status='skipped')
+                return {'output': journal.get(key).get('output'), 'done': True}
+        if splitter is not None and not is_url and splitter.needs_split(path):
+            excel_file = self._recognize_split(path, output_dir, splitter, output_order=output_order)
+        else:
+            if preprocessor is not None and not is_url:
+                content = preprocessor.process(path, content) or content
+            excel_file = self._recognize_one(path, output_dir, is_url=is_url, output_order=output_order,
+                                             content=content)
+        if not excel_file:
+            self._metrics.inc('files_total', api='table', status='failed')
+            return None
+        if journal is not None:
+            journal.record(journal.make_key(path, is_url), 'parsed')
+        return {'excel': excel_file}
+
+    def save_one(self, uploaded, path, is_url=False, output_dir='./Output_table', url_num=None, journal=None):
+        """
+        把 upload_one 写好的临时Excel改名为最终的输出文件
+
+        Args:
+            url_num: URL 的输出编号，为 None 时在调用时分配，按调用顺序编号
+
+        Returns:
+            str 或 None: 输出的Excel路径
+        """
+        if uploaded is None:
+            return None
+        if uploaded.get('done'):
+            return uploaded['output']
+        with self._metrics.timer('excel_save_seconds', api='table'):
+            saved_path = self._save_to_excel(path, uploaded['excel'], output_dir, is_url=is_url, url_num=url_num)
+        self._metrics.inc('files_total', api='table', status='ok' if saved_path else 'failed')
+        if journal is not None and saved_path:
+            journal.record(journal.make_key(path, is_url), 'written', output=saved_path)
+        return saved_path
+
+    def append_to_sink(self, sink, path, excel_file):
+        """把一个输入的Excel的每个工作表追加到 sink 的 Tables 表，前两列记录来源文件和工作表名"""
+        with self._metrics.timer('sink_append_seconds', api='table'):
+            try:
+                if self._cpu_pool is not None:
+                    sheets = {sheet_name: loads_frame(payload) for sheet_name, payload
+                              in self._cpu_pool.run(read_excel_sheets, excel_file).items()}
+                else:
+                    sheets = pd.read_excel(excel_file, sheet_name=None, header=None)
+            except Exception as e:
+                print(f"\n读取Excel错误:")
+                print(f"错误类型: {type(e).__name__}")
+                print(f"错误信息: {str(e)}")
+                print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+                return
+            for sheet_name, df in sheets.items():
+                df.columns = [str(column) for column in df.columns]
+                df.insert(0, 'sheet', sheet_name)
+                df.insert(0, 'file', path)
+                sink.append('Tables', df, source=path)
+
+    def recognize_tables(self, path, is_url=False, output_dir='./Output_table', output_order="perpendicula",
+                         journal=None, splitter=None, preprocessor=None, content=None, merge_pages=False):
+        """
+        结构化识别一个输入：请求不带Excel的表格JSON(excel=0)，直接解析成 DataFrame，不为每个输入导出和重新读取Excel。
+        与 append_tables_to_sink 配合，把所有输入的表格合并到一个输出中
+
+        Args:
+            merge_pages: 是否把跨页的续表拼成一个表格，见 merge_continued_tables，默认不拼接
+            其余参数见 recognize
+
+        Returns:
+            list 或 None: [(起始页码, 表格序号, DataFrame), ...]，失败时返回 None
+        """
+        key = journal.make_key(path, is_url) if journal is not None else None
+        if journal is not None and journal.reached(key, 'parsed'):
+            tables = journal.load_result(key)
+            if tables is not None:
+                info(f"跳过已完成的文件: {path}")
+                self._metrics.inc('files_total', api='table', status='skipped')
+                return tables
+
+        pages = None
+        if splitter is not None and not is_url and splitter.needs_split(path):
+            chunks = splitter.split(path)
+            info(f"文档拆分为 {len(chunks)} 个分块识别: {path}")
+
+            def run(chunk):
+                first_page, chunk_content = chunk
+                return self._recognize_structured(f"{path}#page{first_page}", output_dir, output_order=output_order,
+                                                  content=chunk_content, page_offset=first_page - 1)
+
+            with ThreadPoolExecutor(max_workers=splitter.max_workers) as executor:
+                responses = list(executor.map(run, chunks))
+            if any(response is None for response in responses):
+                print(f"部分分块识别失败: {path}")
+            else:
+                pages = [page for (first_page, _), response in zip(chunks, responses)
+                         for page in parse_tables(response, first_page)]
+        else:
+            if preprocessor is not None and not is_url:
+                content = preprocessor.process(path, content) or content
+            response = self._recognize_structured(path, output_dir, is_url=is_url, output_order=output_order,
+                                                  content=content)
+            if response is not None:
+                pages = parse_tables(response)
+        if pages is None:
+            self._metrics.inc('files_total', api='table', status='failed')
+            return None
+
+        if merge_pages:
+            tables = merge_continued_tables(pages)
+        else:
+            frames = [(page_number, df) for page_number, page_frames in pages for df in page_frames]
+            tables = [(page_number, index, df) for index, (page_number, df) in enumerate(frames)]
+        self._metrics.inc('files_total', api='table', status='ok')
+        if journal is not None:
+            journal.record(key, 'parsed', result=journal.save_result(key, tables))
+        return tables
+
+    def append_tables_to_sink(self, sink, path, tables):
+        """把 recognize_tables 得到的表格追加到 sink 的 Tables 表，前三列记录来源文件、起始页码和表格序号"""
+        with self._metrics.timer('sink_append_seconds', api='table'):
+            for page_number, table_index, df in tables:
+                df = df.copy()
+                df.insert(0, 'table', table_index)
+                df.insert(0, 'page', page_number)
+                df.insert(0, 'file', path)
+                sink.append('Tables', df, source=path)
+
+    def _recognize_split(self, img_path, output_dir, splitter, output_order="perpendicula"):
+        """把多页PDF按页拆开并行识别，各分块的Excel按页码顺序合并，任一分块失败则整份失败"""
+        chunks = splitter.split(img_path)
+        info(f"文档拆分为 {len(chunks)} 个分块识别: {img_path}")
+
+        def run(chunk):
+            first_page, content = chunk
+            return self._recognize_one(f"{img_path}#page{first_page}", output_dir, output_order=output_order,
+                                       content=content, page_offset=first_page - 1)
+
+        with ThreadPoolExecutor(max_workers=splitter.max_workers) as executor:
+            results = list(executor.map(run, chunks))
+        merged_file = None
+        try:
+            if any(result is None for result in results):
+                print(f"部分分块识别失败: {img_path}")
+                return None
+            merged_file = spool_path(output_dir)
+            merge_excel_chunks([(first_page, result) for (first_page, _), result in zip(chunks, results)],
+                               output=merged_file)
+            return merged_file
+        except Exception as e:
+            print(f"\n合并Excel错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+            discard(merged_file)
+            return None
+        finally:
+            for result in results:
+                discard(result)
+
+    def _recognize_one(self, img_path, output_dir, is_url=False, output_order="perpendicula", content=None,
+                       page_offset=0):
+        """
+        识别单个文件或URL，Excel 边下载边解码写入输出目录中的临时文件
+
+        Args:
+            content: 已在内存中的文件内容(如PDF分块)，提供时直接上传它，img_path 只用来标识来源
+            page_offset: 文档分块在原文档中的页码偏移，加到响应的 page_number 上
+
+        Returns:
+            str: 临时Excel文件的路径，由 _save_to_excel 改名为最终文件；失败时返回 None
+        """
+        try:
+            excel_file = spool_path(output_dir)
+        except OSError as e:
+            print(f"\n创建临时文件错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+            return None
+        if self._recognize_to_file(img_path, excel_file, output_dir, is_url, output_order, content, page_offset):
+            return excel_file
+        discard(excel_file)
+        return None
+
+    def _recognize_to_file(self, img_path, excel_file, output_dir, is_url, output_order, content, page_offset):
+        """发送识别请求(或读取缓存)，把Excel写入 excel_file，成功时返回 True"""
         try:
-            head = {
-                'x-ti-app-id': self._app_id,
-                'x-ti-secret-code': self._secret_code
-            }
             params = {
                 "excel": 1,
                 "output_order": output_order
             }
 
-            if is_url:
-                head['Content-Type'] = 'text/plain'
-                body = img_path
-            else:
-                image = self._get_file_content(img_path)
-                if image is None:
-                    return None
-                head['Content-Type'] = 'application/octet-stream'
-                body = image
+            # 先查缓存，命中时不再上传
+            cache_key = None
+            json_data = None
+            if self._cache is not None:
+                cache_key = self._cache.make_key(self._url, params, img_path, is_url, content=content)
+                json_data = self._cache.get(cache_key)
+                if json_data is not None:
+                    self._restore_cached_excel(cache_key, json_data, excel_file)
+            from_cache = json_data is not None
 
-            response = requests.post(self._url, data=body, params=params, headers=head)
-            json_data = response.json()
+            if not from_cache:
+                # 流式读取响应，Excel 不在内存中保留完整的 base64 和解码后的副本
+                json_data = self._post(img_path, params, is_url, content,
+                                       read=lambda response: read_excel_response(response, excel_file)[0])
+                if json_data is None:
+                    return False
 
             # 检查错误码
             if 'code' in json_data and json_data['code'] != 200 :
+                self.handle_error_code(json_data['code'])
+                return False
+
+            has_excel = os.path.getsize(excel_file) > 0
+            if cache_key is not None and not from_cache:
+                self._cache.put(cache_key, json_data, blob_path=excel_file if has_excel else None)
+            offset_page_numbers(json_data, page_offset)
+
+            if self._archive is not None and not from_cache:
+                self._archive.put(img_path, json_data, is_url=is_url, content=content)
+            if self._save_json:
+                self._save_json_to_tmp(json_data, output_dir)
+            return has_excel
+
+        except requests.exceptions.RequestException as e:
+            print(f"\n网络请求错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+            return False
+        except json.JSONDecodeError as e:
+            print(f"\nJSON解析错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+            return False
+        except Exception as e:
+            print(f"\n处理请求时发生错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+            return False
+
+    def _post(self, img_path, params, is_url, content, read=None):
+        """
+        上传文件、内存中的内容或URL，限流并在可重试的错误时重试
+
+        Args:
+            read: 可选的函数，传入 requests.Response 返回JSON数据，提供时流式读取响应
+
+        Returns:
+            dict 或 None: 响应JSON，无法打开文件时返回 None
+        """
+        head = {
+            'x-ti-app-id': self._app_id,
+            'x-ti-secret-code': self._secret_code
+        }
+        if is_url:
+            head['Content-Type'] = 'text/plain'
+            body = img_path
+        elif content is not None:
+            head['Content-Type'] = 'application/octet-stream'
+            body = content
+        else:
+            body = self._open_file_stream(img_path)
+            if body is None:
+                return None
+            head['Content-Type'] = 'application/octet-stream'
+
+        limiter = self._rate_limiter.for_endpoint(self._url)
+        try:
+            return post_with_retry(
+                lambda credential=None: self._transport.post(
+                    self._url, data=rewind(body), params=params, stream=read is not None,
+                    headers=dict(head, **credential.headers()) if credential else head),
+                limiter, label=img_path, metrics=self._metrics, api='table',
+                key_pool=self._key_pool, url=self._url, read=read)
+        finally:
+            if isinstance(body, FileUpload):
+                body.close()
+
+    def _recognize_structured(self, img_path, output_dir, is_url=False, output_order="perpendicula", content=None,
+                              page_offset=0):
+        """
+        请求结构化的识别结果(excel=0)：响应中只有各页表格的单元格，不带 base64 的Excel
+
+        Returns:
+            dict 或 None: 响应JSON(页码已加上 page_offset)，失败时返回 None
+        """
+        try:
+            params = {
+                "excel": 0,
+                "output_order": output_order
+            }
+
+            # 先查缓存，命中时不再上传
+            cache_key = None
+            json_data = None
+            if self._cache is not None:
+                cache_key = self._cache.make_key(self._url, params, img_path, is_url, content=content)
+                json_data = self._cache.get(cache_key)
+            from_cache = json_data is not None
+
+            if not from_cache:
+                json_data = self._post(img_path, params, is_url, content)
+                if json_data is None:
+                    return None
+
+            if 'code' in json_data and json_data['code'] != 200:
                 self.handle_error_code(json_data['code'])
                 return None
 
-            self._save_json_to_tmp(json_data, output_dir)
-            return self.json_parser(json_data)
+            if cache_key is not None and not from_cache:
+                self._cache.put(cache_key, json_data)
+            offset_page_numbers(json_data, page_offset)
+
+            if self._archive is not None and not from_cache:
+                self._archive.put(img_path, json_data, is_url=is_url, content=content)
+            if self._save_json:
+                self._save_json_to_tmp(json_data, output_dir)
+            return json_data
 
         except requests.exceptions.RequestException as e:
             print(f"\n网络请求错误:")
@@ -122,6 +624,16 @@ class CommonTableOcr(object):
             print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
             return None
 
+    def _restore_cached_excel(self, cache_key, json_data, excel_file):
+        """把缓存命中的Excel写入 excel_file：新的缓存条目附带解码好的文件，旧条目的JSON中直接带有 base64"""
+        result = json_data.get('result')
+        if isinstance(result, dict) and 'excel' in result:
+            write_base64_file(result.pop('excel'), excel_file)
+            return
+        blob = self._cache.get_blob(cache_key)
+        if blob is not None:
+            shutil.copyfile(blob, excel_file)
+
     def json_parser(self, json_data):
         try:
             if json_data is not None and 'result' in json_data and 'excel' in json_data['result']:
@@ -135,25 +647,28 @@ class CommonTableOcr(object):
             print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
             return None
 
-    def _save_to_excel(self, path, data, output_dir, is_url):
+    def _save_to_excel(self, path, excel_file, output_dir, is_url, url_num=None):
+        """把 _recognize_one 写好的临时Excel改名为最终的输出文件"""
         try:
             if is_url:
-                file_name = f"url_{self.output_num}.xlsx"
-                self.output_num += 1
+                if url_num is None:
+                    url_num = self._next_count('output_num')
+                file_name = f"url_{url_num}.xlsx"
             else:
                 file_name = f"{os.path.splitext(os.path.basename(path))[0]}.xlsx"
             
             file_path = os.path.join(output_dir, file_name)
             os.makedirs(output_dir, exist_ok=True)
 
-            with open(file_path, "wb") as file:
-                file.write(data)
-            print(f"文件已成功保存至 {file_path}")
+            os.replace(excel_file, file_path)
+            info(f"文件已成功保存至 {file_path}")
+            return file_path
         except Exception as e:
             print(f"\n保存Excel文件错误:")
             print(f"错误类型: {type(e).__name__}")
             print(f"错误信息: {str(e)}")
             print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+            discard(excel_file)
 
     def _save_json_to_tmp(self, json_data, output_dir='./Output_Table'):
         """
@@ -164,12 +679,12 @@ class CommonTableOcr(object):
             if not os.path.exists(json_dir):
                 os.makedirs(json_dir)
             
-            file_path = os.path.join(json_dir, f"{self.test_count}.json")
+            test_count = self._next_count('test_count')
+            file_path = os.path.join(json_dir, f"{test_count}.json")
             with open(file_path, 'w', encoding='utf-8') as f:
                 json.dump(json_data, f, ensure_ascii=False, indent=4)
             
-            print(f"{self.test_count}.json 已成功保存")
-            self.test_count += 1
+            info(f"{test_count}.json 已成功保存")
         except Exception as e:
             print(f"\n保存JSON文件错误:")
             print(f"错误类型: {type(e).__name__}")
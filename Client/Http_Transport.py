@@ -0,0 +1,100 @@
+# 所有 TextIn 接口共用的 HTTP 传输层：连接池 + keep-alive + 默认超时
+
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+class _CountingAdapter(HTTPAdapter):
+    """在 urllib3 连接池新建连接时回调计数，用来统计连接复用情况"""
+
+    def __init__(self, on_new_conn, **kwargs):
+        self._on_new_conn = on_new_conn
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        on_new_conn = self._on_new_conn
+
+        class CountingHTTPConnectionPool(HTTPConnectionPool):
+            def _new_conn(self):
+                on_new_conn()
+                return super()._new_conn()
+
+        class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+            def _new_conn(self):
+                on_new_conn()
+                return super()._new_conn()
+
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': CountingHTTPConnectionPool,
+            'https': CountingHTTPSConnectionPool
+        }
+
+class HttpTransport(object):
+    def __init__(self, pool_size=10, connect_timeout=10, read_timeout=120):
+        """
+        Args:
+            pool_size: 每个主机保持的最大连接数，应不小于并发请求数
+            connect_timeout: 建立连接的超时时间(秒)
+            read_timeout: 等待响应的超时时间(秒)
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self._lock = threading.Lock()
+        self._request_count = 0
+        self._new_connections = 0
+
+        self._session = requests.Session()
+        adapter = _CountingAdapter(self._on_new_conn, pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def _on_new_conn(self):
+        with self._lock:
+            self._new_connections += 1
+
+    def post(self, url, **kwargs):
+        """发送POST请求，未指定 timeout 时使用默认超时"""
+        kwargs.setdefault('timeout', self.timeout)
+        response = self._session.post(url, **kwargs)
+        with self._lock:
+            self._request_count += 1
+        return response
+
+    def stats(self):
+        """
+        连接复用统计
+
+        Returns:
+            dict: requests 请求总数, connections 新建连接数,
+                  reused 复用连接的请求数, reuse_rate 复用率
+        """
+        with self._lock:
+            requests_count = self._request_count
+            connections = self._new_connections
+        reused = max(requests_count - connections, 0)
+        return {
+            'requests': requests_count,
+            'connections': connections,
+            'reused': reused,
+            'reuse_rate': reused / requests_count if requests_count else 0.0
+        }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"HTTP请求数: {stats['requests']}, 新建连接数: {stats['connections']}, "
+              f"连接复用率: {stats['reuse_rate']:.1%}")
+
+    def close(self):
+        self._session.close()
+
+_default_transport = None
+_default_lock = threading.Lock()
+
+def get_default_transport():
+    """返回进程内共享的默认传输对象，两个OCR类未指定 transport 时都使用它"""
+    global _default_transport
+    with _default_lock:
+        if _default_transport is None:
+            _default_transport = HttpTransport()
+        return _default_transport
@@ -0,0 +1,205 @@
+# 近似重复图片去重：同一张票据的重复上传、手机拍照和扫描件、重新压缩的转发，字节不同但内容相同，
+# 按感知哈希(pHash + dHash)在海明距离内分组，每组只上传第一张，结果复制给组内其他文件
+
+import os
+import sys
+import threading
+from collections import deque
+import numpy as np
+from PIL import Image, ImageOps
+from Image_Preprocess import IMAGE_EXTENSIONS
+
+def _dct_matrix(n):
+    """n 点 DCT-II 的变换矩阵"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), 'big')
+
+def phash(img, hash_size=8, highfreq_factor=4):
+    """
+    pHash：缩小到 32x32 做二维DCT，取左上角 8x8 的低频系数与中位数比较。
+    对缩放、重新压缩和轻微的亮度变化不敏感
+
+    Args:
+        img: 灰度(L模式)的 PIL 图片
+    """
+    size = hash_size * highfreq_factor
+    pixels = np.asarray(img.resize((size, size), Image.LANCZOS), dtype=np.float64)
+    matrix = _dct_matrix(size)
+    low = (matrix @ pixels @ matrix.T)[:hash_size, :hash_size]
+    return _bits_to_int(low > np.median(low))
+
+def dhash(img, hash_size=8):
+    """dHash：缩小到 9x8，比较每行相邻像素的明暗，反映的是梯度方向"""
+    pixels = np.asarray(img.resize((hash_size + 1, hash_size), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+def image_hashes(file_path, hash_size=8):
+    """
+    计算一张图片的 (pHash, dHash)，可以在进程池中执行
+
+    Returns:
+        tuple 或 None: 不是图片或无法打开时返回 None，这些文件不参与去重
+    """
+    if os.path.splitext(file_path)[1].lower() not in IMAGE_EXTENSIONS:
+        return None
+    try:
+        with Image.open(file_path) as img:
+            # JPEG 解码时直接缩小，大照片不必解码出全部像素
+            img.draft('L', (hash_size * 32, hash_size * 32))
+            # 手机照片按 EXIF 方向摆正，与扫描件的方向一致
+            gray = ImageOps.exif_transpose(img).convert('L')
+            return phash(gray, hash_size), dhash(gray, hash_size)
+    except Exception:
+        return None
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+class BKTree(object):
+    """按海明距离建立的 BK 树：查找距离不超过 max_distance 的所有哈希，不必与每个已有哈希逐一比较"""
+
+    def __init__(self):
+        self._root = None  # [哈希, 值, {距离: 子节点}]
+        self.size = 0
+
+    def add(self, key, value):
+        self.size += 1
+        if self._root is None:
+            self._root = [key, value, {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming(key, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [key, value, {}]
+                return
+            node = child
+
+    def search(self, key, max_distance):
+        """
+        Returns:
+            list: [(距离, 哈希, 值)]，按距离从小到大
+        """
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(key, node[0])
+            if distance <= max_distance:
+                found.append((distance, node[0], node[1]))
+            # 三角不等式：只有距离在 [d - max, d + max] 内的子树可能有匹配
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda item: item[0])
+        return found
+
+class DedupIndex(object):
+    def __init__(self, max_distance=4, hash_size=8, cpu_pool=None, window=32, metrics=None):
+        """
+        Args:
+            max_distance: pHash 和 dHash 的海明距离(64位中不同的位数)都不超过这个值才算重复。
+                          同一模板的不同票据也可能很接近，值越大越容易误合并，建议不超过 6
+            hash_size: 哈希的边长，8 即 64 位
+            cpu_pool: 可选的 Cpu_Pool.CpuPool，在其中的进程里解码图片计算哈希
+            window: iter_tasks 预先提交计算哈希的文件数
+            metrics: 可选的 Metrics.Metrics，按是否重复计数
+        """
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self._cpu_pool = cpu_pool
+        self._window = window
+        self._metrics = metrics
+        self._lock = threading.Lock()
+        self._tree = BKTree()
+        self._dhashes = {}       # 代表文件 -> dHash
+        self._representative = {}  # 重复文件 -> 代表文件
+        self.groups = {}         # 代表文件 -> [重复文件, ...]，只包含有重复的组
+        self.hashed = 0
+
+    def _submit(self, path):
+        if self._cpu_pool is not None:
+            return self._cpu_pool.submit(image_hashes, path, self.hash_size)
+        return None
+
+    def assign(self, path):
+        """
+        把一个文件加入索引，必须按输入顺序调用，保证代表文件总在它的重复文件之前
+
+        Returns:
+            str 或 None: 与已有文件重复时返回代表文件的路径，否则返回 None(本身成为代表文件或不是图片)
+        """
+        return self._add(path, image_hashes(path, self.hash_size))
+
+    def _add(self, path, hashes):
+        if hashes is None:
+            return None
+        p_hash, d_hash = hashes
+        with self._lock:
+            self.hashed += 1
+            representative = None
+            for _, _, candidate in self._tree.search(p_hash, self.max_distance):
+                if hamming(d_hash, self._dhashes[candidate]) <= self.max_distance:
+                    representative = candidate
+                    break
+            if representative is None:
+                self._tree.add(p_hash, path)
+                self._dhashes[path] = d_hash
+            else:
+                self._representative[path] = representative
+                self.groups.setdefault(representative, []).append(path)
+        if self._metrics is not None:
+            self._metrics.inc('dedup_files_total', result='unique' if representative is None else 'duplicate')
+        return representative
+
+    def representative(self, path):
+        """path 是重复文件时返回它的代表文件，否则返回 None"""
+        return self._representative.get(path)
+
+    def iter_tasks(self, tasks):
+        """
+        包装 (路径或URL, 是否为URL, ...) 任务的迭代器：边读取边计算哈希(预先提交 window 个)，按输入顺序分组，
+        原样产出每个任务。URL 不参与去重
+        """
+        pending = deque()
+        for task in tasks:
+            pending.append((task, None if task[1] else self._submit(task[0])))
+            if len(pending) > self._window:
+                yield self._assign_task(*pending.popleft())
+        while pending:
+            yield self._assign_task(*pending.popleft())
+
+    def _assign_task(self, task, future):
+        if task[1]:
+            return task
+        try:
+            hashes = future.result() if future is not None else image_hashes(task[0], self.hash_size)
+        except Exception as e:
+            print(f"\n图片哈希计算错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+            return task
+        self._add(task[0], hashes)
+        return task
+
+    def stats(self):
+        with self._lock:
+            duplicates = len(self._representative)
+            return {
+                'hashed': self.hashed,
+                'duplicates': duplicates,
+                'groups': len(self.groups)
+            }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"去重: 检查图片 {stats['hashed']} 张, 其中 {stats['duplicates']} 张与 {stats['groups']} 张重复，"
+              f"省去 {stats['duplicates']} 次请求")
@@ -0,0 +1,148 @@
+# 上传前的图片预处理：缩小、重新编码(可选灰度化)，减少上传字节数和接口耗时
+
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from File_Check import API_RULES, IMAGE_EXTENSIONS, is_preprocessable
+
+class PreprocessOptions(object):
+    def __init__(self, max_edge=None, target_dpi=None, grayscale=False, image_format='JPEG', quality=85,
+                 api_type='extract_ocr'):
+        """
+        Args:
+            max_edge: 长边的最大像素数，None 表示不限制(仍受接口最大尺寸限制)
+            target_dpi: 图片记录的DPI高于这个值时按比例缩小
+            grayscale: 是否转为灰度图，会丢失印章颜色等彩色信息
+            image_format: 重新编码的格式 'JPEG' 或 'WEBP'
+            quality: 编码质量，超出接口文件大小限制时会自动降低
+            api_type: 按哪个接口的 API_RULES 自动缩小超限的图片
+        """
+        self.max_edge = max_edge
+        self.target_dpi = target_dpi
+        self.grayscale = grayscale
+        self.image_format = image_format
+        self.quality = quality
+        self.api_type = api_type
+
+def _encode(img, image_format, quality):
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format, quality=quality)
+    return buffer.getvalue()
+
+def preprocess_image(file_path, options, content=None):
+    """
+    预处理单张图片，在进程池中执行
+
+    Args:
+        content: 检查时已读入的文件内容，传入时不再读取文件
+
+    Returns:
+        tuple: (处理后的字节, 原文件大小)。不是图片或处理后没有变小时字节为 None，表示上传原文件
+    """
+    original_size = len(content) if content is not None else os.path.getsize(file_path)
+    if not is_preprocessable(file_path):
+        return None, original_size
+
+    from PIL import Image  # 只在进程池中导入，主进程加载本模块时不需要 PIL
+
+    rules = API_RULES[options.api_type]
+    with Image.open(io.BytesIO(content) if content is not None else file_path) as img:
+        img.load()
+        width, height = img.size
+        dpi = img.info.get('dpi', (None,))[0]
+
+        scale = min(1.0, rules['max_dimension'] / max(width, height))
+        if options.max_edge:
+            scale = min(scale, options.max_edge / max(width, height))
+        if options.target_dpi and dpi and dpi > options.target_dpi:
+            scale = min(scale, options.target_dpi / dpi)
+        # 缩小后短边不能低于接口的最小尺寸
+        scale = max(scale, rules['min_dimension'] / min(width, height))
+
+        img = img.convert('L' if options.grayscale else 'RGB')
+        if scale < 1:
+            img = img.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+
+        quality = options.quality
+        data = _encode(img, options.image_format, quality)
+        # 仍然超过大小限制时先降质量，再继续缩小
+        while len(data) > rules['max_size']:
+            if quality > 40:
+                quality -= 15
+            elif min(img.size) * 0.8 < rules['min_dimension']:
+                break
+            else:
+                img = img.resize((max(1, int(img.width * 0.8)), max(1, int(img.height * 0.8))), Image.LANCZOS)
+            data = _encode(img, options.image_format, quality)
+
+    oversized = (original_size > rules['max_size'] or
+                 max(width, height) > rules['max_dimension'])
+    if len(data) >= original_size and not oversized:
+        return None, original_size
+    return data, original_size
+
+class ImagePreprocessor(object):
+    def __init__(self, options=None, max_workers=None, cpu_pool=None):
+        """
+        Args:
+            options: PreprocessOptions，默认彩色 JPEG 质量 85
+            max_workers: 进程池大小，默认为CPU核数；指定 cpu_pool 时不使用
+            cpu_pool: 可选的共享 Cpu_Pool.CpuPool，与其他CPU密集的步骤共用进程，close 时不关闭它
+        """
+        self.options = options if options is not None else PreprocessOptions()
+        self._cpu_pool = cpu_pool
+        self._executor = ProcessPoolExecutor(max_workers=max_workers) if cpu_pool is None else None
+        self._lock = threading.Lock()
+        self.files = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+
+    def handles(self, file_path):
+        """file_path 是否是预处理会重新编码的图片"""
+        return is_preprocessable(file_path)
+
+    def process(self, file_path, content=None):
+        """
+        在进程池中预处理一个文件，可以被多个上传线程同时调用
+
+        Args:
+            content: 检查时已读入的文件内容，传入时随任务交给进程池，不再重新读取文件
+
+        Returns:
+            bytes 或 None: None 表示直接上传原文件
+        """
+        try:
+            executor = self._cpu_pool if self._cpu_pool is not None else self._executor
+            data, original_size = executor.submit(preprocess_image, file_path, self.options, content).result()
+        except Exception as e:
+            print(f"\n图片预处理错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+            return None
+        with self._lock:
+            self.files += 1
+            self.bytes_before += original_size
+            self.bytes_after += len(data) if data is not None else original_size
+        return data
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': self.files,
+                'bytes_before': self.bytes_before,
+                'bytes_after': self.bytes_after,
+                'bytes_saved': self.bytes_before - self.bytes_after
+            }
+
+    def print_stats(self):
+        stats = self.stats()
+        ratio = stats['bytes_saved'] / stats['bytes_before'] if stats['bytes_before'] else 0.0
+        print(f"预处理文件数: {stats['files']}, 上传前 {stats['bytes_before']/1024/1024:.2f}MB, "
+              f"上传 {stats['bytes_after']/1024/1024:.2f}MB, 节省 {ratio:.1%}")
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
@@ -0,0 +1,125 @@
+# 超长/超大图片切片：切成有重叠的横条分别识别，再把表格行拼回一张表。
+# 判断是否切片只读文件头，PIL 和 pandas 到真正切片、拼接时才导入，--dry-run 不需要它们
+
+import io
+from File_Check import image_size
+
+class ImageTiler(object):
+    def __init__(self, max_height=1200, overlap=150, max_width=10000, overlap_rows=10, max_workers=4,
+                 trigger_height=9000, min_aspect=4.0):
+        """
+        Args:
+            max_height: 每个横条的高度(像素)
+            overlap: 相邻横条重叠的高度(像素)，保证每一行至少完整出现在一个横条里
+            max_width: 宽度超过接口限制时先等比缩小到这个宽度
+            overlap_rows: 拼接时在相邻横条首尾各比较多少行来去掉重叠区的重复行
+            max_workers: 同一张图片的横条同时识别的数量
+            trigger_height: 高度(缩小到 max_width 后)超过这个值的图片才切片，默认接近接口的 10000 像素上限
+            min_aspect: 高宽比达到这个值的长图(长截图、长票据)也切片；普通照片和扫描件的高宽比都在 2 以下，不会被切开。
+                        设为 None 时只按 trigger_height 判断
+        """
+        if overlap >= max_height:
+            raise ValueError("overlap 必须小于 max_height")
+        self.max_height = max_height
+        self.overlap = overlap
+        self.max_width = max_width
+        self.overlap_rows = overlap_rows
+        self.max_workers = max_workers
+        self.trigger_height = trigger_height
+        self.min_aspect = min_aspect
+
+    def needs_tiling(self, file_path):
+        """图片是否需要切片，非图片或无法打开时返回 False"""
+        try:
+            width, height = image_size(file_path)
+        except Exception:
+            return False
+        if width > self.max_width:
+            height = int(height * self.max_width / width)
+            width = self.max_width
+        if height <= self.max_height:
+            return False
+        return height > self.trigger_height or (self.min_aspect is not None and height >= width * self.min_aspect)
+
+    def split(self, file_path):
+        """
+        把图片切成从上到下、有重叠的横条
+
+        Returns:
+            list: 每个横条编码后的 PNG 字节
+        """
+        from PIL import Image
+
+        with Image.open(file_path) as img:
+            if img.mode not in ('1', 'L', 'P', 'RGB', 'RGBA', 'LA'):
+                img = img.convert('RGB')
+            width, height = img.size
+            if width > self.max_width:
+                height = int(height * self.max_width / width)
+                img = img.resize((self.max_width, height), Image.LANCZOS)
+                width = self.max_width
+
+            bands = []
+            step = self.max_height - self.overlap
+            top = 0
+            while True:
+                bottom = min(top + self.max_height, height)
+                buffer = io.BytesIO()
+                img.crop((0, top, width, bottom)).save(buffer, format='PNG')
+                bands.append(buffer.getvalue())
+                if bottom >= height:
+                    break
+                top += step
+            return bands
+
+    def stitch_tables(self, dfs):
+        """
+        按横条顺序拼接表格，去掉重叠区中重复出现的行
+
+        Args:
+            dfs: 每个横条的表格 DataFrame，可以为 None
+
+        Returns:
+            DataFrame 或 None
+        """
+        import pandas as pd
+
+        stitched = None
+        for df in dfs:
+            if df is None or df.empty:
+                continue
+            if stitched is None:
+                stitched = df.reset_index(drop=True)
+                continue
+            # 上一个横条末尾与下一个横条开头逐行相同的最长一段是重叠区，只去掉这一段；
+            # 找不到连续相同的一段时保留所有行(排名表中常有重复的值，不能按单行是否出现过来判断)
+            columns = [col for col in df.columns if col in stitched.columns]
+            tail = self._row_keys(stitched.tail(self.overlap_rows), columns)
+            head = self._row_keys(df.head(self.overlap_rows), columns)
+            skip = 0
+            for size in range(min(len(tail), len(head)), 0, -1):
+                if tail[-size:] == head[:size]:
+                    skip = size
+                    break
+            stitched = pd.concat([stitched, df.iloc[skip:]], ignore_index=True)
+        return stitched
+
+    def stitch_fields(self, dfs):
+        """
+        合并各横条的字段结果，仍然是一张票据一行：每个字段取第一个识别出值的横条，
+        不会因为各横条识别出的字段不同而变成多行
+        """
+        dfs = [df.reset_index(drop=True) for df in dfs if df is not None and not df.empty]
+        if not dfs:
+            return None
+        columns = list(dict.fromkeys(column for df in dfs for column in df.columns))
+        stitched = dfs[0]
+        for df in dfs[1:]:
+            stitched = stitched.combine_first(df)
+        return stitched[columns]
+
+    @staticmethod
+    def _row_keys(df, columns):
+        import pandas as pd
+        return [tuple(None if pd.isna(value) else value for value in row)
+                for row in df[columns].itertuples(index=False, name=None)]
@@ -0,0 +1,98 @@
+# 批量任务日志：每个输入的处理状态追加写入 JSONL，中断后可以从断点继续
+
+import hashlib
+import json
+import os
+import pickle
+import sys
+import threading
+import time
+
+# 每个输入依次经过的状态
+STATES = ('checked', 'uploaded', 'parsed', 'written')
+
+class JobJournal(object):
+    def __init__(self, output_dir, resume=False, filename='job_journal.jsonl'):
+        """
+        Args:
+            output_dir: 输出目录，日志文件和解析结果都放在这里
+            resume: 为 True 时读取已有日志继续上次的任务，否则重新开始
+            filename: 日志文件名
+        """
+        self._path = os.path.join(output_dir, filename)
+        self.results_dir = os.path.join(output_dir, 'journal_results')
+        self._lock = threading.Lock()
+        self._records = {}  # key -> 最新的一条记录
+
+        if not os.path.exists(self.results_dir):
+            os.makedirs(self.results_dir)
+        if resume and os.path.exists(self._path):
+            self._load()
+        self._fp = open(self._path, 'a' if resume else 'w', encoding='utf-8')
+
+    def _load(self):
+        with open(self._path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程被杀时最后一行可能没写完
+                    continue
+                self._records[record['key']] = record
+        print(f"已从任务日志恢复 {len(self._records)} 条记录: {self._path}")
+
+    @staticmethod
+    def make_key(source, is_url=False):
+        return source if is_url else os.path.abspath(source)
+
+    def record(self, key, state, **info):
+        """追加一条状态记录并立即落盘"""
+        record = dict(self._records.get(key, {}), key=key, state=state, time=time.time(), **info)
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._records[key] = record
+            self._fp.write(line + '\n')
+            self._fp.flush()
+
+    def get(self, key):
+        """返回 key 最新的一条记录，没有时返回 None"""
+        return self._records.get(key)
+
+    def state(self, key):
+        record = self._records.get(key)
+        return record['state'] if record else None
+
+    def reached(self, key, state):
+        """key 是否已经到达(或越过) state 状态"""
+        current = self.state(key)
+        return current is not None and STATES.index(current) >= STATES.index(state)
+
+    def save_result(self, key, result):
+        """把解析结果存到 journal_results 下，返回保存路径"""
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        path = os.path.join(self.results_dir, f'{name}.pkl')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        return path
+
+    def load_result(self, key):
+        """读取 key 已保存的解析结果，没有或读取失败时返回 None"""
+        record = self._records.get(key)
+        path = record.get('result') if record else None
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"\n任务结果读取错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+            return None
+
+    def close(self):
+        with self._lock:
+            self._fp.close()
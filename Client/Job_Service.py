@@ -0,0 +1,326 @@
+# 本地HTTP任务服务：各个内部工具把文件或URL提交给同一个服务，共用一套凭证、一个工作线程池、一个限流配额和缓存，
+# 不再各自起一个脚本互相抢QPS。只依赖标准库
+#
+# 接口:
+#   POST /jobs/extract   提交智能提取，请求体为文件内容，参数 filename、fields_key、table_key(逗号分隔)；
+#                        或 Content-Type: application/json，{"url": ..., "fields_key": [...], "table_key": [...]}
+#   POST /jobs/table     提交表格识别，参数 filename、output_order；URL 同上 {"url": ..., "output_order": ...}
+#   GET  /jobs/<id>      查询状态: queued / running / done / failed，完成后列出结果文件
+#   GET  /jobs/<id>/files/<文件名>   下载结果文件，文件名见状态中的 files
+#   GET  /stats          排队和运行中的任务数
+#   GET  /metrics        Prometheus 文本格式的运行指标
+
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+from Metrics import get_default_metrics
+
+CHUNK_SIZE = 1024 * 1024
+LIST_OPTIONS = ('fields_key', 'table_key')
+
+def check_options(options):
+    """
+    检查提交的选项：必须是 JSON 对象，fields_key/table_key 必须是字符串列表
+
+    Raises:
+        ValueError: 选项不符合要求，错误信息返回给调用方
+    """
+    if not isinstance(options, dict):
+        raise ValueError('JSON 请求体需要是对象')
+    for key in LIST_OPTIONS:
+        value = options.get(key)
+        if value is not None and not (isinstance(value, list) and all(isinstance(item, str) for item in value)):
+            raise ValueError(f"{key} 需要是字符串列表")
+    return options
+
+class Job(object):
+    def __init__(self, job_id, api, source, is_url, options, job_dir):
+        self.id = job_id
+        self.api = api
+        self.source = source  # 文件路径或URL
+        self.is_url = is_url
+        self.options = options
+        self.dir = job_dir
+        self.output_dir = os.path.join(job_dir, 'output')
+        self.state = 'queued'
+        self.error = None
+        self.files = []
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'api': self.api,
+            'source': self.source if self.is_url else os.path.basename(self.source),
+            'state': self.state,
+            'error': self.error,
+            'files': [f"/jobs/{self.id}/files/{quote(name)}" for name in self.file_names()],
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished
+        }
+
+    def file_names(self):
+        """结果文件相对输出目录的路径(Parquet 输出在分区子目录中，只用文件名会重名)"""
+        return [os.path.relpath(path, self.output_dir).replace(os.sep, '/') for path in self.files]
+
+class JobService(object):
+    def __init__(self, runners, work_dir='./Job_Service', max_workers=4, max_queued=1000,
+                 max_upload_bytes=50 * 1024 * 1024, retention_seconds=24 * 3600, token=None, metrics=None):
+        """
+        Args:
+            runners: {'extract': 函数, 'table': 函数}，函数 runner(来源, 是否为URL, 输出目录, 选项字典)
+                     返回结果文件路径列表，失败时返回空列表或抛出异常。所有任务共用同一组 runner，
+                     因此共用它们背后的OCR客户端、连接池、限流器和缓存
+            work_dir: 上传的文件和结果保存在 work_dir/<任务id> 下
+            max_workers: 同时运行的任务数
+            max_queued: 排队任务数上限，超过时新的提交返回 503
+            max_upload_bytes: 单个上传文件的大小上限，超过时返回 413
+            retention_seconds: 已完成任务的保留时间，过期后删除其目录
+            token: 可选的访问令牌，设置后请求需要带 X-Service-Token 头
+            metrics: 可选的 Metrics.Metrics，记录任务数和排队、运行耗时
+        """
+        self._runners = runners
+        self._work_dir = os.path.abspath(work_dir)
+        self._max_queued = max_queued
+        self._max_upload_bytes = max_upload_bytes
+        self._retention_seconds = retention_seconds
+        self._token = token
+        self._metrics = metrics if metrics is not None else get_default_metrics()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._httpd = None
+        os.makedirs(self._work_dir, exist_ok=True)
+
+    def _counts(self):
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+        return {state: states.count(state) for state in ('queued', 'running', 'done', 'failed')}
+
+    def submit(self, api, source, is_url, options, job_id=None, job_dir=None):
+        """
+        提交一个任务，返回 Job；排队任务已满时返回 None
+
+        Args:
+            source: URL，或已经保存在 job_dir 中的文件路径
+        """
+        if api not in self._runners:
+            raise ValueError(f"不支持的接口: {api}")
+        self._expire()
+        job_id = job_id or uuid.uuid4().hex
+        job = Job(job_id, api, source, is_url, options, job_dir or os.path.join(self._work_dir, job_id))
+        with self._lock:
+            if sum(1 for j in self._jobs.values() if j.state == 'queued') >= self._max_queued:
+                return None
+            self._jobs[job_id] = job
+        os.makedirs(job.dir, exist_ok=True)
+        self._metrics.inc('service_jobs_total', api=api, state='submitted')
+        self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        job.started = time.time()
+        job.state = 'running'
+        self._metrics.observe('service_queue_seconds', job.started - job.created, api=job.api)
+        try:
+            files = self._runners[job.api](job.source, job.is_url, job.output_dir, job.options)
+            job.files = list(files or [])
+            if not job.files:
+                job.error = '识别失败，没有生成结果'
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {str(e)}"
+            print(f"\n任务执行错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+        job.finished = time.time()
+        job.state = 'done' if job.files else 'failed'
+        self._metrics.observe('service_run_seconds', job.finished - job.started, api=job.api)
+        self._metrics.inc('service_jobs_total', api=job.api, state=job.state)
+
+    def _expire(self):
+        """删除超过保留时间的已完成任务"""
+        deadline = time.time() - self._retention_seconds
+        with self._lock:
+            expired = [job for job in self._jobs.values()
+                       if job.finished is not None and job.finished < deadline]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            shutil.rmtree(job.dir, ignore_errors=True)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        return self._counts()
+
+    def _make_handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, data):
+                body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_error(self, status, message):
+                self._send_json(status, {'error': message})
+
+            def _authorized(self):
+                if service._token is None or self.headers.get('X-Service-Token') == service._token:
+                    return True
+                self._send_error(401, '缺少或错误的 X-Service-Token')
+                return False
+
+            def _read_json(self, length):
+                return json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+
+            def _save_upload(self, length, path):
+                """把请求体按块写入文件，不在内存中保留整个文件"""
+                remaining = length
+                with open(path, 'wb') as f:
+                    while remaining > 0:
+                        chunk = self.rfile.read(min(CHUNK_SIZE, remaining))
+                        if not chunk:
+                            raise IOError('上传的数据不完整')
+                        f.write(chunk)
+                        remaining -= len(chunk)
+
+            def do_POST(self):
+                if not self._authorized():
+                    return
+                url = urlparse(self.path)
+                parts = url.path.strip('/').split('/')
+                if len(parts) != 2 or parts[0] != 'jobs' or parts[1] not in service._runners:
+                    self._send_error(404, '接口不存在')
+                    return
+                api = parts[1]
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                except ValueError:
+                    length = 0
+                if length <= 0:
+                    self._send_error(411, '需要 Content-Length')
+                    return
+                if length > service._max_upload_bytes:
+                    self._send_error(413, f"文件超过 {service._max_upload_bytes // 1024 // 1024}MB")
+                    self.close_connection = True
+                    return
+
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                job_id = uuid.uuid4().hex
+                job_dir = os.path.join(service._work_dir, job_id)
+                try:
+                    if self.headers.get('Content-Type', '').startswith('application/json'):
+                        options = check_options(self._read_json(length))
+                        source = options.pop('url', None)
+                        if not source or not isinstance(source, str):
+                            self._send_error(400, 'JSON 请求需要字符串的 url 字段')
+                            return
+                        is_url = True
+                    else:
+                        options = {key: value.split(',') if key in LIST_OPTIONS else value
+                                   for key, value in query.items() if key != 'filename'}
+                        filename = os.path.basename(query.get('filename') or 'upload')
+                        os.makedirs(job_dir, exist_ok=True)
+                        source = os.path.join(job_dir, filename)
+                        self._save_upload(length, source)
+                        is_url = False
+                except (IOError, ValueError) as e:
+                    shutil.rmtree(job_dir, ignore_errors=True)
+                    self._send_error(400, str(e))
+                    return
+
+                job = service.submit(api, source, is_url, options, job_id=job_id, job_dir=job_dir)
+                if job is None:
+                    shutil.rmtree(job_dir, ignore_errors=True)
+                    self._send_error(503, '排队的任务已满，请稍后重试')
+                    return
+                self._send_json(202, dict(job.to_dict(), status_url=f"/jobs/{job.id}"))
+
+            def do_GET(self):
+                if not self._authorized():
+                    return
+                parts = [unquote(part) for part in urlparse(self.path).path.strip('/').split('/')]
+                if parts == ['stats']:
+                    self._send_json(200, service.stats())
+                    return
+                if parts == ['metrics']:
+                    body = service._metrics.to_prometheus().encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                job = service.get(parts[1]) if len(parts) >= 2 and parts[0] == 'jobs' else None
+                if job is None:
+                    self._send_error(404, '任务不存在')
+                    return
+                if len(parts) == 2:
+                    self._send_json(200, job.to_dict())
+                    return
+                if len(parts) >= 4 and parts[2] == 'files':
+                    name = '/'.join(parts[3:])
+                    path = next((p for p, n in zip(job.files, job.file_names()) if n == name), None)
+                    if path is None or not os.path.isfile(path):
+                        self._send_error(404, '结果文件不存在')
+                        return
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/octet-stream')
+                    self.send_header('Content-Length', str(os.path.getsize(path)))
+                    self.send_header('Content-Disposition', f"attachment; filename*=UTF-8''{quote(parts[-1])}")
+                    self.end_headers()
+                    with open(path, 'rb') as f:
+                        shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+                    return
+                self._send_error(404, '接口不存在')
+
+        return Handler
+
+    def serve(self, host='127.0.0.1', port=8080):
+        """运行服务直到 Ctrl+C，返回前等待正在运行的任务完成"""
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        print(f"任务服务已启动: http://{host}:{self._httpd.server_address[1]}")
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._httpd.server_close()
+            self._executor.shutdown(wait=True)
+            print(f"任务服务已停止: {self.stats()}")
+
+    def start(self, host='127.0.0.1', port=0):
+        """在后台线程中运行服务，返回实际监听的端口"""
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name='job-service', daemon=True).start()
+        return self._httpd.server_address[1]
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,135 @@
+# 多组 TextIn 凭证(x-ti-app-id / x-ti-secret-code)的密钥池：每组凭证有自己的限流器和状态，
+# 请求按最少在途或加权轮询分配到各组凭证，总吞吐随购买的凭证数增长。
+# 遇到 40306(qps超限)、40003(余额不足)、40102(凭证无效)时，该凭证暂时停用，请求改用其他凭证
+
+import threading
+import time
+from Rate_Limit import NoKeyAvailable, RateLimiter
+
+# 停用凭证的错误码 -> 停用时长(秒)
+DEFAULT_COOLDOWNS = {
+    40306: 2,      # qps超过限制，短暂停用后由它自己的限流器降速
+    40003: 600,    # 余额不足，充值后自动恢复
+    40102: 1800    # 凭证无效，验证失败
+}
+
+STRATEGIES = ('least_loaded', 'weighted')
+
+class Credential(object):
+    def __init__(self, app_id, secret_code, rates=None, weight=1, name=None, **limiter_options):
+        """
+        Args:
+            app_id: x-ti-app-id
+            secret_code: x-ti-secret-code
+            rates: 这组凭证购买的 {接口URL: QPS}，未配置的接口使用 Rate_Limit.DEFAULT_QPS
+            weight: 加权轮询时的权重，也是最少在途比较时的容量系数
+            name: 打印和指标中使用的名字，默认为 app_id 的前几位
+            limiter_options: 传给 RateLimiter 的其他参数
+        """
+        self.app_id = app_id
+        self.secret_code = secret_code
+        self.weight = max(1, int(weight))
+        self.name = name or f"{app_id[:6]}..."
+        self.rate_limiter = RateLimiter(rates, **limiter_options)
+        self.in_flight = 0
+        self.requests = 0
+        self.codes = {}              # 错误码 -> 次数
+        self.disabled_until = 0.0
+        self.disabled_code = None
+        self.current_weight = 0      # 平滑加权轮询的当前权重
+
+    def headers(self):
+        return {'x-ti-app-id': self.app_id, 'x-ti-secret-code': self.secret_code}
+
+    def available(self, now):
+        return now >= self.disabled_until
+
+class KeyPool(object):
+    def __init__(self, credentials, strategy='least_loaded', cooldowns=None, max_wait=60, metrics=None):
+        """
+        Args:
+            credentials: Credential 列表
+            strategy: 'least_loaded' 选在途请求数/权重最小的凭证；'weighted' 按权重平滑轮询
+            cooldowns: {错误码: 停用秒数}，默认 DEFAULT_COOLDOWNS
+            max_wait: 全部凭证都停用时最多等待多少秒，恢复得更晚时请求直接失败
+            metrics: 可选的 Metrics.Metrics，按凭证和错误码计数
+        """
+        if not credentials:
+            raise ValueError("密钥池至少需要一组凭证")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"不支持的分配方式: {strategy}，可选 {', '.join(STRATEGIES)}")
+        self.credentials = list(credentials)
+        self.strategy = strategy
+        self.cooldowns = dict(DEFAULT_COOLDOWNS if cooldowns is None else cooldowns)
+        self.max_wait = max_wait
+        self._metrics = metrics
+        self._lock = threading.Lock()
+
+    def _choose(self, candidates):
+        if self.strategy == 'least_loaded':
+            return min(candidates, key=lambda c: (c.in_flight / c.weight, c.requests / c.weight))
+        # nginx 的平滑加权轮询：权重高的凭证更常被选中，但不会连续集中
+        total = sum(c.weight for c in candidates)
+        for candidate in candidates:
+            candidate.current_weight += candidate.weight
+        chosen = max(candidates, key=lambda c: c.current_weight)
+        chosen.current_weight -= total
+        return chosen
+
+    def acquire(self):
+        """
+        选一组凭证并计为在途，用完必须调用 release
+
+        Raises:
+            NoKeyAvailable: 全部凭证都已停用，且 max_wait 秒内都不会恢复
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                candidates = [c for c in self.credentials if c.available(now)]
+                if candidates:
+                    credential = self._choose(candidates)
+                    credential.in_flight += 1
+                    credential.requests += 1
+                    return credential
+                earliest = min(self.credentials, key=lambda c: c.disabled_until)
+                wait = earliest.disabled_until - now
+                if wait > self.max_wait:
+                    raise NoKeyAvailable(earliest.disabled_code, wait)
+            time.sleep(wait)
+
+    def release(self, credential, code):
+        """记录一次请求的结果，遇到 cooldowns 中的错误码时停用这组凭证"""
+        with self._lock:
+            credential.in_flight -= 1
+            credential.codes[code] = credential.codes.get(code, 0) + 1
+            cooldown = self.cooldowns.get(code)
+            if cooldown:
+                credential.disabled_until = max(credential.disabled_until, time.monotonic() + cooldown)
+                credential.disabled_code = code
+        if self._metrics is not None:
+            self._metrics.inc('api_key_responses_total', key=credential.name, code=code)
+
+    def stats(self):
+        """
+        Returns:
+            list: 每组凭证的 name、requests、in_flight、codes、disabled_for(剩余停用秒数)、disabled_code
+        """
+        with self._lock:
+            now = time.monotonic()
+            return [{
+                'name': c.name,
+                'requests': c.requests,
+                'in_flight': c.in_flight,
+                'codes': dict(c.codes),
+                'disabled_for': max(0.0, c.disabled_until - now),
+                'disabled_code': c.disabled_code if c.disabled_until > now else None
+            } for c in self.credentials]
+
+    def print_stats(self):
+        print(f"密钥池({self.strategy}):")
+        for s in self.stats():
+            codes = ', '.join(f"{code}: {count}" for code, count in sorted(s['codes'].items(), key=str)) or '无'
+            state = (f"停用中(错误码 {s['disabled_code']}，剩余 {s['disabled_for']:.0f}秒)"
+                     if s['disabled_code'] is not None else '可用')
+            print(f"  {s['name']}: 请求 {s['requests']} 次, 响应码 {codes}, {state}")
@@ -0,0 +1,244 @@
+# 运行指标：各阶段的耗时直方图和错误码、重试等计数器，可以导出为JSON运行报告或 Prometheus 文本格式；
+# 另外提供安静模式，关闭逐个文件的控制台输出
+
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# 直方图的桶上限(秒)，覆盖从文件检查的亚毫秒级到接口排队的分钟级
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_quiet = False
+
+def set_quiet(quiet=True):
+    """打开安静模式后 info() 不再输出，错误信息和汇总统计照常打印"""
+    global _quiet
+    _quiet = quiet
+
+def is_quiet():
+    return _quiet
+
+def info(*args, **kwargs):
+    """逐个文件的提示信息，安静模式下不输出"""
+    if not _quiet:
+        print(*args, **kwargs)
+
+class Histogram(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个桶是 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """按桶估计分位数：在所在桶的上下限(用实际的最小值和最大值收窄)之间线性插值"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = max(self.buckets[i - 1] if i > 0 else 0.0, self.min)
+                high = min(self.buckets[i] if i < len(self.buckets) else self.max, self.max)
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': {str(bound): count for bound, count in zip(self.buckets + ('+Inf',), self.counts)}
+        }
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra) if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+class Metrics(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Args:
+            buckets: 耗时直方图的桶上限(秒)
+        """
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, labels) -> 数值
+        self._histograms = {}  # (name, labels) -> Histogram
+        self.started = time.time()
+        self._server = None
+
+    def inc(self, name, value=1, **labels):
+        """计数器加 value，labels 区分同名计数器的不同取值，如 inc('api_responses_total', code=40306)"""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """把一次耗时记入直方图"""
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self._buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """with 块内的耗时记入直方图，出错时也记录"""
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - began, **labels)
+
+    def report(self):
+        """
+        Returns:
+            dict: started, elapsed(秒), counters 和 timers 两个列表，每项有 name、labels 和数值或直方图统计
+        """
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            timers = [dict(histogram.to_dict(), name=name, labels=dict(labels))
+                      for (name, labels), histogram in sorted(self._histograms.items())]
+        return {
+            'started': self.started,
+            'elapsed': time.time() - self.started,
+            'counters': counters,
+            'timers': timers
+        }
+
+    def save_report(self, path):
+        """把运行报告写成JSON文件，先写临时文件再改名"""
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.report(), f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+            print(f"运行报告已保存到: {path}")
+        except IOError as e:
+            print(f"\n运行报告保存错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+
+    def to_prometheus(self, prefix='textin_'):
+        """导出为 Prometheus 文本格式，直方图带 _bucket/_sum/_count"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = [(key, histogram.buckets, list(histogram.counts), histogram.sum, histogram.count)
+                          for key, histogram in sorted(self._histograms.items())]
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {prefix}{name} counter")
+                typed.add(name)
+            lines.append(f"{prefix}{name}{_format_labels(labels)} {value}")
+        for (name, labels), buckets, counts, total, count in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f"{prefix}{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{prefix}{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{prefix}{name}_count{_format_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """写成 Prometheus 文本文件(可供 node_exporter 的 textfile collector 读取)"""
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, path)
+        except IOError as e:
+            print(f"\nPrometheus 指标保存错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+
+    def serve_prometheus(self, port, host='127.0.0.1'):
+        """在后台线程中提供 /metrics 接口，供 Prometheus 在运行期间抓取"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # 只有开启时才导入，缩短启动时间
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True).start()
+        print(f"Prometheus 指标: http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server.server_address[1]
+
+    def stop_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def print_summary(self):
+        """打印各耗时指标的次数和分位数，以及全部计数器"""
+        report = self.report()
+        print(f"运行指标(共 {report['elapsed']:.2f}秒):")
+        for timer in report['timers']:
+            labels = _format_labels(sorted(timer['labels'].items()))
+            print(f"  {timer['name']}{labels}: {timer['count']} 次, 合计 {timer['sum']:.2f}秒, "
+                  f"p50 {timer['p50'] * 1000:.0f}ms, p95 {timer['p95'] * 1000:.0f}ms, p99 {timer['p99'] * 1000:.0f}ms")
+        for counter in report['counters']:
+            labels = _format_labels(sorted(counter['labels'].items()))
+            print(f"  {counter['name']}{labels}: {counter['value']}")
+
+_default_metrics = None
+_default_lock = threading.Lock()
+
+def get_default_metrics():
+    """返回进程内共享的默认指标，两个OCR类未指定 metrics 时都使用它"""
+    global _default_metrics
+    with _default_lock:
+        if _default_metrics is None:
+            _default_metrics = Metrics()
+        return _default_metrics
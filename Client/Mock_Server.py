@@ -0,0 +1,274 @@
+# 本地模拟的 TextIn 服务：只用标准库的HTTP服务器，模拟 entity_extraction 和 recognize/table/multipage 两个接口，
+# 可以回放录制的响应，注入延迟分布、40306/30203/500 错误和超大响应，用来离线压测客户端
+#
+# 用法: python Client/Mock_Server.py [--port 8000] [--latency lognormal:0.3,0.5] [--error 40306=0.05]
+#       [--replay-extract Output_Extract/json_files] [--replay-table Output_table/Table_json]
+#       [--rows 200] [--excel-rows 1000]
+
+import argparse
+import base64
+import glob
+import io
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+
+EXTRACT_PATH = '/ai/service/v1/entity_extraction'
+TABLE_PATH = '/ai/service/v2/recognize/table/multipage'
+ERROR_MESSAGES = {
+    40306: "qps超过限制",
+    30203: "基础服务故障，请稍后重试",
+    500: "服务器内部错误"
+}
+
+def constant(seconds):
+    """固定延迟"""
+    return lambda rng: seconds
+
+def uniform(low, high):
+    """在 [low, high] 之间均匀分布的延迟"""
+    return lambda rng: rng.uniform(low, high)
+
+def lognormal(median, sigma):
+    """对数正态分布的延迟，中位数为 median，长尾由 sigma 控制，接近真实接口的耗时分布"""
+    return lambda rng: rng.lognormvariate(0, sigma) * median
+
+def parse_latency(spec):
+    """
+    解析命令行的延迟参数
+
+    Args:
+        spec: 'constant:0.2'、'uniform:0.1,0.5' 或 'lognormal:0.3,0.5'，为空时没有延迟
+    """
+    if not spec:
+        return None
+    name, _, args = spec.partition(':')
+    values = [float(value) for value in args.split(',') if value]
+    factories = {'constant': constant, 'uniform': uniform, 'lognormal': lognormal}
+    if name not in factories:
+        raise ValueError(f"不支持的延迟分布: {name}")
+    return factories[name](*values)
+
+def parse_error_rates(specs):
+    """把 ['40306=0.05', '500=0.01'] 解析为 {40306: 0.05, 500: 0.01}"""
+    rates = {}
+    for spec in specs or []:
+        code, _, rate = spec.partition('=')
+        rates[int(code)] = float(rate)
+    return rates
+
+def build_extract_response(rows=20, cols=5, fields=5, stamps=1):
+    """构造一个与 entity_extraction 返回结构相同的响应"""
+    headers = [f"列{i}" for i in range(cols)]
+    cells = [{header: {'value': f"{r}-{c}"} for c, header in enumerate(headers)} for r in range(rows)]
+    detail = {
+        'fields': {f"字段{i}": [{'value': f"值{i}"}] for i in range(fields)},
+        'tables_relationship': [{'cells': cells}],
+        'stamps': [{'color': 'red', 'stamp_shape': 'circle', 'type': '公章', 'value': f"印章{i}", 'page_number': 1}
+                   for i in range(stamps)]
+    }
+    return {'code': 200, 'message': 'success',
+            'result': {'finish_reason': 'stop', 'detail_structure': [detail]}}
+
+def build_table_response(rows=20, cols=5):
+    """构造一个带 base64 Excel 的 recognize/table/multipage 响应，rows 大时就是一个大响应"""
+    df = pd.DataFrame({f"列{c}": [f"{r}-{c}" for r in range(rows)] for c in range(cols)})
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return {'code': 200, 'message': 'success',
+            'result': {'excel': base64.b64encode(buffer.getvalue()).decode('ascii'),
+                       'pages': [{'page_number': 1, 'status': 'success'}]}}
+
+def load_replay(replay_dir):
+    """读取目录中录制的响应(如 json_files/*_response.json、Table_json/*.json)，按文件名排序"""
+    responses = []
+    for path in sorted(glob.glob(os.path.join(replay_dir, '*.json'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            responses.append(json.load(f))
+    if not responses:
+        raise ValueError(f"目录中没有可回放的响应: {replay_dir}")
+    return responses
+
+class MockTextInServer(object):
+    def __init__(self, host='127.0.0.1', port=0, latency=None, error_rates=None, extract_responses=None,
+                 table_responses=None, seed=None):
+        """
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示随机分配
+            latency: 可选的延迟分布(constant/uniform/lognormal 的返回值)，每个请求处理前等待
+            error_rates: {错误码: 概率}，如 {40306: 0.05, 30203: 0.01, 500: 0.01}；500 返回非JSON的 HTTP 500
+            extract_responses: entity_extraction 依次轮流返回的响应列表，默认为 build_extract_response()
+            table_responses: recognize/table/multipage 依次轮流返回的响应列表，默认为 build_table_response()
+            seed: 随机数种子，固定后延迟和错误的序列可以复现
+        """
+        self.latency = latency
+        self.error_rates = dict(error_rates or {})
+        # 响应预先序列化，服务端不成为瓶颈
+        self._payloads = {
+            EXTRACT_PATH: [self._encode(r) for r in (extract_responses or [build_extract_response()])],
+            TABLE_PATH: [self._encode(r) for r in (table_responses or [build_table_response()])]
+        }
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counters = {path: 0 for path in self._payloads}
+        self.requests = 0
+        self.bytes_received = 0
+        self.errors = {}
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @staticmethod
+    def _encode(response_json):
+        return json.dumps(response_json, ensure_ascii=False).encode('utf-8')
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def extract_url(self):
+        return self.base_url + EXTRACT_PATH
+
+    @property
+    def table_url(self):
+        return self.base_url + TABLE_PATH
+
+    def _next(self, path):
+        """为一个请求决定延迟、是否注入错误以及回放哪一条响应"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency(self._rng) if self.latency is not None else 0
+            roll = self._rng.random()
+            error = None
+            for code, rate in self.error_rates.items():
+                if roll < rate:
+                    error = code
+                    self.errors[code] = self.errors.get(code, 0) + 1
+                    break
+                roll -= rate
+            payloads = self._payloads[path]
+            payload = payloads[self._counters[path] % len(payloads)]
+            if error is None:
+                self._counters[path] += 1
+        return delay, error, payload
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _read_body(self):
+                """读完请求体(支持 chunked 上传)，返回字节数"""
+                if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                    total = 0
+                    while True:
+                        size = int(self.rfile.readline().split(b';')[0], 16)
+                        if size == 0:
+                            self.rfile.readline()
+                            return total
+                        total += len(self.rfile.read(size))
+                        self.rfile.readline()
+                return len(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+            def _send(self, status, body, content_type='application/json'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                received = self._read_body()
+                with server._lock:
+                    server.bytes_received += received
+                path = self.path.split('?')[0]
+                if path not in server._payloads:
+                    self._send(404, server._encode({'code': 40400, 'message': '无效的请求链接'}))
+                    return
+                delay, error, payload = server._next(path)
+                if delay > 0:
+                    time.sleep(delay)
+                if error == 500:
+                    self._send(500, b'Internal Server Error', 'text/plain')
+                elif error is not None:
+                    self._send(200, server._encode({'code': error, 'message': ERROR_MESSAGES.get(error, '')}))
+                else:
+                    self._send(200, payload)
+
+        return Handler
+
+    def start(self):
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='mock-textin', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.stop()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'bytes_received': self.bytes_received,
+                'errors': dict(self.errors)
+            }
+
+    def print_stats(self):
+        stats = self.stats()
+        errors = ', '.join(f"{code}: {count}" for code, count in sorted(stats['errors'].items())) or '无'
+        print(f"模拟服务收到请求: {stats['requests']}, 上传 {stats['bytes_received']/1024/1024:.2f}MB, "
+              f"注入错误: {errors}")
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟的 TextIn 服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', help="延迟分布，如 constant:0.2、uniform:0.1,0.5、lognormal:0.3,0.5")
+    parser.add_argument('--error', action='append', help="错误码=概率，可以重复，如 --error 40306=0.05")
+    parser.add_argument('--replay-extract', help="回放的智能提取响应目录(如 Output_Extract/json_files)")
+    parser.add_argument('--replay-table', help="回放的表格识别响应目录(如 Output_table/Table_json)")
+    parser.add_argument('--rows', type=int, default=20, help="未回放时，智能提取响应中的表格行数")
+    parser.add_argument('--excel-rows', type=int, default=20, help="未回放时，表格识别响应中Excel的行数")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    server = MockTextInServer(
+        args.host, args.port, latency=parse_latency(args.latency), error_rates=parse_error_rates(args.error),
+        extract_responses=load_replay(args.replay_extract) if args.replay_extract else [build_extract_response(args.rows)],
+        table_responses=load_replay(args.replay_table) if args.replay_table else [build_table_response(args.excel_rows)],
+        seed=args.seed)
+    server.start()
+    print(f"模拟服务已启动: {server.extract_url}")
+    print(f"                {server.table_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        server.print_stats()
+
+if __name__ == "__main__":
+    main()
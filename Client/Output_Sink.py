@@ -0,0 +1,525 @@
+# 合并结果的输出：每个文件识别完就把结果行追加出去，内存占用不随批次大小增长
+# 支持 Excel / CSV / JSONL / Parquet 四种格式，接口相同: append(表名, DataFrame, 来源) 然后 close；
+# CSV/JSONL 运行中逐批追加到输出文件，Excel 每累积一定行数写出一个完整的分段文件，中途退出时已写出的行不会丢失；
+# 指定 cpu_pool 时，Excel/Parquet 在 close 时由进程池中的进程读取临时文件并写出
+
+import csv
+import hashlib
+import json
+import os
+import pickle
+import re
+import sys
+import tempfile
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖，只有输出 Parquet 时才需要: pip install pyarrow
+    pa = pq = None
+
+OUTPUT_FORMATS = ('excel', 'csv', 'jsonl', 'parquet')
+
+EXCEL_MAX_ROWS = 1048576  # Excel 单个工作表的行数上限(含表头)
+
+def _rows(df):
+    """DataFrame 转为行元组，缺失值转为 None(写入Excel为空单元格)"""
+    df = df.astype(object)
+    return list(df.where(df.notna(), None).itertuples(index=False, name=None))
+
+def _align(batches, column_positions):
+    """
+    把 [(列, 行), ...] 逐批对齐到完整表头，缺少的列填 None
+
+    Args:
+        batches: 可迭代的 (列名元组, 行元组列表)
+        column_positions: 列名 -> 在完整表头中的位置
+    """
+    header = list(column_positions)
+    width = len(header)
+    for columns, rows in batches:
+        if list(columns) == header:
+            yield rows
+            continue
+        positions = [column_positions[column] for column in columns]
+        aligned = []
+        for row in rows:
+            values = [None] * width
+            for position, value in zip(positions, row):
+                values[position] = value
+            aligned.append(values)
+        yield aligned
+
+def _print_error(title, e):
+    print(f"\n{title}:")
+    print(f"错误类型: {type(e).__name__}")
+    print(f"错误信息: {str(e)}")
+    print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+
+def _write_spooled(sink, specs):
+    """
+    在进程池中执行：从临时文件读出各表的行并写出，只传入临时文件路径，行数据不经过进程间管道
+
+    Args:
+        sink: 去掉了临时文件句柄的 sink 副本
+        specs: [(表名, 列名 -> 位置, 临时文件路径), ...]
+    """
+    files = [open(path, 'rb') for _, _, path in specs]
+    try:
+        return sink._write([(name, list(columns), sink._read_batches(f, columns))
+                            for (name, columns, _), f in zip(specs, files)])
+    finally:
+        for f in files:
+            f.close()
+
+class _SpooledSink(object):
+    """
+    先把结果行分批序列化到临时文件，close 时再一次性按行写出。
+    表头是所有批次列的并集(按首次出现的顺序)，与 pd.concat 合并的结果相同，
+    在全部行到达之前无法确定，所以合并文件在 close 时才生成(Excel 运行中另外写出分段文件)。
+    """
+
+    def __init__(self, spool_dir, flush_rows=1000, cpu_pool=None):
+        """
+        Args:
+            spool_dir: 临时文件所在目录
+            flush_rows: 内存中累积多少行后写入临时文件
+            cpu_pool: 可选的 Cpu_Pool.CpuPool，close 时在其中的进程里写出文件
+        """
+        self.flush_rows = flush_rows
+        self._spool_dir = spool_dir
+        self._cpu_pool = cpu_pool
+        self._tables = {}  # 表名 -> {'columns': 列的并集, 'spool': 临时文件, 'pending': [(列, 行)], 'count': 行数}
+        self.rows = 0
+
+    def append(self, table_name, df, source=None):
+        """
+        追加一个 DataFrame 的所有行到指定的表，空结果直接忽略
+
+        Args:
+            table_name: 表名，如 'Fields'、'TableCells'
+            df: 一个文件的识别结果
+            source: 结果来自的文件路径或URL，按来源分区的格式使用
+        """
+        if df is None or df.empty:
+            return
+        table = self._tables.get(table_name)
+        if table is None:
+            # 交给其他进程读取的临时文件需要有文件名
+            spool = (tempfile.NamedTemporaryFile(dir=self._spool_dir, suffix='.spool', delete=False)
+                     if self._cpu_pool is not None else tempfile.TemporaryFile(dir=self._spool_dir))
+            table = {'columns': {}, 'spool': spool, 'pending': [], 'count': 0}
+            self._tables[table_name] = table
+        columns = tuple(df.columns)
+        for column in columns:
+            table['columns'].setdefault(column, len(table['columns']))
+        rows = _rows(df)
+        table['pending'].append((columns, rows))
+        table['count'] += len(df)
+        self.rows += len(df)
+        self._appended(table_name, columns, rows)
+        if sum(len(rows) for _, rows in table['pending']) >= self.flush_rows:
+            self._flush_table(table)
+
+    def _appended(self, table_name, columns, rows):
+        """每次追加后调用，子类可以在这里按行数写出中间结果"""
+
+    def _flush_table(self, table):
+        if table['pending']:
+            pickle.dump(table['pending'], table['spool'], protocol=pickle.HIGHEST_PROTOCOL)
+            table['spool'].flush()
+            table['pending'] = []
+
+    def flush(self):
+        """把内存中累积的行写入临时文件"""
+        for table in self._tables.values():
+            self._flush_table(table)
+
+    def __getstate__(self):
+        # 传给进程池时不带临时文件句柄和进程池本身
+        state = self.__dict__.copy()
+        state['_tables'] = {}
+        state['_cpu_pool'] = None
+        return state
+
+    @staticmethod
+    def _read_batches(spool, column_positions):
+        """
+        按追加顺序逐批读出行，每批的行都已对齐到完整表头
+
+        Args:
+            spool: 临时文件
+            column_positions: 列名 -> 在完整表头中的位置
+        """
+        spool.seek(0)
+        while True:
+            try:
+                batches = pickle.load(spool)
+            except EOFError:
+                return
+            yield from _align(batches, column_positions)
+
+    def _write(self, tables):
+        """
+        由子类实现，把每个表写成文件
+
+        Args:
+            tables: [(表名, 表头, 逐批产生行的迭代器), ...]
+
+        Returns:
+            list: 写出的文件路径
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        生成输出文件
+
+        Returns:
+            list: 写出的文件路径，没有任何行时为空列表
+        """
+        try:
+            self.flush()
+            if self._cpu_pool is not None:
+                specs = [(name, table['columns'], table['spool'].name) for name, table in self._tables.items()]
+                return self._cpu_pool.run(_write_spooled, self, specs)
+            tables = [(name, list(table['columns']), self._read_batches(table['spool'], table['columns']))
+                      for name, table in self._tables.items()]
+            return self._write(tables)
+        except Exception as e:
+            _print_error(f"{type(self).__name__} 写入错误", e)
+            return []
+        finally:
+            for table in self._tables.values():
+                table['spool'].close()
+                if self._cpu_pool is not None:
+                    os.remove(table['spool'].name)
+            self._tables = {}
+
+class ExcelSink(_SpooledSink):
+    """
+    合并到一个Excel，每个表一个工作表，close 时用 openpyxl 的只写模式逐行写出。
+    超过Excel行数上限的表依次续写到 {表名}_2、{表名}_3 ... 工作表。
+
+    Excel 不能追加写入，运行中每累积 part_rows 行就把这些行写成一个完整的分段文件
+    {文件名}.{运行编号}.part001.xlsx ...(表头为当时已出现的所有列)，中途退出时已写出的分段可以直接打开；
+    close 成功写出合并文件后删除本次运行的分段文件
+    """
+
+    def __init__(self, output_path, flush_rows=1000, cpu_pool=None, part_rows=10000):
+        """
+        Args:
+            output_path: 输出的Excel文件路径，close 时整体替换；没有任何行时删除旧文件
+            flush_rows: 内存中累积多少行后写入临时文件
+            cpu_pool: 可选的 Cpu_Pool.CpuPool，openpyxl 写出在其中的进程里执行
+            part_rows: 每累积多少行写出一个分段文件，0 表示不写分段文件
+        """
+        super().__init__(os.path.dirname(os.path.abspath(output_path)), flush_rows, cpu_pool)
+        self.output_path = output_path
+        self.part_rows = part_rows
+        self._run_id = time.strftime('%Y%m%d-%H%M%S')
+        self._part_batches = {}  # 表名 -> 上个分段之后追加的 [(列, 行)]
+        self._part_count = 0
+        self._parts = []  # 本次运行写出的分段文件
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_part_batches'] = {}
+        return state
+
+    def _appended(self, table_name, columns, rows):
+        if not self.part_rows:
+            return
+        self._part_batches.setdefault(table_name, []).append((columns, rows))
+        self._part_count += len(rows)
+        if self._part_count >= self.part_rows:
+            self._write_part()
+
+    def _write_part(self):
+        """把上个分段之后追加的行写成一个完整的Excel，写出失败只打印错误，不影响最终的合并文件"""
+        batches, self._part_batches, self._part_count = self._part_batches, {}, 0
+        stem = os.path.splitext(self.output_path)[0]
+        path = f"{stem}.{self._run_id}.part{len(self._parts) + 1:03d}.xlsx"
+        try:
+            self._save_workbook(path, [(name, list(self._tables[name]['columns']),
+                                        _align(table_batches, self._tables[name]['columns']))
+                                       for name, table_batches in batches.items()])
+            self._parts.append(path)
+        except Exception as e:
+            _print_error("ExcelSink 分段写入错误", e)
+
+    @staticmethod
+    def _save_workbook(path, tables):
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        for name, header, batches in tables:
+            part = 1
+            worksheet = workbook.create_sheet(name)
+            worksheet.append(header)
+            written = 1
+            for rows in batches:
+                for row in rows:
+                    if written >= EXCEL_MAX_ROWS:
+                        part += 1
+                        worksheet = workbook.create_sheet(f"{name}_{part}")
+                        worksheet.append(header)
+                        written = 1
+                    worksheet.append(row)
+                    written += 1
+        tmp_path = f"{path}.tmp.xlsx"
+        workbook.save(tmp_path)
+        os.replace(tmp_path, path)
+
+    def _write(self, tables):
+        if not self.rows:
+            if os.path.exists(self.output_path):
+                os.remove(self.output_path)
+            return []
+        self._save_workbook(self.output_path, tables)
+        return [self.output_path]
+
+    def close(self):
+        self._part_batches, self._part_count = {}, 0
+        written = super().close()
+        if written:
+            for path in self._parts:
+                if os.path.exists(path):
+                    os.remove(path)
+        elif self._parts:
+            print(f"合并文件未写出，已写出的行保留在 {len(self._parts)} 个分段文件中: {self._parts[0]} ...")
+        self._parts = []
+        return written
+
+class CsvSink(object):
+    """
+    每个表一个CSV文件: {output_dir}/{basename}_{表名}.csv，运行中逐批直接追加，中途退出时已写出的行保留。
+    表头取第一批结果的列；之后出现新的列时，后续的行续写到 {basename}_{表名}_2.csv、_3.csv ...，
+    表头为到当时为止出现过的所有列
+    """
+
+    def __init__(self, output_dir, basename='combined', flush_rows=1000):
+        """
+        Args:
+            output_dir: 输出目录
+            basename: 文件名前缀
+            flush_rows: 内存中累积多少行后追加写入文件
+        """
+        self.output_dir = output_dir
+        self.basename = basename
+        self.flush_rows = flush_rows
+        self._tables = {}  # 表名 -> {'columns': 列名 -> 位置, 'part': 续写序号, 'file', 'writer', 'pending': [行]}
+        self._paths = []
+        self.rows = 0
+
+    def _open(self, table_name, table):
+        """打开表的下一个文件并写入表头"""
+        suffix = '' if table['part'] == 1 else f"_{table['part']}"
+        path = os.path.join(self.output_dir, f"{self.basename}_{table_name}{suffix}.csv")
+        table['file'] = open(path, 'w', encoding='utf-8', newline='')
+        table['writer'] = csv.writer(table['file'])
+        table['writer'].writerow(list(table['columns']))
+        table['file'].flush()
+        self._paths.append(path)
+        if table['part'] == 1:
+            # 删除上次运行留下的续写文件，避免与本次的结果混在一起
+            pattern = re.compile(rf"{re.escape(self.basename)}_{re.escape(table_name)}_\d+\.csv$")
+            for name in os.listdir(self.output_dir):
+                if pattern.match(name):
+                    os.remove(os.path.join(self.output_dir, name))
+
+    def append(self, table_name, df, source=None):
+        if df is None or df.empty:
+            return
+        columns = tuple(df.columns)
+        table = self._tables.get(table_name)
+        if table is None:
+            table = {'columns': {column: position for position, column in enumerate(columns)}, 'part': 1,
+                     'pending': []}
+            self._tables[table_name] = table
+            self._open(table_name, table)
+        elif any(column not in table['columns'] for column in columns):
+            self._flush_table(table)
+            table['file'].close()
+            for column in columns:
+                table['columns'].setdefault(column, len(table['columns']))
+            table['part'] += 1
+            self._open(table_name, table)
+        for rows in _align([(columns, _rows(df))], table['columns']):
+            table['pending'].extend(rows)
+        self.rows += len(df)
+        if len(table['pending']) >= self.flush_rows:
+            self._flush_table(table)
+
+    @staticmethod
+    def _flush_table(table):
+        if table['pending']:
+            table['writer'].writerows(table['pending'])
+            table['file'].flush()
+            table['pending'] = []
+
+    def flush(self):
+        for table in self._tables.values():
+            self._flush_table(table)
+
+    def close(self):
+        paths = []
+        try:
+            self.flush()
+            paths = self._paths
+        except Exception as e:
+            _print_error("CsvSink 写入错误", e)
+        finally:
+            for table in self._tables.values():
+                table['file'].close()
+            self._tables = {}
+            self._paths = []
+        return paths
+
+class JsonlSink(object):
+    """
+    每个表一个JSONL文件: {output_dir}/{basename}_{表名}.jsonl，每行一个JSON对象。
+    不需要统一的表头，行累积到 flush_rows 后直接追加写入临时文件，close 时改名
+    """
+
+    def __init__(self, output_dir, basename='combined', flush_rows=1000):
+        self.output_dir = output_dir
+        self.basename = basename
+        self.flush_rows = flush_rows
+        self._tables = {}  # 表名 -> {'path': 输出路径, 'file': 临时文件, 'pending': [行字符串]}
+        self.rows = 0
+
+    def append(self, table_name, df, source=None):
+        if df is None or df.empty:
+            return
+        table = self._tables.get(table_name)
+        if table is None:
+            path = os.path.join(self.output_dir, f"{self.basename}_{table_name}.jsonl")
+            table = {'path': path, 'file': open(f"{path}.tmp", 'w', encoding='utf-8'), 'pending': []}
+            self._tables[table_name] = table
+        columns = [str(column) for column in df.columns]
+        for row in _rows(df):
+            table['pending'].append(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str))
+        self.rows += len(df)
+        if len(table['pending']) >= self.flush_rows:
+            self._flush_table(table)
+
+    @staticmethod
+    def _flush_table(table):
+        if table['pending']:
+            table['file'].write('\n'.join(table['pending']) + '\n')
+            table['file'].flush()
+            table['pending'] = []
+
+    def flush(self):
+        for table in self._tables.values():
+            self._flush_table(table)
+
+    def close(self):
+        paths = []
+        try:
+            for table in self._tables.values():
+                self._flush_table(table)
+                table['file'].close()
+                os.replace(table['file'].name, table['path'])
+                paths.append(table['path'])
+        except Exception as e:
+            _print_error("JsonlSink 写入错误", e)
+        finally:
+            for table in self._tables.values():
+                table['file'].close()
+            self._tables = {}
+        return paths
+
+class ParquetSink(_SpooledSink):
+    """
+    按 Hive 风格目录分区写 Parquet，所有列按文本(string)保存：
+        partition_by='run':    {output_dir}/{表名}/run={run_id}/part-0.parquet，每次运行一个分区
+        partition_by='source': {output_dir}/{表名}/source={文件名}/part-0.parquet，每个来源文件一个分区，
+                               每个文件的结果到达时立即写出，重跑时覆盖同一来源的分区
+    """
+
+    def __init__(self, output_dir, partition_by='run', run_id=None, flush_rows=10000, cpu_pool=None):
+        """
+        Args:
+            output_dir: 输出根目录
+            partition_by: 'run' 或 'source'
+            run_id: 运行编号，默认使用开始时间
+            flush_rows: 按运行分区时每个 row group 的行数上限
+            cpu_pool: 可选的 Cpu_Pool.CpuPool，按运行分区时在其中的进程里写出
+        """
+        if pq is None:
+            raise ImportError("输出 Parquet 需要安装 pyarrow: pip install pyarrow")
+        if partition_by not in ('run', 'source'):
+            raise ValueError(f"不支持的分区方式: {partition_by}")
+        os.makedirs(output_dir, exist_ok=True)
+        super().__init__(output_dir, flush_rows, cpu_pool)
+        self.output_dir = output_dir
+        self.partition_by = partition_by
+        self.run_id = run_id or time.strftime('%Y%m%d-%H%M%S')
+        self._written = []
+
+    @staticmethod
+    def _partition_name(source):
+        """来源路径转为目录名：保留文件名便于查找，附加路径哈希避免不同目录下的同名文件冲突"""
+        if source is None:
+            return 'unknown'
+        name = re.sub(r'[\\/:*?"<>|=#%\s]', '_', os.path.basename(source.rstrip('/\\')))[:100]
+        return f"{name}-{hashlib.sha1(source.encode('utf-8')).hexdigest()[:8]}"
+
+    @staticmethod
+    def _to_table(header, rows):
+        columns = list(zip(*rows)) if rows else [()] * len(header)
+        arrays = [pa.array([None if value is None else str(value) for value in column], type=pa.string())
+                  for column in columns]
+        return pa.Table.from_arrays(arrays, names=[str(column) for column in header])
+
+    def append(self, table_name, df, source=None):
+        if self.partition_by == 'run':
+            return super().append(table_name, df, source)
+        if df is None or df.empty:
+            return
+        directory = os.path.join(self.output_dir, table_name, f"source={self._partition_name(source)}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, 'part-0.parquet')
+        pq.write_table(self._to_table(list(df.columns), _rows(df)), f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        self.rows += len(df)
+        self._written.append(path)
+
+    def _write(self, tables):
+        paths = self._written
+        self._written = []
+        for name, header, batches in tables:
+            directory = os.path.join(self.output_dir, name, f"run={self.run_id}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, 'part-0.parquet')
+            schema = pa.schema([(str(column), pa.string()) for column in header])
+            # 每批行作为一个 row group 写出
+            with pq.ParquetWriter(f"{path}.tmp", schema) as writer:
+                for rows in batches:
+                    writer.write_table(self._to_table(header, rows))
+            os.replace(f"{path}.tmp", path)
+            paths.append(path)
+        return paths
+
+def make_sink(output_format, output_dir, basename='combined', **options):
+    """
+    按格式名创建输出
+
+    Args:
+        output_format: 'excel'、'csv'、'jsonl' 或 'parquet'
+        output_dir: 输出目录
+        basename: 输出文件名前缀(Excel 为 {basename}.xlsx)
+        options: 传给对应类的其他参数，如 Parquet 的 partition_by
+    """
+    if output_format == 'excel':
+        return ExcelSink(os.path.join(output_dir, f"{basename}.xlsx"), **options)
+    if output_format == 'csv':
+        return CsvSink(output_dir, basename, **options)
+    if output_format == 'jsonl':
+        return JsonlSink(output_dir, basename, **options)
+    if output_format == 'parquet':
+        return ParquetSink(os.path.join(output_dir, basename), **options)
+    raise ValueError(f"不支持的输出格式: {output_format}，可选 {', '.join(OUTPUT_FORMATS)}")
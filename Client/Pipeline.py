@@ -0,0 +1,191 @@
+# 分阶段的生产者/消费者流水线：各阶段由有界队列连接，每个阶段有自己的工作线程数，
+# CPU工作和网络等待可以重叠；下游慢时队列被填满，上游自动放慢(背压)，内存不会无限增长
+
+import os
+import queue
+import sys
+import threading
+import time
+
+_END = object()      # 队列结束标记
+_DROPPED = object()  # 被某个阶段丢弃的项目，仍然向下游传递以保持顺序
+
+class Stage(object):
+    def __init__(self, name, func, workers=1):
+        """
+        Args:
+            name: 阶段名称，打印统计时使用
+            func: 处理函数，传入上一阶段的输出，返回交给下一阶段的项目；返回 None 表示丢弃该项目
+            workers: 这个阶段的工作线程数
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.processed = 0
+        self.dropped = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0  # 因下游队列已满而等待的时间
+        self._lock = threading.Lock()
+
+    def _record(self, elapsed, dropped, blocked=0.0):
+        with self._lock:
+            self.processed += 1
+            self.busy_seconds += elapsed
+            self.blocked_seconds += blocked
+            if dropped:
+                self.dropped += 1
+
+class Pipeline(object):
+    def __init__(self, stages, queue_size=16, max_in_flight=None, ordered=True, metrics=None):
+        """
+        Args:
+            stages: Stage 列表，按顺序连接
+            queue_size: 每两个阶段之间队列的容量
+            max_in_flight: 同时在流水线中的项目数上限，默认为 队列数 x 队列容量
+            ordered: 最后一个阶段是否按输入顺序处理(此时最后一个阶段只能有一个工作线程)
+            metrics: 可选的 Metrics.Metrics，按阶段记录每个项目的处理耗时和等待下游的时间
+        """
+        if ordered and stages[-1].workers != 1:
+            raise ValueError("按顺序输出时最后一个阶段只能有一个工作线程")
+        self.stages = stages
+        self.queue_size = queue_size
+        self.max_in_flight = max_in_flight or queue_size * len(stages)
+        self.ordered = ordered
+        self.metrics = metrics
+        self.elapsed = 0.0
+
+    def run(self, items):
+        """
+        运行流水线直到 items 全部处理完
+
+        Args:
+            items: 可迭代的输入，在单独的线程中逐个取出，可以是生成器
+        """
+        start = time.perf_counter()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        remaining = [stage.workers for stage in self.stages]
+        remaining_lock = threading.Lock()
+
+        def feed():
+            try:
+                for seq, item in enumerate(items):
+                    in_flight.acquire()
+                    queues[0].put((seq, item))
+            except Exception as e:
+                self._print_error('输入', e)
+            finally:
+                for _ in range(self.stages[0].workers):
+                    queues[0].put(_END)
+
+        def finish_worker(index):
+            """一个阶段的最后一个工作线程退出时，通知下一个阶段结束"""
+            with remaining_lock:
+                remaining[index] -= 1
+                last = remaining[index] == 0
+            if last and index + 1 < len(self.stages):
+                for _ in range(self.stages[index + 1].workers):
+                    queues[index + 1].put(_END)
+
+        def apply(stage, item):
+            if item is _DROPPED:
+                return _DROPPED
+            began = time.perf_counter()
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                self._print_error(stage.name, e)
+                result = None
+            elapsed = time.perf_counter() - began
+            stage._record(elapsed, result is None)
+            if self.metrics is not None:
+                self.metrics.observe('stage_seconds', elapsed, stage=stage.name)
+            return _DROPPED if result is None else result
+
+        def work(index):
+            stage = self.stages[index]
+            source = queues[index]
+            target = queues[index + 1] if index + 1 < len(self.stages) else None
+            while True:
+                entry = source.get()
+                if entry is _END:
+                    break
+                seq, item = entry
+                result = apply(stage, item)
+                if target is not None:
+                    began = time.perf_counter()
+                    target.put((seq, result))
+                    blocked = time.perf_counter() - began
+                    with stage._lock:
+                        stage.blocked_seconds += blocked
+                    if self.metrics is not None:
+                        self.metrics.observe('stage_blocked_seconds', blocked, stage=stage.name)
+                else:
+                    in_flight.release()
+            finish_worker(index)
+
+        def work_ordered(index):
+            """最后一个阶段：先到的项目暂存，按输入顺序依次处理"""
+            stage = self.stages[index]
+            source = queues[index]
+            pending = {}
+            next_seq = 0
+            while True:
+                entry = source.get()
+                if entry is _END:
+                    break
+                seq, item = entry
+                pending[seq] = item
+                while next_seq in pending:
+                    apply(stage, pending.pop(next_seq))
+                    next_seq += 1
+                    in_flight.release()
+            finish_worker(index)
+
+        threads = [threading.Thread(target=feed, name='pipeline-feed', daemon=True)]
+        for index, stage in enumerate(self.stages):
+            last = index == len(self.stages) - 1
+            for i in range(stage.workers):
+                target = work_ordered if last and self.ordered else work
+                threads.append(threading.Thread(target=target, args=(index,), name=f'pipeline-{stage.name}-{i}',
+                                                daemon=True))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.elapsed = time.perf_counter() - start
+        return self
+
+    @staticmethod
+    def _print_error(name, e):
+        print(f"\n流水线阶段 {name} 错误:")
+        print(f"错误类型: {type(e).__name__}")
+        print(f"错误信息: {str(e)}")
+        print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+
+    def stats(self):
+        """
+        Returns:
+            list: 每个阶段一个字典: name, workers, processed, dropped, busy_seconds, blocked_seconds,
+                  utilization(忙碌时间 / (线程数 x 总耗时))
+        """
+        result = []
+        for stage in self.stages:
+            capacity = stage.workers * self.elapsed
+            result.append({
+                'name': stage.name,
+                'workers': stage.workers,
+                'processed': stage.processed,
+                'dropped': stage.dropped,
+                'busy_seconds': stage.busy_seconds,
+                'blocked_seconds': stage.blocked_seconds,
+                'utilization': stage.busy_seconds / capacity if capacity else 0.0
+            })
+        return result
+
+    def print_stats(self):
+        print(f"流水线总耗时: {self.elapsed:.2f}秒")
+        for stage in self.stats():
+            print(f"  {stage['name']}: 线程 {stage['workers']}, 处理 {stage['processed']}, 丢弃 {stage['dropped']}, "
+                  f"忙碌 {stage['busy_seconds']:.2f}秒, 等待下游 {stage['blocked_seconds']:.2f}秒, "
+                  f"利用率 {stage['utilization']:.0%}")
@@ -0,0 +1,231 @@
+# 客户端限流：令牌桶 + 根据 TextIn 错误码自适应退避重试
+
+import random
+import threading
+import time
+from Metrics import info
+
+# 可以重试的错误码：qps超过限制、基础服务故障、服务器内部错误
+RETRYABLE_CODES = {40306, 30203, 500}
+THROTTLED_CODE = 40306
+# 使用密钥池时，余额不足和凭证无效也改用其他凭证重试
+KEY_CODES = {40003, 40102}
+
+DEFAULT_QPS = 5  # 未单独配置的接口使用的默认每秒请求数
+
+class NoKeyAvailable(Exception):
+    """密钥池中的凭证全部停用，且在等待上限内都不会恢复"""
+
+    def __init__(self, code, wait):
+        super().__init__(f"没有可用的凭证，最早 {wait:.0f} 秒后恢复(停用原因: 错误码 {code})")
+        self.code = code
+
+class TokenBucket(object):
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate: 每秒补充的令牌数，即允许的平均QPS
+            capacity: 桶容量，即允许的瞬时突发请求数，默认等于 rate
+        """
+        self._lock = threading.Lock()
+        self._rate = float(rate)
+        self._capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self._capacity
+        self._last = time.monotonic()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill()
+            self._rate = float(rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._last) * self._rate)
+        self._last = now
+
+    def acquire(self):
+        """取一个令牌，令牌不足时阻塞等待。令牌可以预支为负数，这样等待的线程按先后顺序放行"""
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+class EndpointLimiter(object):
+    def __init__(self, rate, min_rate=0.5, max_retries=5, base_delay=0.5, max_delay=30,
+                 decrease_factor=0.7, recover_after=20):
+        """
+        单个接口的限流器
+
+        Args:
+            rate: 目标QPS，也是自适应调整的上限
+            min_rate: 连续被限流时QPS下调的下限
+            max_retries: 可重试错误码的最大重试次数
+            base_delay: 指数退避的基础等待时间(秒)
+            max_delay: 单次退避的最长等待时间(秒)
+            decrease_factor: 每次收到 40306 时QPS乘以的系数
+            recover_after: 连续成功多少次后把QPS往目标值回调一步
+        """
+        self.target_rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.decrease_factor = decrease_factor
+        self.recover_after = recover_after
+
+        self._bucket = TokenBucket(rate)
+        self._lock = threading.Lock()
+        self._successes = 0
+        self._last_decrease = 0.0
+        self.retries = 0
+        self.throttled = 0
+
+    @property
+    def rate(self):
+        return self._bucket.rate
+
+    def acquire(self):
+        self._bucket.acquire()
+
+    def on_success(self):
+        with self._lock:
+            self._successes += 1
+            if self._successes < self.recover_after or self.rate >= self.target_rate:
+                return
+            self._successes = 0
+            self._bucket.set_rate(min(self.target_rate, self.rate + self.target_rate * 0.1))
+
+    def on_retryable_error(self, code):
+        with self._lock:
+            self.retries += 1
+            self._successes = 0
+            if code != THROTTLED_CODE:
+                return
+            self.throttled += 1
+            # 同一时刻在途的多个请求会一起收到 40306，一秒内只下调一次
+            now = time.monotonic()
+            if now - self._last_decrease < 1:
+                return
+            self._last_decrease = now
+            self._bucket.set_rate(max(self.min_rate, self.rate * self.decrease_factor))
+
+    def backoff_delay(self, attempt):
+        """第 attempt 次重试前的等待时间：带全抖动的指数退避"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+class RateLimiter(object):
+    def __init__(self, rates=None, default_rate=DEFAULT_QPS, **options):
+        """
+        按接口URL管理限流器，两个OCR类共用一个实例
+
+        Args:
+            rates: {接口URL: QPS} 字典
+            default_rate: 未在 rates 中配置的接口使用的QPS
+            options: 传给 EndpointLimiter 的其他参数
+        """
+        self._rates = dict(rates or {})
+        self._default_rate = default_rate
+        self._options = options
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def for_endpoint(self, url):
+        with self._lock:
+            limiter = self._limiters.get(url)
+            if limiter is None:
+                rate = self._rates.get(url, self._default_rate)
+                limiter = EndpointLimiter(rate, **self._options)
+                self._limiters[url] = limiter
+            return limiter
+
+    def stats(self):
+        with self._lock:
+            return {url: {'rate': limiter.rate, 'retries': limiter.retries, 'throttled': limiter.throttled}
+                    for url, limiter in self._limiters.items()}
+
+_default_limiter = None
+_default_lock = threading.Lock()
+
+def get_default_rate_limiter():
+    """返回进程内共享的默认限流器，两个OCR类未指定 rate_limiter 时都使用它"""
+    global _default_limiter
+    with _default_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter()
+        return _default_limiter
+
+def _response_code(response, read=None):
+    """取出响应中的错误码，非JSON的 5xx 响应按 500 处理"""
+    try:
+        response_json = read(response) if read is not None else response.json()
+    except ValueError:
+        if response.status_code >= 500:
+            return 500, {'code': 500, 'message': f'HTTP {response.status_code}'}
+        raise
+    return response_json.get('code'), response_json
+
+def post_with_retry(send, limiter, label='', read=None, metrics=None, api='', key_pool=None, url=None):
+    """
+    限流发送请求，遇到可重试的错误码时指数退避后重试
+
+    Args:
+        send: 每次调用发送一次请求并返回 requests.Response；没有 key_pool 时无参调用，
+              有 key_pool 时传入本次选中的 Key_Pool.Credential
+        limiter: EndpointLimiter，有 key_pool 时改用各组凭证自己的限流器
+        label: 打印重试信息时用来标识文件
+        read: 可选的函数，传入 requests.Response 返回JSON数据，用于流式读取响应；默认 response.json()
+        metrics: 可选的 Metrics.Metrics，记录限流等待、每次请求的耗时、响应的错误码和重试次数
+        api: 记录指标时区分接口的标签
+        key_pool: 可选的 Key_Pool.KeyPool，每次请求(包括重试)重新选一组凭证
+        url: 接口URL，有 key_pool 时用来取所选凭证对该接口的限流器
+
+    Returns:
+        dict: 最后一次响应的JSON数据，重试用尽时返回最后一次的错误响应；
+              密钥池中全部凭证都已停用时返回 {'code': 停用原因的错误码, 'message': ...}
+    """
+    retryable = RETRYABLE_CODES | KEY_CODES if key_pool is not None else RETRYABLE_CODES
+    attempt = 0
+    while True:
+        began = time.perf_counter()
+        credential = None
+        if key_pool is not None:
+            try:
+                credential = key_pool.acquire()
+            except NoKeyAvailable as e:
+                return {'code': e.code, 'message': str(e)}
+            limiter = credential.rate_limiter.for_endpoint(url)
+        try:
+            limiter.acquire()
+            sent = time.perf_counter()
+            code, response_json = _response_code(send(credential) if key_pool is not None else send(), read)
+        except BaseException:
+            if credential is not None:
+                key_pool.release(credential, 'error')
+            raise
+        if credential is not None:
+            key_pool.release(credential, code)
+        if metrics is not None:
+            metrics.observe('rate_limit_wait_seconds', sent - began, api=api)
+            metrics.observe('api_request_seconds', time.perf_counter() - sent, api=api)
+            metrics.inc('api_responses_total', api=api, code=code)
+        if code not in retryable:
+            # 只有成功的响应才让限流器恢复速率，参数错误、文件错误等不可重试的失败不算
+            if code == 200:
+                limiter.on_success()
+            return response_json
+        if attempt >= limiter.max_retries:
+            return response_json
+        limiter.on_retryable_error(code)
+        # 凭证本身的问题换一组凭证立即重试
+        delay = 0.0 if code in KEY_CODES else limiter.backoff_delay(attempt)
+        attempt += 1
+        if metrics is not None:
+            metrics.inc('api_retries_total', api=api, code=code)
+        info(f"错误码 {code}，{delay:.2f}秒后第{attempt}次重试 {label}")
+        time.sleep(delay)
@@ -0,0 +1,249 @@
+# 原始响应归档：后台线程把响应压缩后追加到分段文件，按来源文件内容的哈希建立索引，
+# 请求线程只负责入队，不做序列化和磁盘写入；队列满时请求线程等待，等待超时后自己写入，不丢弃响应
+
+import gzip
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from Response_Cache import hash_file
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖，只有使用 zstd 压缩时才需要: pip install zstandard
+    zstandard = None
+
+SEGMENT_SUFFIXES = {'gzip': '.jsonl.gz', 'zstd': '.jsonl.zst'}
+
+class ResponseArchive(object):
+    """
+    只追加的压缩分段日志。每条响应单独压缩成一个 gzip member(或 zstd frame)追加到当前分段，
+    所以分段文件本身可以直接用 zcat / zstdcat 查看；index.jsonl 记录每个键所在的分段、偏移和长度，
+    按键读取时只解压这一条。同一个键归档多次时，索引指向最新的一条
+    """
+
+    def __init__(self, archive_dir, compression='gzip', level=6, segment_max_bytes=64 * 1024 * 1024,
+                 queue_size=1000, put_timeout=5.0):
+        """
+        Args:
+            archive_dir: 归档目录
+            compression: 'gzip' 或 'zstd'
+            level: 压缩级别
+            segment_max_bytes: 单个分段文件的大小上限，超过后新开一个分段
+            queue_size: 等待写入的响应数上限，队列满时请求线程等待(反压)
+            put_timeout: 队列满时最多等待的秒数，超时后由请求线程同步写入
+        """
+        if compression not in SEGMENT_SUFFIXES:
+            raise ValueError(f"不支持的压缩方式: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError("zstd 压缩需要安装 zstandard: pip install zstandard")
+        self._dir = archive_dir
+        self._compression = compression
+        self._level = level
+        self._segment_max_bytes = segment_max_bytes
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._put_timeout = put_timeout
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # 后台线程和同步写入的请求线程共用分段和索引文件
+        self._index = {}  # key -> 索引条目
+        self.archived = 0
+        self.written_inline = 0
+        self.dropped = 0
+        self.bytes_raw = 0
+        self.bytes_compressed = 0
+
+        os.makedirs(archive_dir, exist_ok=True)
+        self._index_path = os.path.join(archive_dir, 'index.jsonl')
+        self._load_index()
+        self._index_fp = open(self._index_path, 'a', encoding='utf-8')
+        self._segment_name = None
+        self._segment_fp = None
+        self._segment_size = 0
+        self._open_segment()
+
+        self._thread = threading.Thread(target=self._run, name='response-archive', daemon=True)
+        self._thread.start()
+
+    def _load_index(self):
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 中断时写了一半的最后一行
+                self._index[entry['key']] = entry
+
+    def _segment_names(self):
+        return sorted(name for name in os.listdir(self._dir) if name.startswith('segment-'))
+
+    def _open_segment(self):
+        """接着最后一个分段继续写；它已写满或压缩方式不同时新开一个"""
+        suffix = SEGMENT_SUFFIXES[self._compression]
+        names = self._segment_names()
+        if names:
+            last = names[-1]
+            size = os.path.getsize(os.path.join(self._dir, last))
+            if last.endswith(suffix) and size < self._segment_max_bytes:
+                self._segment_name = last
+                self._segment_size = size
+                self._segment_fp = open(os.path.join(self._dir, last), 'ab')
+                return
+        number = int(names[-1].split('-')[1].split('.')[0]) + 1 if names else 1
+        self._segment_name = f'segment-{number:05d}{suffix}'
+        self._segment_size = 0
+        self._segment_fp = open(os.path.join(self._dir, self._segment_name), 'ab')
+
+    @staticmethod
+    def make_key(source, is_url=False, content=None):
+        """
+        归档键：URL 按URL本身，磁盘上的文件按文件内容，PDF分块/图片横条等不在磁盘上的来源按 content 计算 sha256
+        """
+        if is_url:
+            return hashlib.sha256(source.encode('utf-8')).hexdigest()
+        if os.path.isfile(source):
+            return hash_file(source)
+        if content is not None:
+            return hashlib.sha256(content).hexdigest()
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+    def put(self, source, response_json, is_url=False, content=None, **meta):
+        """
+        把一条响应放入队列，由后台线程计算键、压缩并写入。调用后不能再修改 response_json。
+        队列满时最多等待 put_timeout 秒，仍然放不进去(或后台线程已经退出)时在当前线程同步写入；
+        只有同步写入也失败时才丢弃，并打印警告
+
+        Args:
+            source: 文件路径或URL
+            content: source 不是磁盘上的文件时，用来计算键的内容
+            meta: 额外记录在归档中的信息
+        """
+        item = (source, is_url, content, response_json, meta)
+        if self._thread.is_alive():
+            try:
+                self._queue.put(item, timeout=self._put_timeout)
+                return
+            except queue.Full:
+                pass
+        try:
+            self._write(*item)
+            with self._lock:
+                self.written_inline += 1
+        except Exception as e:
+            with self._lock:
+                self.dropped += 1
+            print(f"\n警告: 响应未能归档，已丢弃: {source}")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._write(*item)
+            except Exception as e:
+                print(f"\n响应归档错误:")
+                print(f"错误类型: {type(e).__name__}")
+                print(f"错误信息: {str(e)}")
+                print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+
+    def _compress(self, data):
+        if self._compression == 'zstd':
+            return zstandard.ZstdCompressor(level=self._level).compress(data)
+        return gzip.compress(data, compresslevel=self._level, mtime=0)
+
+    def _write(self, source, is_url, content, response_json, meta):
+        key = self.make_key(source, is_url, content)
+        record = dict(meta, key=key, source=source, time=time.time(), response=response_json)
+        raw = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        data = self._compress(raw)
+
+        with self._write_lock:
+            entry = self._append(key, source, record['time'], data)
+        with self._lock:
+            self._index[key] = entry
+            self.archived += 1
+            self.bytes_raw += len(raw)
+            self.bytes_compressed += len(data)
+
+    def _append(self, key, source, timestamp, data):
+        """把压缩后的一条记录追加到当前分段并写索引，调用方持有 _write_lock"""
+        if self._segment_size and self._segment_size + len(data) > self._segment_max_bytes:
+            self._segment_fp.close()
+            self._open_segment()
+        offset = self._segment_size
+        self._segment_fp.write(data)
+        self._segment_fp.flush()
+        self._segment_size += len(data)
+
+        # 数据先落盘再写索引，中断时最多丢掉索引中没有的最后一条
+        entry = {'key': key, 'segment': self._segment_name, 'offset': offset, 'length': len(data),
+                 'source': source, 'time': timestamp}
+        self._index_fp.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._index_fp.flush()
+        return entry
+
+    def get(self, key):
+        """
+        按键读取归档的响应
+
+        Returns:
+            dict 或 None: 记录(含 source、time 和 response 等字段)，没有时返回 None
+        """
+        with self._lock:
+            entry = self._index.get(key)
+        if entry is None:
+            return None
+        with open(os.path.join(self._dir, entry['segment']), 'rb') as f:
+            f.seek(entry['offset'])
+            data = f.read(entry['length'])
+        if entry['segment'].endswith(SEGMENT_SUFFIXES['zstd']):
+            if zstandard is None:
+                raise ImportError("读取 zstd 分段需要安装 zstandard: pip install zstandard")
+            raw = zstandard.ZstdDecompressor().decompress(data)
+        else:
+            raw = gzip.decompress(data)
+        return json.loads(raw)
+
+    def get_source(self, source, is_url=False, content=None):
+        """按来源读取归档的响应，见 make_key"""
+        return self.get(self.make_key(source, is_url, content))
+
+    def keys(self):
+        with self._lock:
+            return list(self._index)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'archived': self.archived,
+                'written_inline': self.written_inline,
+                'dropped': self.dropped,
+                'pending': self._queue.qsize(),
+                'bytes_raw': self.bytes_raw,
+                'bytes_compressed': self.bytes_compressed
+            }
+
+    def print_stats(self):
+        stats = self.stats()
+        ratio = stats['bytes_compressed'] / stats['bytes_raw'] if stats['bytes_raw'] else 0.0
+        print(f"归档响应: {stats['archived']}(队列满时同步写入 {stats['written_inline']}), 丢弃: {stats['dropped']}, "
+              f"原始 {stats['bytes_raw']/1024/1024:.2f}MB, 压缩后 {stats['bytes_compressed']/1024/1024:.2f}MB ({ratio:.1%})")
+        if stats['dropped']:
+            print(f"警告: 有 {stats['dropped']} 条响应未能归档")
+
+    def close(self):
+        """等待队列中的响应全部写完后关闭文件"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        with self._write_lock:
+            self._segment_fp.close()
+            self._index_fp.close()
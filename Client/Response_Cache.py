@@ -0,0 +1,179 @@
+# 按内容寻址的本地响应缓存：同一文件 + 同一接口 + 同样参数，不再重复上传计费
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+from collections import OrderedDict
+
+CHUNK_SIZE = 1024 * 1024
+
+def hash_file(file_path):
+    """分块计算文件内容的 sha256，不把整个文件读进内存"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ResponseCache(object):
+    def __init__(self, cache_dir='./.textin_cache', max_bytes=1024 * 1024 * 1024):
+        """
+        Args:
+            cache_dir: 缓存目录，每个响应一个JSON文件，附带的大文件(如Excel)另存为同名 .bin 文件
+            max_bytes: 缓存总大小上限，超出后按最近最少使用淘汰
+        """
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> 文件大小，越靠后越是最近使用
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self._load_index()
+
+    def _load_index(self):
+        """按修改时间重建LRU顺序，命中时会更新文件的修改时间"""
+        entries = []
+        for name in os.listdir(self._cache_dir):
+            if not name.endswith('.json'):
+                continue
+            stat = os.stat(os.path.join(self._cache_dir, name))
+            key = name[:-len('.json')]
+            entries.append((stat.st_mtime, key, stat.st_size + self._blob_size(key)))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _path(self, key):
+        return os.path.join(self._cache_dir, f'{key}.json')
+
+    def _blob_path(self, key):
+        return os.path.join(self._cache_dir, f'{key}.bin')
+
+    def _blob_size(self, key):
+        try:
+            return os.path.getsize(self._blob_path(key))
+        except OSError:
+            return 0
+
+    @staticmethod
+    def make_key(endpoint, params, source, is_url=False, content=None):
+        """
+        生成缓存键
+
+        Args:
+            endpoint: 接口URL
+            params: 请求参数字典
+            source: 文件路径或URL
+            is_url: source 是否为URL
+            content: 已经在内存中的文件内容，提供时直接对它计算哈希
+        """
+        if is_url:
+            source_hash = hashlib.sha256(source.encode('utf-8')).hexdigest()
+        elif content is not None:
+            source_hash = hashlib.sha256(content).hexdigest()
+        else:
+            source_hash = hash_file(source)
+        raw = '\n'.join([endpoint, json.dumps(params, sort_keys=True, ensure_ascii=False), source_hash])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """命中时返回缓存的响应JSON，未命中返回 None"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                response_json = json.load(f)
+            os.utime(self._path(key))
+        except (IOError, json.JSONDecodeError) as e:
+            print(f"\n缓存读取错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+            self._discard(key)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return response_json
+
+    def get_blob(self, key):
+        """返回与响应一起缓存的附带文件路径，没有时返回 None"""
+        path = self._blob_path(key)
+        return path if os.path.exists(path) else None
+
+    def put(self, key, response_json, blob_path=None):
+        """
+        写入缓存，先写临时文件再改名，并发或中断时不会留下半个文件
+
+        Args:
+            blob_path: 可选的附带文件(如流式下载的Excel)，按块复制进缓存，先于JSON写入
+        """
+        path = self._path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            if blob_path is not None:
+                shutil.copyfile(blob_path, tmp_path)
+                os.replace(tmp_path, self._blob_path(key))
+            elif os.path.exists(self._blob_path(key)):
+                os.remove(self._blob_path(key))
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(response_json, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path) + self._blob_size(key)
+        except IOError as e:
+            print(f"\n缓存写入错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+            return
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            evicted = self._evict()
+        for old_key in evicted:
+            self._remove_file(old_key)
+
+    def _evict(self):
+        evicted = []
+        while self._total_bytes > self._max_bytes and len(self._entries) > 1:
+            old_key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            evicted.append(old_key)
+        return evicted
+
+    def _discard(self, key):
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+        self._remove_file(key)
+
+    def _remove_file(self, key):
+        for path in (self._path(key), self._blob_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes
+            }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"缓存命中: {stats['hits']}, 未命中: {stats['misses']}, "
+              f"缓存条目: {stats['entries']}, 占用: {stats['bytes']/1024/1024:.2f}MB")
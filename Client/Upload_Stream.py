@@ -0,0 +1,146 @@
+# 流式上传：按块从磁盘读文件发送，不把整个文件读进内存；以及批次内存峰值统计
+
+import os
+import sys
+import threading
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+_stats_lock = threading.Lock()
+_in_flight = 0
+_peak_in_flight = 0
+_bytes_streamed = 0
+
+class FileUpload(object):
+    """
+    上传用的文件读取器。requests 通过 __len__ 设置 Content-Length，
+    urllib3 再按块调用 read 发送，所以每个在途请求只占用一个块的内存
+    """
+
+    def __init__(self, file_path):
+        self._fp = open(file_path, 'rb')
+        self._size = os.fstat(self._fp.fileno()).st_size
+        self._closed = False
+        global _in_flight, _peak_in_flight
+        with _stats_lock:
+            _in_flight += 1
+            _peak_in_flight = max(_peak_in_flight, _in_flight)
+
+    def __len__(self):
+        return self._size
+
+    def read(self, size=-1):
+        chunk = self._fp.read(size)
+        global _bytes_streamed
+        with _stats_lock:
+            _bytes_streamed += len(chunk)
+        return chunk
+
+    def rewind(self):
+        """重试前回到文件开头"""
+        self._fp.seek(0)
+        return self
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._fp.close()
+        global _in_flight
+        with _stats_lock:
+            _in_flight -= 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+def current_rss():
+    """当前进程的常驻内存(字节)，取不到时返回 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # 非 Linux 平台退而求其次，用进程生命周期内的峰值
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    return None
+
+class MemoryMonitor(object):
+    def __init__(self, interval=0.05):
+        """
+        后台线程定期采样常驻内存，统计一个批次的内存峰值，用来评估能开多少并发
+
+        Args:
+            interval: 采样间隔(秒)
+        """
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.start_rss = None
+        self.peak_rss = None
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+            self.peak_rss = rss
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            self._sample()
+
+    def start(self):
+        global _peak_in_flight, _bytes_streamed
+        with _stats_lock:
+            _peak_in_flight = _in_flight
+            _bytes_streamed = 0
+        self.start_rss = current_rss()
+        self.peak_rss = self.start_rss
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+        return self.report()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.stop()
+
+    def report(self):
+        with _stats_lock:
+            peak_in_flight = _peak_in_flight
+            bytes_streamed = _bytes_streamed
+        return {
+            'start_rss': self.start_rss,
+            'peak_rss': self.peak_rss,
+            'peak_in_flight_uploads': peak_in_flight,
+            'bytes_streamed': bytes_streamed
+        }
+
+    def print_report(self):
+        report = self.report()
+        if report['peak_rss'] is None:
+            print("无法获取内存信息")
+            return
+        growth = report['peak_rss'] - (report['start_rss'] or 0)
+        print(f"内存峰值: {report['peak_rss']/1024/1024:.1f}MB (批次内增长 {growth/1024/1024:.1f}MB), "
+              f"同时上传的文件数峰值: {report['peak_in_flight_uploads']}, "
+              f"流式上传: {report['bytes_streamed']/1024/1024:.2f}MB")
+
+def rewind(body):
+    """每次(重新)发送前把 FileUpload 倒回开头，其他类型的请求体原样返回"""
+    return body.rewind() if isinstance(body, FileUpload) else body
@@ -0,0 +1,309 @@
+# 监视收件目录的常驻模式：新文件写完后立即处理，处理完移到 done/failed 子目录。
+# Linux 上用 inotify(通过 ctypes 调用 libc)，其他平台或 inotify 不可用时退回定时轮询；
+# 两种方式都只处理新出现的文件，不会重复扫描已处理过的文件
+
+import ctypes
+import ctypes.util
+import os
+import select
+import shutil
+import signal
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from Metrics import get_default_metrics, info
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT = struct.Struct('iIII')
+
+# 下载工具和编辑器写入过程中的临时文件，写完改名后才处理
+TEMP_SUFFIXES = ('.tmp', '.part', '.crdownload', '.partial', '~')
+
+def is_candidate(name):
+    """隐藏文件和写入中的临时文件不处理"""
+    return not name.startswith('.') and not name.endswith(TEMP_SUFFIXES)
+
+class PollingWatcher(object):
+    reports_close = False  # 轮询不知道文件是否还在被写入
+
+    def __init__(self, directories, interval=1.0):
+        """
+        定时列出目录，报告新出现的文件；只比较文件名，不读取文件内容
+
+        Args:
+            directories: 收件目录列表，只看目录下的文件，子目录忽略
+            interval: 轮询间隔(秒)
+        """
+        self._directories = list(directories)
+        self._interval = interval
+        self._known = set()
+        self._next_poll = 0.0
+
+    def poll(self, timeout):
+        """
+        等待最多 timeout 秒
+
+        Returns:
+            list: [(文件路径, 是否已写完)]，轮询无法知道是否写完，一律为 False
+        """
+        wait = self._next_poll - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            if wait > timeout:
+                return []
+        self._next_poll = time.monotonic() + self._interval
+        current = set()
+        for directory in self._directories:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_file() and is_candidate(entry.name):
+                            current.add(entry.path)
+            except OSError:
+                continue
+        # 已移走的文件从集合中去掉，同名文件再次放入时还能发现
+        new = current - self._known
+        self._known = current
+        return [(path, False) for path in sorted(new)]
+
+    def close(self):
+        pass
+
+class InotifyWatcher(object):
+    reports_close = True  # 写入方关闭文件时会收到 IN_CLOSE_WRITE
+
+    def __init__(self, directories):
+        """
+        用 inotify 监视目录，文件写完(IN_CLOSE_WRITE)或被移入(IN_MOVED_TO)时立即报告
+
+        Raises:
+            OSError: 不是 Linux 或 inotify 不可用(如超过 max_user_watches)
+        """
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify 只在 Linux 上可用")
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._watches = {}  # wd -> 目录
+        self.overflowed = False
+        for directory in directories:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                os.close(self._fd)
+                raise OSError(errno, f"inotify_add_watch 失败: {directory}")
+            self._watches[wd] = directory
+
+    def poll(self, timeout):
+        """
+        等待最多 timeout 秒
+
+        Returns:
+            list: [(文件路径, 是否已写完)]；事件队列溢出时 overflowed 置为 True，调用方需要重新列一次目录
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            if mask & IN_ISDIR or not name or wd not in self._watches:
+                continue
+            name = os.fsdecode(name)
+            if is_candidate(name):
+                events.append((os.path.join(self._watches[wd], name), bool(mask & (IN_CLOSE_WRITE | IN_MOVED_TO))))
+        return events
+
+    def close(self):
+        os.close(self._fd)
+
+def create_watcher(directories, poll_interval=1.0, use_inotify=True):
+    """优先使用 inotify，不可用时退回轮询"""
+    if use_inotify:
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError) as e:
+            print(f"inotify 不可用，改为每 {poll_interval} 秒轮询: {str(e)}")
+    return PollingWatcher(directories, poll_interval)
+
+class WatchDaemon(object):
+    def __init__(self, inboxes, handler, settle_seconds=2.0, poll_interval=1.0, max_workers=4, use_inotify=True,
+                 done_name='done', failed_name='failed', metrics=None):
+        """
+        Args:
+            inboxes: 收件目录列表
+            handler: 处理函数 handler(文件路径) -> bool，返回 True 时移到 done，否则移到 failed；
+                     在工作线程中调用，客户端和连接在多次调用之间复用
+            settle_seconds: 轮询发现(或启动时已在目录中)的文件，大小和修改时间保持不变这么久才认为写完；
+                            inotify 报告的文件等到写入方关闭后才处理，一直不关闭时保持不变 15 倍这么久也认为写完
+            poll_interval: 轮询间隔(秒)，只在 inotify 不可用时使用
+            max_workers: 同时处理的文件数
+            use_inotify: 为 False 时直接使用轮询
+            done_name: 处理成功的文件移入的子目录名
+            failed_name: 处理失败的文件移入的子目录名
+            metrics: 可选的 Metrics.Metrics，记录从发现到处理完的延迟和处理结果
+        """
+        self._inboxes = [os.path.abspath(inbox) for inbox in inboxes]
+        for inbox in self._inboxes:
+            os.makedirs(os.path.join(inbox, done_name), exist_ok=True)
+            os.makedirs(os.path.join(inbox, failed_name), exist_ok=True)
+        self._handler = handler
+        self._settle_seconds = settle_seconds
+        self._open_timeout = settle_seconds * 15
+        self._done_name = done_name
+        self._failed_name = failed_name
+        self._metrics = metrics if metrics is not None else get_default_metrics()
+        self._watcher = create_watcher(self._inboxes, poll_interval, use_inotify)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._pending = {}    # 路径 -> [大小, 修改时间, 最后变化的时间, 需要稳定的秒数, 发现时间]
+        self._in_flight = set()
+        self._stop = threading.Event()
+        self.processed = 0
+        self.failed = 0
+
+    def _scan(self):
+        """列一次收件目录：启动时处理已有的文件，inotify 队列溢出后补上漏掉的事件"""
+        for inbox in self._inboxes:
+            with os.scandir(inbox) as entries:
+                for entry in entries:
+                    if entry.is_file() and is_candidate(entry.name):
+                        self._touch(entry.path, False, from_scan=True)
+
+    def _touch(self, path, complete, from_scan=False):
+        """
+        记录一个可能有新内容的文件
+
+        Args:
+            complete: 写完关闭或被移入，不再等待稳定时间
+            from_scan: 列目录发现的文件，不知道是否还在写入，按 settle_seconds 等待
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._pending.pop(path, None)
+            return
+        with self._lock:
+            if path in self._in_flight:
+                return
+        now = time.monotonic()
+        entry = self._pending.get(path)
+        if complete:
+            settle = 0.0
+        elif from_scan or not self._watcher.reports_close:
+            settle = self._settle_seconds
+        else:
+            settle = self._open_timeout  # 还开着，等 IN_CLOSE_WRITE
+        if entry is None:
+            self._pending[path] = [stat.st_size, stat.st_mtime_ns, now, settle, now]
+        elif not from_scan:
+            entry[:4] = [stat.st_size, stat.st_mtime_ns, now, settle]
+
+    def _promote_ready(self):
+        """大小和修改时间已经稳定的文件交给工作线程"""
+        now = time.monotonic()
+        for path, entry in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (entry[0], entry[1]):
+                entry[:3] = [stat.st_size, stat.st_mtime_ns, now]
+                continue
+            if now - entry[2] < entry[3]:
+                continue
+            del self._pending[path]
+            with self._lock:
+                self._in_flight.add(path)
+            self._executor.submit(self._process, path, entry[4])
+
+    def _process(self, path, discovered):
+        ok = False
+        try:
+            ok = bool(self._handler(path))
+        except Exception as e:
+            print(f"\n监视目录处理错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+        finally:
+            target = self._move(path, self._done_name if ok else self._failed_name)
+            with self._lock:
+                self._in_flight.discard(path)
+                if ok:
+                    self.processed += 1
+                else:
+                    self.failed += 1
+            self._metrics.observe('watch_latency_seconds', time.monotonic() - discovered)
+            self._metrics.inc('watch_files_total', status='done' if ok else 'failed')
+            info(f"{'处理完成' if ok else '处理失败'}，已移到 {target}")
+
+    @staticmethod
+    def _move(path, subdir):
+        """移到同一收件目录下的子目录，重名时加上时间戳"""
+        directory, name = os.path.split(path)
+        target = os.path.join(directory, subdir, name)
+        if os.path.exists(target):
+            stem, ext = os.path.splitext(name)
+            target = os.path.join(directory, subdir, f"{stem}_{time.strftime('%Y%m%d%H%M%S')}_{time.monotonic_ns()}{ext}")
+        try:
+            shutil.move(path, target)
+        except OSError as e:
+            print(f"\n移动文件错误:")
+            print(f"错误类型: {type(e).__name__}")
+            print(f"错误信息: {str(e)}")
+            print(f"错误位置: {os.path.basename(__file__)}:{sys.exc_info()[2].tb_lineno}")
+            return path
+        return target
+
+    def stop(self):
+        """请求停止，正在处理的文件处理完后 run 返回"""
+        self._stop.set()
+
+    def run(self, tick=0.2):
+        """
+        一直运行到 stop() 被调用或收到 SIGINT/SIGTERM
+
+        Args:
+            tick: 检查待处理文件是否已稳定的间隔(秒)
+        """
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *_: self.stop())
+        print(f"开始监视: {', '.join(self._inboxes)}")
+        self._scan()
+        try:
+            while not self._stop.is_set():
+                for path, complete in self._watcher.poll(tick):
+                    self._touch(path, complete)
+                if getattr(self._watcher, 'overflowed', False):
+                    self._watcher.overflowed = False
+                    self._scan()
+                self._promote_ready()
+        finally:
+            self._executor.shutdown(wait=True)
+            self._watcher.close()
+            print(f"停止监视，处理成功 {self.processed} 个，失败 {self.failed} 个")